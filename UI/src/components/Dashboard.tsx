@@ -180,18 +180,32 @@ export const Dashboard: React.FC<DashboardProps> = ({ user, onLogout }) => {
   }, [user]);
 
   useEffect(() => {
-    // Load notifications
+    let unsubscribe: (() => void) | undefined;
+    let cancelled = false;
+
+    // Load the unread badge count, then follow new notifications over the server-sent event stream
     const loadNotifications = async () => {
+      let lastId = 0;
       try {
-        const response = await api.getNotifications(user.id, true);
-        setNotifications(response.notifications || []);
-        setUnreadCount(response.notifications?.length || 0);
+        const counts = await api.getNotificationCounts(user.id);
+        setUnreadCount(counts.unread || 0);
+        lastId = counts.last_id || 0;
       } catch (err) {
         console.error('Error loading notifications:', err);
       }
+      if (cancelled) return;
+      unsubscribe = api.subscribeToNotifications(user.id, lastId, (notification) => {
+        if (notification.read) return;
+        setNotifications(prev => [notification, ...prev]);
+        setUnreadCount(prev => prev + 1);
+      });
     };
 
     loadNotifications();
+    return () => {
+      cancelled = true;
+      unsubscribe?.();
+    };
   }, [user.id]);
 
   const getTemplateIcon = () => {
@@ -244,20 +258,40 @@ export const Dashboard: React.FC<DashboardProps> = ({ user, onLogout }) => {
     }));
 
     setInputMessage('');
+    const aiMessageId = (Date.now() + 1).toString();
 
     try {
-      const response = await api.sendMessage(user.template, userMessage.content, user.id);
-      
+      const reply = await api.streamMessage(user.template, userMessage.content, user.id, (text) => {
+        setChatState(prev => {
+          const last = prev.messages[prev.messages.length - 1];
+          if (last && last.id === aiMessageId) {
+            return {
+              ...prev,
+              messages: [...prev.messages.slice(0, -1), { ...last, content: last.content + text }],
+            };
+          }
+          return {
+            ...prev,
+            messages: [...prev.messages, {
+              id: aiMessageId,
+              content: text,
+              isUser: false,
+              timestamp: new Date().toISOString(),
+            }],
+          };
+        });
+      });
+
       const aiMessage: Message = {
-        id: (Date.now() + 1).toString(),
-        content: response.message || response.response || 'I apologize, but I encountered an error. Please try again.',
+        id: aiMessageId,
+        content: reply || 'I apologize, but I encountered an error. Please try again.',
         isUser: false,
         timestamp: new Date().toISOString(),
       };
 
       setChatState(prev => ({
         ...prev,
-        messages: [...prev.messages, aiMessage],
+        messages: [...prev.messages.filter(m => m.id !== aiMessageId), aiMessage],
         isLoading: false,
       }));
     } catch (error) {
@@ -270,7 +304,7 @@ export const Dashboard: React.FC<DashboardProps> = ({ user, onLogout }) => {
 
       setChatState(prev => ({
         ...prev,
-        messages: [...prev.messages, errorMessage],
+        messages: [...prev.messages.filter(m => m.id !== aiMessageId), errorMessage],
         isLoading: false,
       }));
     }
@@ -565,7 +599,7 @@ export const Dashboard: React.FC<DashboardProps> = ({ user, onLogout }) => {
                 ))}
                 
                 {/* Loading indicator */}
-                {chatState.isLoading && (
+                {chatState.isLoading && chatState.messages[chatState.messages.length - 1]?.isUser && (
                   <div className="flex justify-start fade-in">
                     <div className="flex items-start space-x-2 max-w-4xl">
                       <div className="w-8 h-8 rounded-full bg-gray-200 text-gray-600 flex items-center justify-center flex-shrink-0">
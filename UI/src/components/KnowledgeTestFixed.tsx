@@ -17,6 +17,7 @@ interface KnowledgeTestProps {
 export const KnowledgeTest: React.FC<KnowledgeTestProps> = ({ userId, category, onComplete }) => {
   const [questions, setQuestions] = useState<Question[] | null>(null);
   const [answers, setAnswers] = useState<Record<string, string>>({});
+  const [sessionId, setSessionId] = useState<string | null>(null);
   const [currentIndex, setCurrentIndex] = useState(0);
   const [isSubmitting, setIsSubmitting] = useState(false);
   const [score, setScore] = useState<number | null>(null);
@@ -37,7 +38,8 @@ export const KnowledgeTest: React.FC<KnowledgeTestProps> = ({ userId, category,
         return res.json();
       })
       .then(data => {
-        setQuestions(data || []);
+        setQuestions(data.questions || []);
+        setSessionId(data.session_id || null);
         setLoading(false);
       })
       .catch(() => {
@@ -58,7 +60,7 @@ export const KnowledgeTest: React.FC<KnowledgeTestProps> = ({ userId, category,
     fetch('http://localhost:8000/tools/submit-quiz', {
       method: 'POST',
       headers: { 'Content-Type': 'application/json' },
-      body: JSON.stringify({ user_id: userId, category, answers }),
+      body: JSON.stringify({ user_id: userId, category, answers, session_id: sessionId }),
     })
       .then(res => {
         if (!res.ok) throw new Error(`HTTP error! status: ${res.status}`);
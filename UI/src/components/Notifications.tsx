@@ -28,6 +28,8 @@ export const Notifications: React.FC<NotificationsProps> = ({ user, onBack }) =>
   const [notifications, setNotifications] = useState<Notification[]>([]);
   const [filter, setFilter] = useState<'all' | 'unread' | 'read'>('all');
   const [loading, setLoading] = useState(true);
+  const [nextBeforeId, setNextBeforeId] = useState<number | null>(null);
+  const [unreadTotal, setUnreadTotal] = useState(0);
   const [error, setError] = useState<string | null>(null);
   const [replyMessage, setReplyMessage] = useState<string>('');
   const [exerciseId, setExerciseId] = useState<string | null>(null);
@@ -42,6 +44,16 @@ export const Notifications: React.FC<NotificationsProps> = ({ user, onBack }) =>
     loadNotifications();
   }, []);
 
+  useEffect(() => {
+    if (loading) return;
+    // Push new notifications instead of re-fetching the list
+    const lastId = notifications.reduce((max, n) => Math.max(max, parseInt(n.id) || 0), 0);
+    return api.subscribeToNotifications(user.id, lastId, (notification: Notification) => {
+      setNotifications(prev => prev.some(n => n.id === notification.id) ? prev : [notification, ...prev]);
+      if (!notification.read) setUnreadTotal(count => count + 1);
+    });
+  }, [loading, user.id]);
+
   useEffect(() => {
     let timer: any;
     if (showExercise && exerciseStartTime) {
@@ -65,8 +77,13 @@ export const Notifications: React.FC<NotificationsProps> = ({ user, onBack }) =>
     try {
       setLoading(true);
       setError(null);
-      const response = await api.getNotifications(user.id, false);
+      const [response, counts] = await Promise.all([
+        api.getNotifications(user.id, false),
+        api.getNotificationCounts(user.id),
+      ]);
       setNotifications(response.notifications || []);
+      setNextBeforeId(response.next_before_id ?? null);
+      setUnreadTotal(counts.unread || 0);
     } catch (err) {
       setError('Failed to load notifications');
       console.error('Error loading notifications:', err);
@@ -75,6 +92,17 @@ export const Notifications: React.FC<NotificationsProps> = ({ user, onBack }) =>
     }
   };
 
+  const loadMoreNotifications = async () => {
+    if (nextBeforeId === null) return;
+    try {
+      const response = await api.getNotifications(user.id, false, nextBeforeId);
+      setNotifications(prev => [...prev, ...(response.notifications || [])]);
+      setNextBeforeId(response.next_before_id ?? null);
+    } catch (err) {
+      console.error('Error loading more notifications:', err);
+    }
+  };
+
   const handleStartExercise = async (notificationId: string) => {
     try {
       const response = await api.generateExercise(user.id, user.template, user.template); // Using template as both category and topic
@@ -142,21 +170,21 @@ export const Notifications: React.FC<NotificationsProps> = ({ user, onBack }) =>
 
   const markAllAsRead = async () => {
     try {
-      const unreadNotifications = notifications.filter(n => !n.read);
-      for (const notification of unreadNotifications) {
-        // Convert string ID to number for the API
-        await api.markNotificationAsRead(parseInt(notification.id));
-      }
+      await api.markAllNotificationsAsRead(user.id);
       loadNotifications();
     } catch (err) {
       console.error('Error marking all notifications as read:', err);
     }
   };
 
-  const clearAllNotifications = () => {
-    // Note: Backend doesn't support clearing all notifications yet
-    // This will just reload the current notifications
-    loadNotifications();
+  const clearAllNotifications = async () => {
+    try {
+      // Archiving everything up to now clears the inbox without deleting history
+      await api.archiveNotifications(user.id, 0);
+      loadNotifications();
+    } catch (err) {
+      console.error('Error clearing notifications:', err);
+    }
   };
 
   const getNotificationIcon = (type: string) => {
@@ -178,7 +206,8 @@ export const Notifications: React.FC<NotificationsProps> = ({ user, onBack }) =>
     return true;
   });
 
-  const unreadCount = notifications.filter(n => !n.read).length;
+  // Server-side count, since only the loaded pages are in memory
+  const unreadCount = unreadTotal;
 
   // Format time for display
   const formatTime = (seconds: number) => {
@@ -482,6 +511,14 @@ export const Notifications: React.FC<NotificationsProps> = ({ user, onBack }) =>
                 </div>
               </div>
             ))}
+            {nextBeforeId !== null && (
+              <button
+                onClick={loadMoreNotifications}
+                className="w-full py-2 text-sm text-blue-600 hover:text-blue-800 transition-colors"
+              >
+                Load older notifications
+              </button>
+            )}
           </div>
         )}
       </div>
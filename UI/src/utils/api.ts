@@ -161,6 +161,46 @@ export const api = {
     return response.json();
   },
 
+  async streamMessage(template: string, message: string, userId: string, onToken: (text: string) => void) {
+    // Newline-delimited JSON: token events while generating, then one done event with the full reply
+    const response = await fetch(`${API_BASE_URL}/tools/chat/stream`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ category: template, user_input: message, user_id: userId }),
+    });
+
+    if (!response.ok || !response.body) {
+      throw new Error(`Failed to send message: ${response.status}`);
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let reply = '';
+
+    while (true) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+      const lines = buffer.split('\n');
+      buffer = lines.pop() || '';
+      for (const line of lines) {
+        if (!line.trim()) continue;
+        const event = JSON.parse(line);
+        if (event.type === 'token') {
+          reply += event.content;
+          onToken(event.content);
+        } else if (event.type === 'done') {
+          reply = event.response;
+        } else if (event.type === 'error') {
+          throw new Error(event.detail || 'Failed to generate response');
+        }
+      }
+    }
+
+    return reply;
+  },
+
   // Progress Tracking APIs
   async trackQuizScore(userId: string, category: string, score: number, totalQuestions: number) {
     const response = await fetch(`${API_BASE_URL}/tools/progress/track`, {
@@ -200,6 +240,14 @@ export const api = {
     return response.json();
   },
 
+  async getProgressOverview(userId: string) {
+    const response = await fetch(`${API_BASE_URL}/tools/progress/${userId}/overview`);
+    if (!response.ok) {
+      throw new Error(`Failed to get progress overview: ${response.status}`);
+    }
+    return response.json();
+  },
+
   async trainProgressModel() {
     const response = await fetch(`${API_BASE_URL}/tools/progress/train-model`, {
       method: 'POST',
@@ -208,14 +256,42 @@ export const api = {
   },
 
   // Notification APIs
-  async getNotifications(userId: string, unreadOnly: boolean = false) {
-    const response = await fetch(`${API_BASE_URL}/tools/notifications/${userId}?unread_only=${unreadOnly}`);
+  async getNotifications(userId: string, unreadOnly: boolean = false, beforeId?: number, limit: number = 50) {
+    const params = new URLSearchParams({ unread_only: String(unreadOnly), limit: String(limit) });
+    if (beforeId !== undefined) params.set('before_id', String(beforeId));
+    const response = await fetch(`${API_BASE_URL}/tools/notifications/${userId}?${params}`);
     if (!response.ok) {
       throw new Error(`Failed to get notifications: ${response.status}`);
     }
     return response.json();
   },
 
+  async getNotificationCounts(userId: string) {
+    const response = await fetch(`${API_BASE_URL}/tools/notifications/${userId}/unread-count`);
+    if (!response.ok) {
+      throw new Error(`Failed to get notification counts: ${response.status}`);
+    }
+    return response.json();
+  },
+
+  async getNotificationDelta(userId: string, afterId: number) {
+    const response = await fetch(`${API_BASE_URL}/tools/notifications/${userId}/delta?after_id=${afterId}`);
+    if (!response.ok) {
+      throw new Error(`Failed to get new notifications: ${response.status}`);
+    }
+    return response.json();
+  },
+
+  subscribeToNotifications(userId: string, afterId: number | null, onNotification: (notification: any) => void) {
+    // The browser reconnects on its own and resumes from the last event id it received
+    const params = afterId ? `?after_id=${afterId}` : '';
+    const source = new EventSource(`${API_BASE_URL}/tools/notifications/${userId}/stream${params}`);
+    source.addEventListener('notification', (event) => {
+      onNotification(JSON.parse((event as MessageEvent).data));
+    });
+    return () => source.close();
+  },
+
   async markNotificationAsRead(notificationId: number) {
     const response = await fetch(`${API_BASE_URL}/tools/notifications/${notificationId}/read`, {
       method: 'POST',
@@ -223,6 +299,29 @@ export const api = {
     return response.json();
   },
 
+  async markAllNotificationsAsRead(userId: string) {
+    const response = await fetch(`${API_BASE_URL}/tools/notifications/${userId}/read-all`, {
+      method: 'POST',
+    });
+    return response.json();
+  },
+
+  async markNotificationsAsRead(userId: string, notificationIds: number[]) {
+    const response = await fetch(`${API_BASE_URL}/tools/notifications/read-batch`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ user_id: userId, notification_ids: notificationIds }),
+    });
+    return response.json();
+  },
+
+  async archiveNotifications(userId: string, olderThanDays: number = 30) {
+    const response = await fetch(`${API_BASE_URL}/tools/notifications/${userId}/archive?older_than_days=${olderThanDays}`, {
+      method: 'POST',
+    });
+    return response.json();
+  },
+
   async replyToNotification(userId: string, notificationId: number, replyMessage: string, topic: string) {
     const response = await fetch(`${API_BASE_URL}/tools/notifications/reply`, {
       method: 'POST',
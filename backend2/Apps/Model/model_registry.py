@@ -0,0 +1,98 @@
+import os
+import re
+import uuid
+import shutil
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+import joblib
+
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+_VERSION_DIR = re.compile(r'^v(\d+)$')
+
+
+class ModelRegistry:
+    """Versioned, atomically published model artifacts shared by worker processes.
+
+    Layout: `<root>/<name>/v000042/<artifact>.joblib`. A version is written into
+    a hidden staging directory and becomes visible with a single rename, so
+    readers never see a half-written version. Artifacts are stored uncompressed
+    and loaded with `mmap_mode='r'`, so numpy arrays that estimators keep as-is
+    are shared between workers through the OS page cache.
+    """
+
+    def __init__(self, root: str, keep_versions: int = 3):
+        self.root = root
+        self.keep_versions = keep_versions
+
+    def _name_dir(self, name: str) -> str:
+        return os.path.join(self.root, name)
+
+    def names(self) -> List[str]:
+        try:
+            return sorted(entry for entry in os.listdir(self.root) if not entry.startswith('.'))
+        except FileNotFoundError:
+            return []
+
+    def versions(self, name: str) -> List[int]:
+        try:
+            entries = os.listdir(self._name_dir(name))
+        except FileNotFoundError:
+            return []
+        return sorted(int(m.group(1)) for m in map(_VERSION_DIR.match, entries) if m)
+
+    def latest_version(self, name: str) -> Optional[int]:
+        versions = self.versions(name)
+        return versions[-1] if versions else None
+
+    def publish(self, name: str, artifacts: Dict[str, Any]) -> int:
+        """Write artifacts as a new version and return its number"""
+        name_dir = self._name_dir(name)
+        os.makedirs(name_dir, exist_ok=True)
+        staging = os.path.join(name_dir, f".staging-{uuid.uuid4().hex}")
+        os.makedirs(staging)
+        try:
+            for artifact, obj in artifacts.items():
+                joblib.dump(obj, os.path.join(staging, f"{artifact}.joblib"))
+
+            version = (self.latest_version(name) or 0) + 1
+            while True:
+                try:
+                    # Renaming onto an existing version fails, so concurrent publishers get distinct numbers
+                    os.rename(staging, os.path.join(name_dir, f"v{version:06d}"))
+                    break
+                except OSError:
+                    if not os.path.exists(os.path.join(name_dir, f"v{version:06d}")):
+                        raise
+                    version += 1
+        except Exception:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+        self._prune(name)
+        return version
+
+    def load(self, name: str, version: Optional[int] = None, mmap: bool = True) -> Optional[Tuple[int, Dict[str, Any]]]:
+        """Load a version (the latest by default) as (version, artifacts)"""
+        if version is None:
+            version = self.latest_version(name)
+        if version is None:
+            return None
+
+        version_dir = os.path.join(self._name_dir(name), f"v{version:06d}")
+        artifacts = {}
+        for filename in os.listdir(version_dir):
+            if filename.endswith('.joblib'):
+                artifacts[filename[:-len('.joblib')]] = joblib.load(
+                    os.path.join(version_dir, filename),
+                    mmap_mode='r' if mmap else None
+                )
+        return version, artifacts
+
+    def _prune(self, name: str):
+        # Readers that already mapped an old version keep their pages after unlink
+        for version in self.versions(name)[:-self.keep_versions]:
+            shutil.rmtree(os.path.join(self._name_dir(name), f"v{version:06d}"), ignore_errors=True)
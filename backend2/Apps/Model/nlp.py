@@ -1,6 +1,113 @@
+import os
+import json
+import time
+import asyncio
+import threading
+import importlib.util
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Type
+
+import httpx
 from langchain_openai import ChatOpenAI
 from Apps.Model.cofing import Secret
+from Apps.Model.response_cache import ResponseCache
+from Apps.Model.single_flight import SingleFlight
+from Apps.Model.scheduler import create_scheduler, scheduling_class, INTERACTIVE
+from Apps.Model.resilience import ResiliencePolicy, HEDGE_MODEL, ATTEMPT_TIMEOUT_SECONDS, is_transient
+from Apps.Model.structured_output import StructuredGenerator
+from Apps.utils.executor import run_blocking
+from langchain_core.messages import AIMessage
 from langchain_core.runnables import Runnable
+from pydantic import BaseModel
+
+
+# Connection pool settings for the LLM provider (shared by every call in the process)
+MAX_CONNECTIONS = int(os.getenv('SCMC_LLM_MAX_CONNECTIONS', '20'))
+MAX_KEEPALIVE_CONNECTIONS = int(os.getenv('SCMC_LLM_MAX_KEEPALIVE_CONNECTIONS', '10'))
+KEEPALIVE_EXPIRY = float(os.getenv('SCMC_LLM_KEEPALIVE_EXPIRY_SECONDS', '120'))
+REQUEST_TIMEOUT = float(os.getenv('SCMC_LLM_TIMEOUT_SECONDS', '60'))
+# HTTP/2 needs the optional `h2` package (pip install httpx[http2])
+HTTP2 = os.getenv('SCMC_LLM_HTTP2', 'auto')
+
+# Runnable config metadata key naming the response-cache use case of a call
+CACHE_METADATA_KEY = 'llm_cache'
+# Metadata flag that keeps a call's raw text out of the response cache (the caller caches a derived result)
+CACHE_BYPASS_KEY = 'llm_cache_bypass'
+
+
+def cache_config(use_case: str) -> Dict[str, Any]:
+    """Config for chain.invoke/ainvoke that routes the LLM call through the response cache"""
+    return {'metadata': {CACHE_METADATA_KEY: use_case}}
+
+
+def _cache_use_case(config: Optional[Dict[str, Any]]) -> Optional[str]:
+    return ((config or {}).get('metadata') or {}).get(CACHE_METADATA_KEY)
+
+
+def _cache_bypassed(config: Optional[Dict[str, Any]]) -> bool:
+    return bool(((config or {}).get('metadata') or {}).get(CACHE_BYPASS_KEY))
+
+
+def _flight_key(key: str, config: Optional[Dict[str, Any]]) -> str:
+    """Single-flight key: callers only share a call made at their priority, cache routing and runtime config"""
+    use_case = _cache_use_case(config)
+    configurable = json.dumps((config or {}).get('configurable') or {}, sort_keys=True, default=str)
+    return f"{scheduling_class(use_case)}|{use_case}|{_cache_bypassed(config)}|{configurable}|{key}"
+
+
+def _http2_enabled() -> bool:
+    if HTTP2 == 'auto':
+        return importlib.util.find_spec('h2') is not None
+    return HTTP2.lower() in ('1', 'true', 'yes')
+
+
+class _ClientStats:
+    """Request counters fed by httpx event hooks"""
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def on_request(self, request: httpx.Request):
+        request.extensions['scmc_started'] = time.perf_counter()
+
+    def on_response(self, response: httpx.Response):
+        started = response.request.extensions.get('scmc_started')
+        with self._lock:
+            self.requests += 1
+            if response.status_code >= 400:
+                self.errors += 1
+            if started is not None:
+                self.total_seconds += time.perf_counter() - started
+
+    async def aon_request(self, request: httpx.Request):
+        self.on_request(request)
+
+    async def aon_response(self, response: httpx.Response):
+        self.on_response(response)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'errors': self.errors,
+                'avg_seconds': self.total_seconds / self.requests if self.requests else 0.0
+            }
+
+
+def _pool_snapshot(client: Optional[Any]) -> Dict[str, Any]:
+    """Open/idle connection counts of an httpx client's transport pool"""
+    if client is None:
+        return {'open': 0, 'idle': 0, 'http2': 0}
+    pool = getattr(getattr(client, '_transport', None), '_pool', None)
+    connections = list(getattr(pool, 'connections', []))
+    return {
+        'open': len(connections),
+        'idle': sum(1 for connection in connections if connection.is_idle()),
+        'http2': sum(1 for connection in connections if 'HTTP/2' in connection.info())
+    }
+
 
 class Model(Runnable):
     def __init__(self, model_name: str = 'AI21/j2-ultra-instruct'):
@@ -14,24 +121,234 @@ class Model(Runnable):
             "X-Title": "SCMC-Project",
             "Content-Type": "application/json"
         }
+        self.http2 = _http2_enabled()
+        self.limits = httpx.Limits(
+            max_connections=MAX_CONNECTIONS,
+            max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=KEEPALIVE_EXPIRY
+        )
+        self._sync_stats = _ClientStats()
+        self._async_stats = _ClientStats()
+        self._http_client: Optional[httpx.Client] = None
+        self._http_async_client: Optional[httpx.AsyncClient] = None
+        self._llm: Optional[ChatOpenAI] = None
+        self._hedge_llm: Optional[ChatOpenAI] = None
+        self._lock = threading.Lock()
+        self.cache = ResponseCache()
+        self.flights = SingleFlight()
+        self.scheduler = create_scheduler()
+        self.resilience = ResiliencePolicy()
+        self.structured = StructuredGenerator()
 
     def __get_model__(self) -> ChatOpenAI:
+        # One ChatOpenAI and one pair of pooled HTTP clients per process, so TLS
+        # sessions and keep-alive connections are reused across calls
+        if self._llm is None:
+            with self._lock:
+                if self._llm is None:
+                    self._http_client = httpx.Client(
+                        http2=self.http2,
+                        limits=self.limits,
+                        timeout=REQUEST_TIMEOUT,
+                        event_hooks={
+                            'request': [self._sync_stats.on_request],
+                            'response': [self._sync_stats.on_response]
+                        }
+                    )
+                    self._http_async_client = httpx.AsyncClient(
+                        http2=self.http2,
+                        limits=self.limits,
+                        timeout=REQUEST_TIMEOUT,
+                        event_hooks={
+                            'request': [self._async_stats.aon_request],
+                            'response': [self._async_stats.aon_response]
+                        }
+                    )
+                    self._llm = self._chat_model(self.model_name)
+                    if HEDGE_MODEL:
+                        self._hedge_llm = self._chat_model(HEDGE_MODEL)
+        return self._llm
+
+    def _chat_model(self, model_name: str) -> ChatOpenAI:
+        # Retries and deadlines are handled by self.resilience, not the OpenAI client
         return ChatOpenAI(
-            model=self.model_name,
+            model=model_name,
             base_url=self.url,
             api_key=self.api_key,
             temperature=self.temperature,
             max_tokens=self.max_tokens,
-            default_headers=self.default_headers
+            default_headers=self.default_headers,
+            timeout=ATTEMPT_TIMEOUT_SECONDS,
+            max_retries=0,
+            http_client=self._http_client,
+            http_async_client=self._http_async_client
         )
 
-    def ask(self, prompt) -> str:
-        model = self.__get_model__()
-        response = model.invoke(prompt)
+    def _cache_key(self, prompt) -> str:
+        return self.cache.key(self.model_name, self.temperature, prompt)
+
+    def ask(self, prompt, use_case: Optional[str] = None) -> str:
+        response = self.invoke(prompt, config=cache_config(use_case) if use_case else None)
         return getattr(response, "content", str(response))
 
     def invoke(self, input, config=None):
         model = self.__get_model__()
-        return model.invoke(input, config=config)
+        use_case = _cache_use_case(config)
+
+        def generate():
+            return self.resilience.call_sync(lambda: model.invoke(input, config=config), scheduling_class(use_case))
+
+        if not self.cache.cacheable(use_case):
+            return generate()
+
+        key = self._cache_key(input)
+        cached = self.cache.get(use_case, key)
+        if cached is not None:
+            return AIMessage(content=cached)
+        response = generate()
+        self.cache.put(use_case, key, getattr(response, "content", str(response)))
+        return response
+
+    async def aask(self, prompt, use_case: Optional[str] = None) -> str:
+        response = await self.ainvoke(prompt, config=cache_config(use_case) if use_case else None)
+        return getattr(response, "content", str(response))
+
+    async def ainvoke(self, input, config=None, **kwargs):
+        # Native async call on the shared AsyncClient (Runnable's default would use a thread)
+        model = self.__get_model__()
+        use_case = _cache_use_case(config)
+        # Extra model kwargs change the request, so such calls are neither cached nor shared
+        cacheable = self.cache.cacheable(use_case) and not kwargs and not _cache_bypassed(config)
+        key = self._cache_key(input)
+
+        if cacheable:
+            # The persistent tier is blocking SQLite I/O; the memory tier alone is safe on the loop
+            if self.cache.db_path:
+                cached = await run_blocking(self.cache.get, use_case, key)
+            else:
+                cached = self.cache.get(use_case, key)
+            if cached is not None:
+                return AIMessage(content=cached)
+
+        async def generate():
+            llm_class = scheduling_class(use_case)
+            hedge = None
+            if self._hedge_llm is not None:
+                hedge = lambda: self._hedge_llm.ainvoke(input, config=config, **kwargs)
+            async with self.scheduler.slot(llm_class):
+                response = await self.resilience.call(
+                    lambda: model.ainvoke(input, config=config, **kwargs), hedge=hedge, llm_class=llm_class
+                )
+            if cacheable:
+                content = getattr(response, "content", str(response))
+                if self.cache.db_path:
+                    await run_blocking(self.cache.put, use_case, key, content)
+                else:
+                    self.cache.put(use_case, key, content)
+            return response
+
+        # Identical requests in flight at the same time share one provider call
+        return await self.flights.do(_flight_key(key, config) if not kwargs else None, generate)
+
+    async def agenerate_items(self, prompt: str, item_model: Type[BaseModel], count: int, name: str = 'items',
+                              use_case: Optional[str] = None) -> List[BaseModel]:
+        """`count` items validated against item_model, using the provider's structured output mode"""
+        config = {'metadata': {CACHE_METADATA_KEY: use_case, CACHE_BYPASS_KEY: True}}
+        key = self._cache_key(f"{name}:{count}:{prompt}")
+        cacheable = self.cache.cacheable(use_case)
+
+        if cacheable:
+            cached = await run_blocking(self.cache.get, use_case, key) if self.cache.db_path else self.cache.get(use_case, key)
+            if cached is not None:
+                return [item_model.model_validate(item) for item in json.loads(cached)]
+
+        async def call(text: str, request_kwargs: Dict[str, Any]):
+            # Only the validated items are cached; raw attempts may be invalid
+            return await self.ainvoke(text, config=config, **request_kwargs)
+
+        async def generate():
+            items = await self.structured.generate(call, prompt, item_model, count, name)
+            if cacheable:
+                content = json.dumps([item.model_dump() for item in items], ensure_ascii=False)
+                if self.cache.db_path:
+                    await run_blocking(self.cache.put, use_case, key, content)
+                else:
+                    self.cache.put(use_case, key, content)
+            return items
+
+        return await self.flights.do(_flight_key(key, config), generate)
+
+    def stream(self, input, config=None, **kwargs) -> Iterator:
+        model = self.__get_model__()
+        yield from model.stream(input, config=config, **kwargs)
+
+    async def astream(self, input, config=None, **kwargs) -> AsyncIterator:
+        model = self.__get_model__()
+        policy = self.resilience
+
+        async def open_stream():
+            # Retried as a unit until the first chunk arrives; later failures end the stream
+            chunks = model.astream(input, config=config, **kwargs).__aiter__()
+            try:
+                return await chunks.__anext__(), chunks
+            except BaseException:
+                await chunks.aclose()
+                raise
+
+        # The slot is held until the stream is exhausted or closed
+        async with self.scheduler.slot(INTERACTIVE):
+            try:
+                first, chunks = await policy.call(open_stream, llm_class=INTERACTIVE)
+            except StopAsyncIteration:
+                return
+            try:
+                yield first
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(chunks.__anext__(), policy.attempt_timeout)
+                    except StopAsyncIteration:
+                        break
+                    yield chunk
+            except Exception as e:
+                if is_transient(e):
+                    policy.breaker.record_failure()
+                raise
+            finally:
+                await chunks.aclose()
+
+    def pool_stats(self) -> Dict[str, Any]:
+        """Connection pool, request, cache, coalescing, scheduling, resilience and structured output statistics of the shared LLM clients"""
+        return {
+            'http2': self.http2,
+            'max_connections': self.limits.max_connections,
+            'max_keepalive_connections': self.limits.max_keepalive_connections,
+            'sync': {**self._sync_stats.snapshot(), **_pool_snapshot(self._http_client)},
+            'async': {**self._async_stats.snapshot(), **_pool_snapshot(self._http_async_client)},
+            'cache': self.cache.stats(),
+            'single_flight': self.flights.stats(),
+            'scheduler': self.scheduler.stats(),
+            'resilience': self.resilience.stats(),
+            'structured_output': self.structured.stats()
+        }
+
+    def close(self):
+        """Close the pooled clients (application shutdown)"""
+        with self._lock:
+            if self._http_client is not None:
+                self._http_client.close()
+            self._http_client = None
+            self._llm = None
+            self._hedge_llm = None
+
+    async def aclose(self):
+        client = self._http_async_client
+        self._http_async_client = None
+        self.close()
+        if client is not None:
+            try:
+                await client.aclose()
+            except RuntimeError:
+                # Connections opened on an event loop that is already closed
+                pass
 
-MCMC = Model()
\ No newline at end of file
+MCMC = Model()
@@ -0,0 +1,268 @@
+import os
+import time
+import random
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+
+import httpx
+import openai
+
+from Apps.Model.scheduler import LLMBusyError
+
+
+T = TypeVar('T')
+
+# Whole-call budget including retries, and the budget of a single provider attempt
+DEADLINE_SECONDS = float(os.getenv('SCMC_LLM_DEADLINE_SECONDS', '45'))
+ATTEMPT_TIMEOUT_SECONDS = float(os.getenv('SCMC_LLM_ATTEMPT_TIMEOUT_SECONDS', '20'))
+RETRIES = int(os.getenv('SCMC_LLM_RETRIES', '2'))
+BACKOFF_BASE_SECONDS = float(os.getenv('SCMC_LLM_RETRY_BACKOFF_SECONDS', '0.5'))
+BACKOFF_MAX_SECONDS = float(os.getenv('SCMC_LLM_RETRY_BACKOFF_MAX_SECONDS', '4'))
+# Secondary model raced against a slow primary attempt; disabled when unset
+HEDGE_MODEL = os.getenv('SCMC_LLM_HEDGE_MODEL', '')
+HEDGE_AFTER_SECONDS = float(os.getenv('SCMC_LLM_HEDGE_AFTER_SECONDS', '6'))
+BREAKER_FAILURES = int(os.getenv('SCMC_LLM_BREAKER_FAILURES', '5'))
+BREAKER_RESET_SECONDS = float(os.getenv('SCMC_LLM_BREAKER_RESET_SECONDS', '30'))
+
+
+class LLMUnavailableError(LLMBusyError):
+    """The provider kept failing or timing out within the call's deadline (HTTP 503)"""
+
+    status_code = 503
+
+
+class CircuitOpenError(LLMUnavailableError):
+    """Raised without calling the provider while the circuit breaker is open"""
+
+
+def is_transient(error: BaseException) -> bool:
+    """Errors worth retrying: timeouts, connection failures, rate limits and 5xx responses"""
+    if isinstance(error, (asyncio.TimeoutError, openai.APITimeoutError, openai.APIConnectionError,
+                          openai.RateLimitError, openai.InternalServerError, httpx.TransportError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in (408, 409, 429) or error.status_code >= 500
+    return False
+
+
+class CircuitBreaker:
+    """Opens after consecutive transient failures and lets one probe through once the reset time passes"""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = BREAKER_FAILURES, reset_seconds: float = BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self.short_circuited = 0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def retry_after(self) -> int:
+        return max(1, int(self.opened_at + self.reset_seconds - time.monotonic()))
+
+    def before_call(self, llm_class: str):
+        """Raise CircuitOpenError unless a call may go to the provider now"""
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_seconds:
+                self.state = self.HALF_OPEN
+            if self.state == self.CLOSED:
+                return
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return
+            self.short_circuited += 1
+            retry_after = self.retry_after()
+        raise CircuitOpenError(llm_class, "The AI service is temporarily unavailable", retry_after)
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.state == self.HALF_OPEN or (self.state == self.CLOSED and self.failures >= self.failure_threshold):
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+                self.times_opened += 1
+
+    def abandon(self):
+        """A probe was cancelled before it finished; let the next call probe instead"""
+        with self._lock:
+            self._probing = False
+
+    @property
+    def is_open(self) -> bool:
+        return self.state == self.OPEN
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'state': self.state,
+                'consecutive_failures': self.failures,
+                'times_opened': self.times_opened,
+                'short_circuited': self.short_circuited
+            }
+
+
+class ResiliencePolicy:
+    """Deadline, jittered retries, optional hedging and a circuit breaker around provider calls.
+
+    Each attempt gets ATTEMPT_TIMEOUT_SECONDS, bounded by what is left of the
+    call's deadline. Transient failures are retried with full-jitter
+    exponential backoff; anything else (bad request, auth) is raised at once.
+    When a hedge is supplied and the primary attempt is still running after
+    HEDGE_AFTER_SECONDS, the hedge is started too and the first success wins.
+    Exhausted calls raise LLMUnavailableError, so endpoints can fall back.
+    """
+
+    def __init__(self, breaker: Optional[CircuitBreaker] = None, deadline: float = DEADLINE_SECONDS,
+                 attempt_timeout: float = ATTEMPT_TIMEOUT_SECONDS, retries: int = RETRIES,
+                 backoff_base: float = BACKOFF_BASE_SECONDS, backoff_max: float = BACKOFF_MAX_SECONDS,
+                 hedge_after: float = HEDGE_AFTER_SECONDS):
+        self.breaker = breaker or CircuitBreaker()
+        self.deadline = deadline
+        self.attempt_timeout = attempt_timeout
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge_after = hedge_after
+        self.calls = 0
+        self.retried = 0
+        self.failed = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self._lock = threading.Lock()
+
+    def _count(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _unavailable(self, llm_class: str, error: Optional[BaseException]) -> LLMUnavailableError:
+        self._count('failed')
+        if self.breaker.is_open:
+            return CircuitOpenError(llm_class, "The AI service is temporarily unavailable", self.breaker.retry_after())
+        return LLMUnavailableError(llm_class, f"The AI service did not respond in time: {error!r}", max(1, int(self.backoff_max)))
+
+    async def _attempt(self, primary: Callable[[], Awaitable[T]], hedge: Optional[Callable[[], Awaitable[T]]]) -> T:
+        if hedge is None or self.hedge_after <= 0:
+            return await primary()
+
+        first = asyncio.ensure_future(primary())
+        second = None
+        try:
+            done, _ = await asyncio.wait({first}, timeout=self.hedge_after)
+            if done:
+                return first.result()
+
+            self._count('hedged')
+            second = asyncio.ensure_future(hedge())
+            pending = {first, second}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if not task.cancelled() and task.exception() is None:
+                        if task is second:
+                            self._count('hedge_wins')
+                        return task.result()
+            # Both failed; report the primary's error
+            return first.result()
+        finally:
+            for task in (first, second):
+                if task is not None and not task.done():
+                    task.cancel()
+
+    async def call(self, primary: Callable[[], Awaitable[T]], hedge: Optional[Callable[[], Awaitable[T]]] = None,
+                   llm_class: str = 'interactive') -> T:
+        self._count('calls')
+        self.breaker.before_call(llm_class)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.deadline
+        error: Optional[BaseException] = None
+
+        try:
+            for attempt in range(self.retries + 1):
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    result = await asyncio.wait_for(self._attempt(primary, hedge), min(self.attempt_timeout, remaining))
+                except Exception as e:
+                    if not is_transient(e):
+                        # The provider answered; the request itself is at fault
+                        self.breaker.record_success()
+                        raise
+                    error = e
+                    self.breaker.record_failure()
+                    if self.breaker.is_open or attempt == self.retries:
+                        break
+                    delay = self._backoff(attempt)
+                    if loop.time() + delay >= deadline:
+                        break
+                    self._count('retried')
+                    await asyncio.sleep(delay)
+                    continue
+                self.breaker.record_success()
+                return result
+        except asyncio.CancelledError:
+            self.breaker.abandon()
+            raise
+        raise self._unavailable(llm_class, error) from error
+
+    def call_sync(self, func: Callable[[], T], llm_class: str = 'interactive') -> T:
+        """Blocking variant without hedging; the attempt timeout is enforced by the HTTP client"""
+        self._count('calls')
+        self.breaker.before_call(llm_class)
+        deadline = time.monotonic() + self.deadline
+        error: Optional[BaseException] = None
+
+        for attempt in range(self.retries + 1):
+            try:
+                result = func()
+            except Exception as e:
+                if not is_transient(e):
+                    self.breaker.record_success()
+                    raise
+                error = e
+                self.breaker.record_failure()
+                if self.breaker.is_open or attempt == self.retries:
+                    break
+                delay = self._backoff(attempt)
+                if time.monotonic() + delay >= deadline:
+                    break
+                self._count('retried')
+                time.sleep(delay)
+                continue
+            self.breaker.record_success()
+            return result
+        raise self._unavailable(llm_class, error) from error
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = {
+                'calls': self.calls,
+                'retried': self.retried,
+                'failed': self.failed,
+                'hedged': self.hedged,
+                'hedge_wins': self.hedge_wins
+            }
+        return {
+            **counters,
+            'deadline_seconds': self.deadline,
+            'attempt_timeout_seconds': self.attempt_timeout,
+            'hedge_model': HEDGE_MODEL or None,
+            'breaker': self.breaker.stats()
+        }
@@ -0,0 +1,249 @@
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from Apps.utils.database import get_pool
+
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+CACHE_ENABLED = os.getenv('SCMC_LLM_CACHE_ENABLED', '1').lower() in ('1', 'true', 'yes')
+# Upper bound on the memory tier, counted as UTF-8 bytes of cached responses
+CACHE_MAX_BYTES = int(os.getenv('SCMC_LLM_CACHE_MAX_BYTES', str(32 * 1024 * 1024)))
+# Persistent tier shared by workers and restarts; disabled when unset
+CACHE_DB_PATH = os.getenv('SCMC_LLM_CACHE_DB', '')
+
+# Seconds a generation stays reusable, per use case. Use cases not listed
+# (chat, exercise feedback) are never cached.
+DEFAULT_TTLS = {
+    'quiz': 6 * 3600,
+    'exercise': 3600,
+    'timetable': 3600,
+    'suggestions': 1800,
+}
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def _load_ttls() -> Dict[str, int]:
+    """Default TTLs overridden by SCMC_LLM_CACHE_TTL_<USE_CASE> (0 disables a use case)"""
+    ttls = dict(DEFAULT_TTLS)
+    for use_case in list(ttls):
+        value = os.getenv(f'SCMC_LLM_CACHE_TTL_{use_case.upper()}')
+        if value is not None:
+            ttls[use_case] = int(value)
+    return ttls
+
+
+def normalize_prompt(prompt: Any) -> str:
+    """Prompt text with whitespace runs collapsed, so formatting-only differences share an entry"""
+    if hasattr(prompt, 'to_string'):
+        text = prompt.to_string()
+    elif isinstance(prompt, list):
+        text = '\n'.join(getattr(message, 'content', str(message)) for message in prompt)
+    else:
+        text = str(prompt)
+    return _WHITESPACE.sub(' ', text).strip()
+
+
+class _MemoryTier:
+    """LRU of (response, expires_at) bounded by total response size"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.evictions = 0
+        self._entries: 'OrderedDict[str, Tuple[str, float, int]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str, now: float) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            response, expires_at, size = entry
+            if expires_at <= now:
+                del self._entries[key]
+                self.bytes -= size
+                return None
+            self._entries.move_to_end(key)
+            return response
+
+    def put(self, key: str, response: str, expires_at: float):
+        size = len(response.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.bytes -= previous[2]
+            self._entries[key] = (response, expires_at, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self.bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class _SQLiteTier:
+    """Persistent entries in a dedicated SQLite file, read through the shared connection pool"""
+
+    # Expired rows are deleted on every Nth write
+    PRUNE_EVERY = 100
+
+    def __init__(self, db_path: str):
+        self.pool = get_pool(db_path)
+        self._writes = 0
+        with self.pool.connection() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS llm_response_cache (
+                    cache_key TEXT PRIMARY KEY,
+                    use_case TEXT NOT NULL,
+                    response TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                ) WITHOUT ROWID
+            ''')
+            conn.commit()
+
+    def get(self, key: str, now: float) -> Optional[Tuple[str, float]]:
+        with self.pool.connection() as conn:
+            row = conn.execute(
+                'SELECT response, expires_at FROM llm_response_cache WHERE cache_key = ? AND expires_at > ?',
+                (key, now)
+            ).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def put(self, key: str, use_case: str, response: str, expires_at: float):
+        self._writes += 1
+        with self.pool.connection() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO llm_response_cache (cache_key, use_case, response, expires_at) VALUES (?, ?, ?, ?)',
+                (key, use_case, response, expires_at)
+            )
+            if self._writes % self.PRUNE_EVERY == 0:
+                conn.execute('DELETE FROM llm_response_cache WHERE expires_at <= ?', (time.time(),))
+            conn.commit()
+
+    def clear(self):
+        with self.pool.connection() as conn:
+            conn.execute('DELETE FROM llm_response_cache')
+            conn.commit()
+
+
+class ResponseCache:
+    """Two-tier cache of LLM generations keyed on model, temperature and normalized prompt.
+
+    Lookups try the in-process LRU first, then the optional SQLite tier, whose
+    hits are promoted into memory. Only use cases with a TTL are cached; the
+    SQLite tier does blocking I/O, so async callers run it in the worker pool.
+    """
+
+    def __init__(self, max_bytes: int = CACHE_MAX_BYTES, db_path: str = CACHE_DB_PATH,
+                 ttls: Optional[Dict[str, int]] = None, enabled: bool = CACHE_ENABLED):
+        self.enabled = enabled
+        self.ttls = ttls if ttls is not None else _load_ttls()
+        self.memory = _MemoryTier(max_bytes)
+        self.db_path = db_path
+        self._sqlite: Optional[_SQLiteTier] = None
+        self._sqlite_lock = threading.Lock()
+        self._counters: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def cacheable(self, use_case: Optional[str]) -> bool:
+        return self.enabled and bool(use_case) and self.ttls.get(use_case, 0) > 0
+
+    def key(self, model_name: str, temperature: float, prompt: Any) -> str:
+        payload = json.dumps([model_name, temperature, normalize_prompt(prompt)], ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _sqlite_tier(self) -> Optional[_SQLiteTier]:
+        if not self.db_path:
+            return None
+        if self._sqlite is None:
+            with self._sqlite_lock:
+                if self._sqlite is None:
+                    self._sqlite = _SQLiteTier(self.db_path)
+        return self._sqlite
+
+    def _count(self, use_case: str, counter: str):
+        with self._lock:
+            counters = self._counters.setdefault(use_case, {'hits': 0, 'sqlite_hits': 0, 'misses': 0, 'stores': 0})
+            counters[counter] += 1
+
+    def get(self, use_case: str, key: str) -> Optional[str]:
+        """Cached response for a key, or None on a miss"""
+        now = time.time()
+        response = self.memory.get(key, now)
+        if response is not None:
+            self._count(use_case, 'hits')
+            return response
+
+        sqlite_tier = self._sqlite_tier()
+        if sqlite_tier is not None:
+            try:
+                row = sqlite_tier.get(key, now)
+            except Exception as e:
+                logger.warning(f"LLM cache read failed: {e}")
+                row = None
+            if row is not None:
+                response, expires_at = row
+                self.memory.put(key, response, expires_at)
+                self._count(use_case, 'hits')
+                self._count(use_case, 'sqlite_hits')
+                return response
+
+        self._count(use_case, 'misses')
+        return None
+
+    def put(self, use_case: str, key: str, response: str):
+        if not response:
+            return
+        expires_at = time.time() + self.ttls[use_case]
+        self.memory.put(key, response, expires_at)
+        sqlite_tier = self._sqlite_tier()
+        if sqlite_tier is not None:
+            try:
+                sqlite_tier.put(key, use_case, response, expires_at)
+            except Exception as e:
+                logger.warning(f"LLM cache write failed: {e}")
+        self._count(use_case, 'stores')
+
+    def clear(self):
+        self.memory.clear()
+        sqlite_tier = self._sqlite_tier()
+        if sqlite_tier is not None:
+            sqlite_tier.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            use_cases = {use_case: dict(counters) for use_case, counters in self._counters.items()}
+        hits = sum(counters['hits'] for counters in use_cases.values())
+        misses = sum(counters['misses'] for counters in use_cases.values())
+        return {
+            'enabled': self.enabled,
+            'ttls': self.ttls,
+            'entries': len(self.memory),
+            'bytes': self.memory.bytes,
+            'max_bytes': self.memory.max_bytes,
+            'evictions': self.memory.evictions,
+            'sqlite': bool(self.db_path),
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / (hits + misses) if hits + misses else 0.0,
+            'use_cases': use_cases
+        }
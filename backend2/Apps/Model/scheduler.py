@@ -0,0 +1,245 @@
+import os
+import time
+import heapq
+import asyncio
+import itertools
+import threading
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+
+# Provider calls allowed in flight across all classes
+MAX_CONCURRENCY = int(os.getenv('SCMC_LLM_MAX_CONCURRENCY', os.getenv('SCMC_LLM_MAX_CONNECTIONS', '20')))
+
+INTERACTIVE = 'interactive'
+BATCH = 'batch'
+
+# Use cases scheduled as background-grade work; everything else (chat, quiz) is interactive
+BATCH_USE_CASES = {'suggestions', 'timetable', 'exercise', 'summary', 'question_bank'}
+
+
+class LLMBusyError(Exception):
+    """Raised instead of queueing a provider call the scheduler cannot serve in time"""
+
+    status_code = 503
+
+    def __init__(self, llm_class: str, message: str, retry_after: int):
+        super().__init__(message)
+        self.llm_class = llm_class
+        self.retry_after = retry_after
+
+
+class LLMQueueFullError(LLMBusyError):
+    """The class's wait queue is at its depth limit (HTTP 429)"""
+
+    status_code = 429
+
+
+class LLMQueueTimeoutError(LLMBusyError):
+    """A queued call did not get a slot within the class's wait limit (HTTP 503)"""
+
+    status_code = 503
+
+
+class SchedulingClass:
+    """Limits and wait-time metrics of one class of provider calls"""
+
+    def __init__(self, name: str, priority: int, concurrency: int, max_queue: int, queue_timeout: float):
+        self.name = name
+        self.priority = priority
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.total_wait = 0.0
+        self.waits: Deque[float] = deque(maxlen=1000)
+
+    @classmethod
+    def from_env(cls, name: str, priority: int, concurrency: int, max_queue: int, queue_timeout: float) -> 'SchedulingClass':
+        prefix = f'SCMC_LLM_{name.upper()}'
+        return cls(
+            name,
+            priority,
+            int(os.getenv(f'{prefix}_CONCURRENCY', str(concurrency))),
+            int(os.getenv(f'{prefix}_MAX_QUEUE', str(max_queue))),
+            float(os.getenv(f'{prefix}_QUEUE_TIMEOUT_SECONDS', str(queue_timeout)))
+        )
+
+    def record_wait(self, seconds: float):
+        self.admitted += 1
+        self.total_wait += seconds
+        self.waits.append(seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        waits = sorted(self.waits)
+
+        def percentile(p: float) -> float:
+            return waits[min(len(waits) - 1, int(p * len(waits)))] if waits else 0.0
+
+        return {
+            'priority': self.priority,
+            'concurrency': self.concurrency,
+            'max_queue': self.max_queue,
+            'active': self.active,
+            'waiting': self.waiting,
+            'admitted': self.admitted,
+            'rejected': self.rejected,
+            'timed_out': self.timed_out,
+            'avg_wait_seconds': self.total_wait / self.admitted if self.admitted else 0.0,
+            'p50_wait_seconds': percentile(0.50),
+            'p95_wait_seconds': percentile(0.95),
+            'max_wait_seconds': waits[-1] if waits else 0.0
+        }
+
+
+class _Waiter:
+    def __init__(self, llm_class: SchedulingClass, future: asyncio.Future):
+        self.llm_class = llm_class
+        self.future = future
+        self.loop = future.get_loop()
+        self.enqueued = time.perf_counter()
+        self.granted = False
+        self.abandoned = False
+
+
+class LLMScheduler:
+    """Admits provider calls by class under a global and a per-class concurrency limit.
+
+    A free slot always goes to the highest-priority waiter whose class is
+    below its own limit, so interactive chat overtakes queued batch work,
+    while the batch limit keeps background generation from taking every
+    slot. Each class has a bounded queue: a full queue fails fast with
+    LLMQueueFullError, and a call that waits longer than the class allows
+    gets LLMQueueTimeoutError.
+    """
+
+    def __init__(self, classes: List[SchedulingClass], max_concurrency: int = MAX_CONCURRENCY):
+        self.max_concurrency = max_concurrency
+        self.classes: Dict[str, SchedulingClass] = {llm_class.name: llm_class for llm_class in classes}
+        self.active = 0
+        self._queue: List[Tuple[int, int, _Waiter]] = []
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+
+    def _has_capacity(self, llm_class: SchedulingClass) -> bool:
+        return self.active < self.max_concurrency and llm_class.active < llm_class.concurrency
+
+    def _start(self, llm_class: SchedulingClass):
+        llm_class.active += 1
+        self.active += 1
+
+    def _release(self, llm_class: SchedulingClass):
+        with self._lock:
+            llm_class.active -= 1
+            self.active -= 1
+            self._dispatch()
+
+    def _dispatch(self):
+        # Called with the lock held: grant free slots in priority order
+        skipped = []
+        while self._queue and self.active < self.max_concurrency:
+            entry = heapq.heappop(self._queue)
+            waiter = entry[2]
+            if waiter.abandoned:
+                continue
+            if not self._has_capacity(waiter.llm_class):
+                skipped.append(entry)
+                continue
+            waiter.granted = True
+            waiter.llm_class.waiting -= 1
+            self._start(waiter.llm_class)
+            waiter.loop.call_soon_threadsafe(self._wake, waiter)
+        for entry in skipped:
+            heapq.heappush(self._queue, entry)
+
+    def _wake(self, waiter: _Waiter):
+        if waiter.future.done():
+            # The caller stopped waiting after the slot was granted
+            self._release(waiter.llm_class)
+        else:
+            waiter.future.set_result(None)
+
+    def _queued_ahead(self, llm_class: SchedulingClass) -> bool:
+        return any(not entry[2].abandoned and entry[0] <= llm_class.priority for entry in self._queue)
+
+    def _retry_after(self, llm_class: SchedulingClass) -> int:
+        return max(1, int(llm_class.queue_timeout / 2))
+
+    async def acquire(self, name: str) -> SchedulingClass:
+        llm_class = self.classes.get(name) or self.classes[INTERACTIVE]
+        with self._lock:
+            if self._has_capacity(llm_class) and not self._queued_ahead(llm_class):
+                self._start(llm_class)
+                llm_class.record_wait(0.0)
+                return llm_class
+            if llm_class.waiting >= llm_class.max_queue:
+                llm_class.rejected += 1
+                raise LLMQueueFullError(
+                    llm_class.name,
+                    f"Too many {llm_class.name} AI requests queued, please retry shortly",
+                    self._retry_after(llm_class)
+                )
+            waiter = _Waiter(llm_class, asyncio.get_running_loop().create_future())
+            heapq.heappush(self._queue, (llm_class.priority, next(self._sequence), waiter))
+            llm_class.waiting += 1
+
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), llm_class.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            with self._lock:
+                granted = waiter.granted
+                if not granted:
+                    waiter.abandoned = True
+                    llm_class.waiting -= 1
+                    if isinstance(e, asyncio.TimeoutError):
+                        llm_class.timed_out += 1
+            if granted:
+                if waiter.future.done():
+                    self._release(llm_class)
+                else:
+                    # _wake has not run yet; it releases the slot when it sees the cancelled future
+                    waiter.future.cancel()
+            if isinstance(e, asyncio.TimeoutError):
+                raise LLMQueueTimeoutError(
+                    llm_class.name,
+                    f"The AI service is busy, {llm_class.name} request timed out in queue",
+                    self._retry_after(llm_class)
+                )
+            raise
+
+        with self._lock:
+            llm_class.record_wait(time.perf_counter() - waiter.enqueued)
+        return llm_class
+
+    @asynccontextmanager
+    async def slot(self, name: str):
+        """Hold one provider slot of the given class for the duration of the block"""
+        llm_class = await self.acquire(name)
+        try:
+            yield
+        finally:
+            self._release(llm_class)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'max_concurrency': self.max_concurrency,
+                'active': self.active,
+                'classes': {name: llm_class.stats() for name, llm_class in self.classes.items()}
+            }
+
+
+def scheduling_class(use_case: Optional[str]) -> str:
+    return BATCH if use_case in BATCH_USE_CASES else INTERACTIVE
+
+
+def create_scheduler() -> LLMScheduler:
+    return LLMScheduler([
+        SchedulingClass.from_env(INTERACTIVE, priority=0, concurrency=16, max_queue=64, queue_timeout=15),
+        SchedulingClass.from_env(BATCH, priority=1, concurrency=4, max_queue=32, queue_timeout=30)
+    ])
@@ -0,0 +1,338 @@
+import os
+import re
+import asyncio
+import time
+import threading
+import logging
+from typing import Any, Dict, List, Optional
+
+import httpx
+import numpy as np
+from sklearn.feature_extraction.text import HashingVectorizer
+
+from Apps.Model.cofing import Link_URL_EMBEDDING
+from Apps.Model.resilience import CircuitBreaker, CircuitOpenError
+
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SEMANTIC_CACHE_ENABLED = os.getenv('SCMC_SEMANTIC_CACHE_ENABLED', '1').lower() in ('1', 'true', 'yes')
+
+# The embedding endpoint is a separate provider with its own key; both must be configured explicitly
+EMBEDDING_URL = os.getenv('SCMC_EMBEDDING_URL', '')
+EMBEDDING_API_KEY = os.getenv('SCMC_EMBEDDING_API_KEY', '')
+EMBEDDING_MODEL = os.getenv('SCMC_EMBEDDING_MODEL', Link_URL_EMBEDDING())
+# Embedding sits in front of every first chat turn, so a slow endpoint must give up quickly
+EMBEDDING_TIMEOUT = float(os.getenv('SCMC_EMBEDDING_TIMEOUT_SECONDS', '1.5'))
+# Consecutive embedding failures that stop remote calls for SCMC_EMBEDDING_BREAKER_RESET_SECONDS
+EMBEDDING_BREAKER_FAILURES = int(os.getenv('SCMC_EMBEDDING_BREAKER_FAILURES', '3'))
+EMBEDDING_BREAKER_RESET_SECONDS = float(os.getenv('SCMC_EMBEDDING_BREAKER_RESET_SECONDS', '60'))
+
+# 'remote' uses the configured embedding endpoint, 'local' a hashing embedder that needs no network
+EMBEDDER = os.getenv('SCMC_SEMANTIC_CACHE_EMBEDDER', 'remote' if EMBEDDING_URL and EMBEDDING_API_KEY else 'local')
+# Cosine similarity a cached question must reach to answer a new one
+SIMILARITY_THRESHOLD = float(os.getenv('SCMC_SEMANTIC_CACHE_THRESHOLD', '0.92'))
+# Character n-grams score paraphrases lower than model embeddings ("how do I" vs "how can I" is about 0.91)
+LOCAL_SIMILARITY_THRESHOLD = float(os.getenv('SCMC_SEMANTIC_CACHE_LOCAL_THRESHOLD', '0.9'))
+# Looser match accepted when the provider is unavailable and the alternative is no answer
+FALLBACK_THRESHOLD = float(os.getenv('SCMC_SEMANTIC_CACHE_FALLBACK_THRESHOLD', '0.8'))
+TTL_SECONDS = int(os.getenv('SCMC_SEMANTIC_CACHE_TTL_SECONDS', str(24 * 3600)))
+# Per category; the oldest entry is overwritten once full
+MAX_ENTRIES = int(os.getenv('SCMC_SEMANTIC_CACHE_MAX_ENTRIES', '2000'))
+# Shorter inputs ("yes", "the second one") are follow-ups that only make sense in context
+MIN_WORDS = int(os.getenv('SCMC_SEMANTIC_CACHE_MIN_WORDS', '4'))
+
+# Stands in for the asking user's name inside cached answers
+NAME_PLACEHOLDER = '{user_name}'
+# Shorter names ("Al", "Jo") cannot be told apart from ordinary words, so such answers are not stored
+MIN_NAME_LENGTH = 3
+
+_WHITESPACE = re.compile(r'\s+')
+_PUNCTUATION = re.compile(r'[^\w\s]')
+
+
+def _normalize(text: str) -> str:
+    return _WHITESPACE.sub(' ', _PUNCTUATION.sub(' ', text)).strip().lower()
+
+
+def _mask_name(answer: str, question: str, user_name: str) -> Optional[str]:
+    """Answer with whole-word occurrences of user_name replaced by the placeholder, or None if unsafe"""
+    if not user_name or user_name == 'User':
+        return answer
+    if len(user_name) < MIN_NAME_LENGTH:
+        return None
+    exact = re.compile(rf'\b{re.escape(user_name)}\b')
+    any_case = re.compile(rf'\b{re.escape(user_name)}\b', re.IGNORECASE)
+    # A name that is also a word of the question or of the answer ("Will", "Mark") is ambiguous
+    if any_case.search(question) or len(any_case.findall(answer)) != len(exact.findall(answer)):
+        return None
+    return exact.sub(NAME_PLACEHOLDER, answer)
+
+
+def _unit_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (vectors / norms).astype(np.float32)
+
+
+class Embedder:
+    """Turns texts into L2-normalized float32 vectors, one row per text"""
+
+    name = 'base'
+    similarity_threshold = SIMILARITY_THRESHOLD
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        raise NotImplementedError
+
+    async def aembed(self, texts: List[str]) -> np.ndarray:
+        return self.embed(texts)
+
+    async def aclose(self):
+        pass
+
+
+class HashingEmbedder(Embedder):
+    """Offline embedder over hashed character n-grams; good for tests and as a fallback"""
+
+    name = 'local'
+    similarity_threshold = LOCAL_SIMILARITY_THRESHOLD
+
+    def __init__(self, dimensions: int = 1024):
+        self.vectorizer = HashingVectorizer(
+            n_features=dimensions,
+            analyzer='char_wb',
+            ngram_range=(3, 5),
+            alternate_sign=False,
+            norm='l2'
+        )
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        matrix = self.vectorizer.transform([_normalize(text) for text in texts])
+        return matrix.toarray().astype(np.float32)
+
+
+class RemoteEmbedder(Embedder):
+    """OpenAI-compatible /embeddings endpoint of the configured embedding model"""
+
+    name = 'remote'
+
+    def __init__(self, base_url: str = EMBEDDING_URL, api_key: str = EMBEDDING_API_KEY, model: str = EMBEDDING_MODEL):
+        if not base_url or not api_key:
+            raise ValueError("The remote embedder needs SCMC_EMBEDDING_URL and SCMC_EMBEDDING_API_KEY")
+        self.url = base_url.rstrip('/') + '/embeddings'
+        self.model = model
+        self.api_key = api_key
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def _payload(self, texts: List[str]) -> Dict[str, Any]:
+        return {'model': self.model, 'input': [_normalize(text) for text in texts]}
+
+    def _parse(self, response: httpx.Response) -> np.ndarray:
+        response.raise_for_status()
+        data = sorted(response.json()['data'], key=lambda item: item['index'])
+        return _unit_rows(np.array([item['embedding'] for item in data], dtype=np.float32))
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        response = httpx.post(
+            self.url,
+            json=self._payload(texts),
+            headers={'Authorization': f'Bearer {self.api_key}'},
+            timeout=EMBEDDING_TIMEOUT
+        )
+        return self._parse(response)
+
+    async def aembed(self, texts: List[str]) -> np.ndarray:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=EMBEDDING_TIMEOUT,
+                headers={'Authorization': f'Bearer {self.api_key}'}
+            )
+        response = await self._client.post(self.url, json=self._payload(texts))
+        return self._parse(response)
+
+    async def aclose(self):
+        client, self._client = self._client, None
+        if client is not None:
+            try:
+                await client.aclose()
+            except RuntimeError:
+                pass
+
+
+def create_embedder(kind: str = EMBEDDER) -> Embedder:
+    if kind == 'remote':
+        if EMBEDDING_URL and EMBEDDING_API_KEY:
+            return RemoteEmbedder()
+        # Never send the chat provider's key to another host
+        logger.warning("SCMC_EMBEDDING_URL or SCMC_EMBEDDING_API_KEY not set, using the local embedder")
+    return HashingEmbedder()
+
+
+class _VectorIndex:
+    """Fixed-capacity ring of unit vectors searched with one matrix-vector product"""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.vectors: Optional[np.ndarray] = None
+        self.expires_at = np.zeros(capacity, dtype=np.float64)
+        self.questions: List[Optional[str]] = [None] * capacity
+        self.answers: List[Optional[str]] = [None] * capacity
+        self.size = 0
+        self._next = 0
+
+    def add(self, vector: np.ndarray, question: str, answer: str, expires_at: float):
+        if self.vectors is None:
+            self.vectors = np.zeros((self.capacity, vector.shape[0]), dtype=np.float32)
+        slot = self._next
+        self.vectors[slot] = vector
+        self.expires_at[slot] = expires_at
+        self.questions[slot] = question
+        self.answers[slot] = answer
+        self._next = (slot + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def search(self, vector: np.ndarray, now: float):
+        """(slot, similarity) of the closest live entry, or None"""
+        if self.size == 0 or self.vectors is None or self.vectors.shape[1] != vector.shape[0]:
+            return None
+        scores = self.vectors[:self.size] @ vector
+        scores[self.expires_at[:self.size] <= now] = -1.0
+        slot = int(np.argmax(scores))
+        if scores[slot] < 0:
+            return None
+        return slot, float(scores[slot])
+
+
+class SemanticCache:
+    """Answers near-duplicate chat questions within a category from earlier replies.
+
+    Questions are embedded and compared by cosine similarity against an
+    in-memory index per category. Only replies generated without prior
+    conversation are stored, so a cached answer never depends on someone
+    else's history; the asker's name is swapped for a placeholder. Repeated
+    embedding failures open a circuit breaker, and lookups miss without
+    calling the embedder until it resets.
+    """
+
+    def __init__(self, embedder: Optional[Embedder] = None, threshold: Optional[float] = None,
+                 ttl_seconds: int = TTL_SECONDS, max_entries: int = MAX_ENTRIES,
+                 enabled: bool = SEMANTIC_CACHE_ENABLED):
+        self.enabled = enabled
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._embedder = embedder
+        self._indexes: Dict[str, _VectorIndex] = {}
+        self._lock = threading.Lock()
+        self.breaker = CircuitBreaker(EMBEDDING_BREAKER_FAILURES, EMBEDDING_BREAKER_RESET_SECONDS)
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.errors = 0
+
+    @property
+    def embedder(self) -> Embedder:
+        if self._embedder is None:
+            self._embedder = create_embedder()
+        return self._embedder
+
+    def set_embedder(self, embedder: Embedder):
+        """Swap the embedder; vectors from the previous one are dropped"""
+        with self._lock:
+            self._embedder = embedder
+            self._indexes.clear()
+
+    @property
+    def similarity_threshold(self) -> float:
+        """Explicit threshold, else the default of the embedder in use"""
+        return self.threshold if self.threshold is not None else self.embedder.similarity_threshold
+
+    def applies_to(self, question: str) -> bool:
+        return self.enabled and len(question.split()) >= MIN_WORDS
+
+    async def _aembed(self, question: str) -> Optional[np.ndarray]:
+        try:
+            self.breaker.before_call('embedding')
+        except CircuitOpenError:
+            return None
+        try:
+            vector = (await self.embedder.aembed([question]))[0]
+        except asyncio.CancelledError:
+            self.breaker.abandon()
+            raise
+        except Exception as e:
+            self.breaker.record_failure()
+            self.errors += 1
+            logger.warning(f"Semantic cache embedding failed: {e}")
+            return None
+        self.breaker.record_success()
+        return vector
+
+    async def embed(self, question: str) -> Optional[np.ndarray]:
+        """Vector of a question for `lookup` and `store`; None if the cache does not apply or embedding failed"""
+        if not self.applies_to(question):
+            return None
+        return await self._aembed(question)
+
+    def lookup(self, category: str, vector: Optional[np.ndarray], user_name: str,
+               threshold: Optional[float] = None) -> Optional[str]:
+        """Cached answer for a question similar enough to one asked before, personalised for user_name"""
+        if vector is None:
+            return None
+
+        with self._lock:
+            index = self._indexes.get(category)
+            match = index.search(vector, time.time()) if index is not None else None
+            if match is None or match[1] < (self.similarity_threshold if threshold is None else threshold):
+                self.misses += 1
+                return None
+            self.hits += 1
+            answer = index.answers[match[0]]
+        return answer.replace(NAME_PLACEHOLDER, user_name)
+
+    def store(self, category: str, question: str, vector: Optional[np.ndarray], answer: str, user_name: str):
+        """Cache an answer under the question's vector from `embed`; cheap enough to run after the response"""
+        if vector is None or not answer:
+            return
+        answer = _mask_name(answer, question, user_name)
+        if answer is None:
+            return
+
+        with self._lock:
+            index = self._indexes.get(category)
+            if index is None:
+                index = self._indexes[category] = _VectorIndex(self.max_entries)
+            elif index.vectors is not None and index.vectors.shape[1] != vector.shape[0]:
+                # Embedded before the embedder was swapped
+                return
+            index.add(vector, question, answer, time.time() + self.ttl_seconds)
+            self.stores += 1
+
+    def clear(self):
+        with self._lock:
+            self._indexes.clear()
+
+    async def aclose(self):
+        if self._embedder is not None:
+            await self._embedder.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'embedder': self._embedder.name if self._embedder is not None else EMBEDDER,
+                'threshold': self.similarity_threshold if self._embedder is not None else self.threshold,
+                'entries': {category: index.size for category, index in self._indexes.items()},
+                'hits': self.hits,
+                'misses': self.misses,
+                'stores': self.stores,
+                'errors': self.errors,
+                'breaker': self.breaker.stats(),
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
+
+
+# Global instance
+semantic_cache = SemanticCache()
@@ -0,0 +1,86 @@
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+
+
+T = TypeVar('T')
+
+
+class _Flight:
+    """One upstream call and the callers currently waiting on it"""
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.loop = task.get_loop()
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Coalesces concurrent async calls that share a key into one upstream call.
+
+    The first caller for a key starts the call as its own task; callers that
+    arrive while it is running wait on the same task and get the same result or
+    exception. A caller that is cancelled stops waiting without disturbing the
+    others; the upstream call is only cancelled once nobody is waiting for it.
+    Finished calls are forgotten immediately, so this never serves stale data.
+    """
+
+    def __init__(self):
+        self._flights: Dict[str, _Flight] = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.upstream = 0
+        self.coalesced = 0
+        self.abandoned = 0
+        self.errors = 0
+
+    def _finished(self, key: str, flight: _Flight):
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            if not flight.task.cancelled() and flight.task.exception() is not None:
+                self.errors += 1
+
+    async def do(self, key: Optional[str], func: Callable[[], Awaitable[T]]) -> T:
+        """Await func() once per key across concurrent callers; a None key disables sharing"""
+        if key is None:
+            return await func()
+
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            self.calls += 1
+            flight = self._flights.get(key)
+            # Tasks cannot be awaited from another event loop
+            if flight is None or flight.loop is not loop or flight.task.done():
+                flight = _Flight(loop.create_task(func()))
+                flight.task.add_done_callback(lambda _, key=key, flight=flight: self._finished(key, flight))
+                self._flights[key] = flight
+                self.upstream += 1
+            else:
+                self.coalesced += 1
+            flight.waiters += 1
+
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            # Only a cancelled caller can leave while the call is still running
+            with self._lock:
+                flight.waiters -= 1
+                orphaned = flight.waiters == 0 and not flight.task.done()
+                if orphaned:
+                    self.abandoned += 1
+                    if self._flights.get(key) is flight:
+                        del self._flights[key]
+            if orphaned:
+                flight.task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'calls': self.calls,
+                'upstream_calls': self.upstream,
+                'calls_saved': self.coalesced,
+                'abandoned': self.abandoned,
+                'errors': self.errors,
+                'in_flight': len(self._flights)
+            }
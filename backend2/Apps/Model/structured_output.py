@@ -0,0 +1,228 @@
+import os
+import re
+import json
+import logging
+import threading
+from typing import Any, Awaitable, Callable, Dict, List, Tuple, Type
+
+import openai
+from pydantic import BaseModel, ValidationError
+
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# How the schema is sent: 'json_schema' (response_format), 'tools' (forced function call) or 'prompt' (instructions only)
+STRUCTURED_MODE = os.getenv('SCMC_LLM_STRUCTURED_MODE', 'json_schema')
+# Follow-up calls that fix or top up invalid items before giving up on them
+REPAIR_ATTEMPTS = int(os.getenv('SCMC_LLM_STRUCTURED_REPAIRS', '2'))
+
+MODES = ('json_schema', 'tools', 'prompt')
+
+_CODE_FENCE = re.compile(r'^```(?:json)?\s*|\s*```$')
+
+# call(prompt, request_kwargs) -> model message
+LLMCall = Callable[[str, Dict[str, Any]], Awaitable[Any]]
+
+
+class StructuredOutputError(ValueError):
+    """The model returned no valid item, even after repair"""
+
+
+def list_schema(name: str, item_model: Type[BaseModel]) -> Dict[str, Any]:
+    """JSON schema of an object holding a list of item_model under `name`"""
+    item_schema = item_model.model_json_schema()
+    defs = item_schema.pop('$defs', None)
+    schema = {
+        'type': 'object',
+        'properties': {name: {'type': 'array', 'items': item_schema}},
+        'required': [name]
+    }
+    if defs:
+        # References point at #/$defs, so the definitions move to the root
+        schema['$defs'] = defs
+    return schema
+
+
+def request_kwargs(mode: str, name: str, schema: Dict[str, Any]) -> Dict[str, Any]:
+    """Provider request parameters that constrain the reply to `schema`"""
+    if mode == 'json_schema':
+        return {'response_format': {'type': 'json_schema', 'json_schema': {'name': name, 'schema': schema}}}
+    if mode == 'tools':
+        return {
+            'tools': [{'type': 'function', 'function': {'name': f'submit_{name}', 'parameters': schema}}],
+            'tool_choice': {'type': 'function', 'function': {'name': f'submit_{name}'}}
+        }
+    return {}
+
+
+def parse_json_text(text: str) -> Any:
+    """First JSON value in a model reply, tolerating code fences and surrounding prose"""
+    text = _CODE_FENCE.sub('', (text or '').strip())
+    try:
+        return json.loads(text)
+    except ValueError:
+        pass
+    decoder = json.JSONDecoder()
+    for index, char in enumerate(text):
+        if char in '[{':
+            try:
+                return decoder.raw_decode(text, index)[0]
+            except ValueError:
+                continue
+    raise ValueError("No JSON found in model output")
+
+
+def extract_items(message: Any, name: str) -> List[Any]:
+    """Raw items of the `name` list from a tool call or a JSON reply"""
+    tool_calls = getattr(message, 'tool_calls', None)
+    if tool_calls:
+        payload = tool_calls[0].get('args')
+    else:
+        payload = parse_json_text(getattr(message, 'content', str(message)))
+
+    if isinstance(payload, list):
+        return payload
+    if isinstance(payload, dict):
+        if isinstance(payload.get(name), list):
+            return payload[name]
+        lists = [value for value in payload.values() if isinstance(value, list)]
+        if len(lists) == 1:
+            return lists[0]
+        # A single item returned on its own
+        return [payload]
+    return []
+
+
+def _describe(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in err['loc']) or 'item'}: {err['msg']}" for err in error.errors()
+    )
+
+
+def validate_items(raw_items: List[Any], item_model: Type[BaseModel]) -> Tuple[List[BaseModel], List[Tuple[Any, str]]]:
+    """Split raw items into validated models and (item, problems) pairs"""
+    valid, invalid = [], []
+    for raw in raw_items:
+        try:
+            valid.append(item_model.model_validate(raw))
+        except ValidationError as e:
+            invalid.append((raw, _describe(e)))
+    return valid, invalid
+
+
+def repair_prompt(task: str, name: str, invalid: List[Tuple[Any, str]], missing: int) -> str:
+    lines = [f"Some {name} generated for the task below were rejected.", "", "Task:", task.strip(), ""]
+    if invalid:
+        lines.append("Fix each rejected item, changing only what the listed problems require:")
+        for raw, problems in invalid:
+            lines.append(f"- {json.dumps(raw, ensure_ascii=False, default=str)}")
+            lines.append(f"  problems: {problems}")
+        lines.append("")
+    extra = missing - len(invalid)
+    if extra > 0:
+        lines.append(f"Also write {extra} new item(s) for the task.")
+    lines.append(f'Return only the fixed and new items as JSON: {{"{name}": [...]}}')
+    return "\n".join(lines)
+
+
+class StructuredGenerator:
+    """Generates lists of schema-validated items, repairing only the items that fail validation.
+
+    The schema goes to the provider as a JSON-schema response format or a
+    forced tool call (SCMC_LLM_STRUCTURED_MODE). Each returned item is
+    validated on its own; rejected items are sent back with their problems,
+    together with a request for any items still missing, instead of re-running
+    the whole generation. A provider that rejects the structured-output
+    parameters is retried with the schema in the prompt, which is then used
+    for the rest of the process.
+    """
+
+    def __init__(self, mode: str = STRUCTURED_MODE, repair_attempts: int = REPAIR_ATTEMPTS):
+        self.mode = mode if mode in MODES else 'json_schema'
+        self.repair_attempts = repair_attempts
+        self.calls = 0
+        self.items = 0
+        self.invalid_items = 0
+        self.repairs = 0
+        self.mode_fallbacks = 0
+        self.failures = 0
+        self._lock = threading.Lock()
+
+    def _count(self, counter: str, amount: int = 1):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + amount)
+
+    def _instructions(self, mode: str, name: str, schema: Dict[str, Any]) -> str:
+        if mode == 'prompt':
+            return (f'\n\nRespond with only a JSON object of the form {{"{name}": [...]}} matching this JSON schema:\n'
+                    f'{json.dumps(schema, separators=(",", ":"))}')
+        return f'\n\nRespond with a JSON object whose "{name}" list holds the items.'
+
+    async def _request(self, call: LLMCall, prompt: str, name: str, schema: Dict[str, Any]) -> Any:
+        mode = self.mode
+        try:
+            return await call(prompt + self._instructions(mode, name, schema), request_kwargs(mode, name, schema))
+        except openai.BadRequestError as e:
+            if mode == 'prompt':
+                raise
+            # The model or route does not support structured output parameters; stop sending them
+            logger.warning(f"Structured output mode '{mode}' rejected, using prompt instructions: {e}")
+            self.mode = 'prompt'
+            self._count('mode_fallbacks')
+            return await call(prompt + self._instructions('prompt', name, schema), {})
+
+    async def _items(self, call: LLMCall, prompt: str, name: str, schema: Dict[str, Any]) -> List[Any]:
+        try:
+            return extract_items(await self._request(call, prompt, name, schema), name)
+        except ValueError as e:
+            logger.warning(f"Unparseable structured output: {e}")
+            return []
+
+    async def generate(self, call: LLMCall, prompt: str, item_model: Type[BaseModel], count: int,
+                       name: str = 'items') -> List[BaseModel]:
+        self._count('calls')
+        schema = list_schema(name, item_model)
+        accepted: List[BaseModel] = []
+        seen = set()
+
+        def accept(items: List[BaseModel]):
+            for item in items:
+                fingerprint = item.model_dump_json()
+                if fingerprint not in seen and len(accepted) < count:
+                    seen.add(fingerprint)
+                    accepted.append(item)
+
+        valid, invalid = validate_items(await self._items(call, prompt, name, schema), item_model)
+        accept(valid)
+        self._count('invalid_items', len(invalid))
+
+        for _ in range(self.repair_attempts):
+            missing = count - len(accepted)
+            if missing <= 0:
+                break
+            self._count('repairs')
+            invalid = invalid[:missing]
+            valid, invalid = validate_items(
+                await self._items(call, repair_prompt(prompt, name, invalid, missing), name, schema), item_model
+            )
+            accept(valid)
+            self._count('invalid_items', len(invalid))
+
+        self._count('items', len(accepted))
+        if not accepted:
+            self._count('failures')
+            raise StructuredOutputError(f"Model returned no valid {name}")
+        return accepted
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'mode': self.mode,
+                'calls': self.calls,
+                'items': self.items,
+                'invalid_items': self.invalid_items,
+                'repairs': self.repairs,
+                'mode_fallbacks': self.mode_fallbacks,
+                'failures': self.failures
+            }
@@ -1,4 +1,4 @@
-import sqlite3
+from Apps.utils.database import get_db_connection
 from typing import List, Dict
 
 class UserProgressModel:
@@ -7,7 +7,7 @@ class UserProgressModel:
 
     def get_user_progress(self, user_id: str) -> List[Dict]:
         """Retrieve user progress data from the database."""
-        conn = sqlite3.connect(self.db_path)
+        conn = get_db_connection(self.db_path)
         cursor = conn.cursor()
         cursor.execute("SELECT quiz_score, timestamp FROM user_progress WHERE user_id = ?", (user_id,))
         progress_data = cursor.fetchall()
@@ -16,7 +16,7 @@ class UserProgressModel:
 
     def add_user_progress(self, user_id: str, quiz_score: int):
         """Add a new entry for user progress in the database."""
-        conn = sqlite3.connect(self.db_path)
+        conn = get_db_connection(self.db_path)
         cursor = conn.cursor()
         cursor.execute("INSERT INTO user_progress (user_id, quiz_score) VALUES (?, ?)", (user_id, quiz_score))
         conn.commit()
@@ -0,0 +1,139 @@
+import copy
+import sqlite3
+import numpy as np
+from typing import List, Optional
+from sklearn.linear_model import SGDRegressor
+from sklearn.preprocessing import StandardScaler
+
+
+TEMPLATE_FEATURES = {
+    'career': ['interview_score', 'skill_assessment', 'career_goal_progress',
+               'resume_quality', 'networking_score'],
+    'business': ['business_plan_score', 'market_analysis_score', 'financial_projection_score',
+                 'pitch_quality', 'strategy_score'],
+    'education': ['learning_milestone_score', 'concept_mastery', 'study_efficiency',
+                  'knowledge_retention', 'academic_performance'],
+    'finance': ['investment_knowledge', 'budgeting_skills', 'financial_planning',
+                'risk_assessment', 'wealth_management'],
+}
+
+
+class IncrementalRegressor:
+    """Online counterpart of the RandomForest path for one template category.
+
+    Keeps running StandardScaler statistics and an SGDRegressor that are
+    updated with `partial_fit` on the rows added since `watermark` (the last
+    `{category}_metrics.id` folded in). The state is a few arrays, so it is
+    cheap to copy, persist and swap.
+    """
+
+    def __init__(self, category: str, batch_size: int = 5000):
+        self.category = category
+        self.batch_size = batch_size
+        self.columns: List[str] = TEMPLATE_FEATURES[category]
+        self.scaler = StandardScaler()
+        self.model = SGDRegressor(learning_rate='invscaling', eta0=0.01, alpha=1e-4, random_state=42)
+        self.watermark = 0
+        self.n_samples = 0
+
+    @property
+    def is_fitted(self) -> bool:
+        return self.n_samples > 0
+
+    def fit_new_rows(self, conn: sqlite3.Connection) -> int:
+        """Fold in rows newer than the watermark; returns how many were used"""
+        table_name = f"{self.category}_metrics"
+        column_list = ', '.join(self.columns)
+        used = 0
+        while True:
+            rows = conn.execute(f'''
+                SELECT id, {column_list} FROM {table_name}
+                WHERE id > ?
+                ORDER BY id
+                LIMIT ?
+            ''', (self.watermark, self.batch_size)).fetchall()
+            if not rows:
+                return used
+
+            self.watermark = rows[-1][0]
+            data = np.array([row[1:] for row in rows], dtype=float)
+            data = data[~np.isnan(data).any(axis=1)]
+            if len(data):
+                # Last metric is the target, as in the batch RandomForest path
+                X, y = data[:, :-1], data[:, -1]
+                self.scaler.partial_fit(X)
+                self.model.partial_fit(self.scaler.transform(X), y)
+                self.n_samples += len(data)
+                used += len(data)
+
+            if len(rows) < self.batch_size:
+                return used
+
+    def updated(self, conn: sqlite3.Connection) -> Optional['IncrementalRegressor']:
+        """Return a copy with new rows folded in, or None when nothing changed"""
+        candidate = copy.deepcopy(self)
+        if candidate.fit_new_rows(conn) == 0 and candidate.watermark == self.watermark:
+            return None
+        return candidate
+
+
+class IncrementalTrend:
+    """Running least-squares trend over a category's score sequence.
+
+    Mirrors the LinearRegression fitted on (row index, score) by the batch path,
+    from sums that are extended with new `user_progress` rows only.
+    """
+
+    def __init__(self, category: str):
+        self.category = category
+        self.watermark = 0
+        self.n = 0
+        self.sum_x = 0.0
+        self.sum_y = 0.0
+        self.sum_xy = 0.0
+        self.sum_xx = 0.0
+        self.coef_ = np.zeros(1)
+        self.intercept_ = 0.0
+
+    @property
+    def is_fitted(self) -> bool:
+        return self.n > 1
+
+    def fit_new_rows(self, conn: sqlite3.Connection) -> int:
+        rows = conn.execute('''
+            SELECT id, score FROM user_progress
+            WHERE category = ? AND id > ?
+            ORDER BY id
+        ''', (self.category, self.watermark)).fetchall()
+        for row_id, score in rows:
+            x = float(self.n)
+            self.n += 1
+            self.sum_x += x
+            self.sum_y += score
+            self.sum_xy += x * score
+            self.sum_xx += x * x
+            self.watermark = row_id
+
+        denominator = self.n * self.sum_xx - self.sum_x ** 2
+        if self.n > 1 and denominator:
+            slope = (self.n * self.sum_xy - self.sum_x * self.sum_y) / denominator
+            self.coef_ = np.array([slope])
+            self.intercept_ = (self.sum_y - slope * self.sum_x) / self.n
+        return len(rows)
+
+    def updated(self, conn: sqlite3.Connection) -> Optional['IncrementalTrend']:
+        candidate = copy.deepcopy(self)
+        if candidate.fit_new_rows(conn) == 0:
+            return None
+        return candidate
+
+    def predict(self, X) -> np.ndarray:
+        X = np.asarray(X, dtype=float).reshape(-1, 1)
+        return X[:, 0] * self.coef_[0] + self.intercept_
+
+
+def new_incremental_engine(category: str):
+    """Create the online engine matching a category's batch model"""
+    if category in TEMPLATE_FEATURES:
+        return IncrementalRegressor(category)
+    return IncrementalTrend(category)
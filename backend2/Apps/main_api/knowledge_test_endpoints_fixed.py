@@ -1,3 +1,4 @@
+import logging
 from fastapi import HTTPException
 from typing import Dict, Any
 from datetime import datetime
@@ -6,143 +7,139 @@ from Apps.template.prompts import (
     business_chain,
     education_chain,
     financing_chain,
-    update_memory,
-    retrieve_memory,
-    get_user_name,
+    get_chat_context,
     get_db_connection
 )
 
-from Apps.progress_tracker import progress_tracker
-import re
+from Apps.progress_tracker import progress_tracker, QuizSessionUsedError
+from Apps.utils.executor import run_blocking
+from Apps.template.prompt_budget import token_counter, CV_TOKEN_LIMIT
+from Apps.Model.nlp import MCMC, cache_config
+from Apps.Model.scheduler import LLMBusyError
+from Apps.Model.structured_output import StructuredOutputError
+from Apps.template.question_bank import question_bank, add_questions, make_bucket, bucket_subject, quiz_prompt, QuizItem
 
-async def generate_quiz(user_id: str, category: str, num_questions: int = 5):
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def _load_user_profile(user_id: str, columns: str):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(f'''
+        SELECT {columns} FROM users
+        LEFT JOIN education_programs ON users.user_id = education_programs.user_id
+        WHERE users.user_id = ?
+    ''', (user_id,))
+    user_info = cursor.fetchone()
+    conn.close()
+    return user_info
+
+async def generate_quiz(user_id: str, category: str, num_questions: int = 5, difficulty: str = None):
     """Generate a knowledge assessment quiz strictly based on user profile and category"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT name, cv_content, program_name FROM users
-            LEFT JOIN education_programs ON users.user_id = education_programs.user_id
-            WHERE users.user_id = ?
-        ''', (user_id,))
-        user_info = cursor.fetchone()
-        conn.close()
+        user_info = await run_blocking(_load_user_profile, user_id, "name, cv_content, program_name")
 
         if not user_info:
             raise HTTPException(status_code=404, detail="User not found")
 
         name, cv_content, program_name = user_info
 
-        # Create a specific prompt for quiz generation
+        # CV-based career quizzes are personal; every other quiz comes from a shared bank bucket
+        bucket = None
         if category == "career" and cv_content:
-            quiz_prompt = f"""Generate {num_questions} multiple choice questions to assess career knowledge based on this CV content: {cv_content[:1000]}.
-
-Format each question as:
-1. Question text here?
-A) Option A
-B) Option B
-C) Option C
-D) Option D
-
-2. Next question...
-
-Make sure to provide exactly 4 options (A, B, C, D) for each question."""
-        elif category == "education" and program_name:
-            quiz_prompt = f"""Generate {num_questions} multiple choice questions to assess knowledge in {program_name} for beginners.
-
-Format each question as:
-1. Question text here?
-A) Option A
-B) Option B
-C) Option C
-D) Option D
-
-2. Next question...
-
-Make sure to provide exactly 4 options (A, B, C, D) for each question."""
+            subject = f"career knowledge based on this CV content: {token_counter.truncate(cv_content, CV_TOKEN_LIMIT)}"
         else:
-            quiz_prompt = f"""Generate {num_questions} multiple choice questions to assess {category} knowledge for beginners.
-
-Format each question as:
-1. Question text here?
-A) Option A
-B) Option B
-C) Option C
-D) Option D
-
-2. Next question...
-
-Make sure to provide exactly 4 options (A, B, C, D) for each question."""
-
-        # Use a simple LLM call instead of the chain for structured output
-        from Apps.Model.nlp import MCMC
-        quiz_content = MCMC.ask(quiz_prompt)
-
-        questions = []
-        current_question = None
-
-        for line in quiz_content.split('\n'):
-            line = line.strip()
-
-            if re.match(r'^\d+[\).]', line) or line.lower().startswith("question"):
-                if current_question:
-                    questions.append(current_question)
-                q_text = re.sub(r'^\d+[\).]\s*', '', line)
-                current_question = {
-                    "id": f"q{len(questions) + 1}",
-                    "question": q_text.strip(),
-                    "options": [],
-                    "type": "multiple",
-                    "correct_answer": None  # Will be set to first option by default
-                }
+            bucket = make_bucket(category, program_name if category == "education" else None, difficulty)
+            subject = bucket_subject(bucket)
+
+        questions = None
+        if bucket is not None:
+            questions = await run_blocking(question_bank.sample, bucket, num_questions)
+
+        if questions is None:
+            try:
+                items = await MCMC.agenerate_items(quiz_prompt(subject, num_questions), QuizItem, num_questions,
+                                                   name='questions', use_case='quiz')
+            except StructuredOutputError:
+                raise HTTPException(status_code=500, detail="AI failed to generate questions")
+            if bucket is not None:
+                await run_blocking(add_questions, bucket, items, 'live')
+            questions = [
+                {"question": item.question, "options": item.options, "correct_answer": item.options[item.correct_index]}
+                for item in items
+            ]
+
+        # The answer key stays server-side, keyed by the session the client submits against
+        session = await run_blocking(
+            progress_tracker.create_quiz_session, user_id, category,
+            [question["correct_answer"] for question in questions],
+            [question["question"] for question in questions]
+        )
 
-            elif re.match(r'^[A-D][\).]', line) and current_question:
-                option_text = re.sub(r'^[A-D][\).]\s*', '', line)
-                current_question["options"].append(option_text.strip())
-                # Set first option as correct answer (simplified approach)
-                if current_question["correct_answer"] is None:
-                    current_question["correct_answer"] = option_text.strip()
-
-        if current_question:
-            questions.append(current_question)
-
-        if not questions:
-            raise HTTPException(status_code=500, detail="AI failed to generate questions")
-
-        # Store correct answers in progress tracker for later retrieval
-        correct_answers = {q["id"]: q["correct_answer"] for q in questions}
-        progress_tracker.store_quiz_answers(user_id, category, correct_answers)
-
-        return questions
+        return {
+            **session,
+            "questions": [
+                {
+                    "id": f"q{index + 1}",
+                    "question": question["question"],
+                    "options": question["options"],
+                    "type": "multiple"
+                }
+                for index, question in enumerate(questions)
+            ]
+        }
 
+    except (HTTPException, LLMBusyError):
+        raise
     except Exception as e:
-        print(f"DEBUG: Exception in generate_quiz: {str(e)}")
+        logger.exception(f"Quiz generation failed: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to generate quiz: {str(e)}")
 
 
-async def submit_quiz_answers(user_id: str, category: str, answers: Dict[str, Any]):
+async def submit_quiz_answers(user_id: str, category: str, answers: Dict[str, Any], session_id: str = None):
     """Submit quiz answers and calculate score"""
     try:
-        # Retrieve correct answers from progress tracker or database
-        correct_answers_data = progress_tracker.get_correct_answers(user_id, category)
-        total_questions = len(answers)
-        correct_count = 0
-
-        for qid, user_answer in answers.items():
-            correct_answer = correct_answers_data.get(qid)
-            if correct_answer and user_answer.strip().lower() == correct_answer.strip().lower():
-                correct_count += 1
-
-        score = int((correct_count / total_questions) * 100) if total_questions > 0 else 0
-
-        progress_tracker.record_quiz_score(user_id, category, score, total_questions)
+        # One primary-key lookup of the quiz's own answer key
+        session = await run_blocking(progress_tracker.get_quiz_session, user_id, category, session_id)
+        if session is None:
+            raise HTTPException(status_code=404, detail="Quiz session not found or expired")
+        session_id, answer_key, question_texts = session["session_id"], session["answer_key"], session["questions"]
+
+        # Unanswered questions count as wrong
+        results = []
+        for index, correct_answer in enumerate(answer_key):
+            qid = f"q{index + 1}"
+            user_answer = answers.get(qid)
+            user_answer = user_answer.strip() if isinstance(user_answer, str) else ""
+            results.append({
+                "question": question_texts[index] if index < len(question_texts) else qid,
+                "user_answer": user_answer,
+                "is_correct": bool(user_answer) and user_answer.lower() == correct_answer.strip().lower(),
+                "correct_answer": correct_answer
+            })
+
+        # Question results, the score, its notifications and the used-up session are written in one transaction
+        try:
+            graded = await run_blocking(
+                progress_tracker.record_quiz_results, user_id, category, results, None, session_id
+            )
+        except QuizSessionUsedError:
+            raise HTTPException(status_code=409, detail="Quiz already submitted")
+        score, total_questions, correct_count = graded["score"], graded["total_questions"], graded["correct_answers"]
 
         user_level = "beginner" if score < 55 else "intermediate"
         timetable = None
         if score < 55:
-            timetable = await generate_timetable(user_id, category, user_level)
+            try:
+                timetable = await generate_timetable(user_id, category, user_level)
+            except LLMBusyError:
+                # The score is already recorded; the timetable can be requested later
+                timetable = None
 
         return {
+            "session_id": session_id,
             "score": score,
             "total_questions": total_questions,
             "correct_answers": correct_count,
@@ -150,6 +147,8 @@ async def submit_quiz_answers(user_id: str, category: str, answers: Dict[str, An
             "timetable": timetable
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to submit answers: {str(e)}")
 
@@ -157,15 +156,7 @@ async def submit_quiz_answers(user_id: str, category: str, answers: Dict[str, An
 async def generate_timetable(user_id: str, category: str, level: str):
     """Generate a personalized timetable for the user"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT name, program_name, daily_schedule FROM users
-            LEFT JOIN education_programs ON users.user_id = education_programs.user_id
-            WHERE users.user_id = ?
-        ''', (user_id,))
-        user_info = cursor.fetchone()
-        conn.close()
+        user_info = await run_blocking(_load_user_profile, user_id, "name, program_name, daily_schedule")
 
         if not user_info:
             return None
@@ -192,15 +183,14 @@ async def generate_timetable(user_id: str, category: str, level: str):
         if not chain:
             return None
 
-        history = retrieve_memory(user_id, category)
-        user_name = get_user_name(user_id)
+        history, user_name = await run_blocking(get_chat_context, user_id, category)
 
-        output = chain.invoke({
+        output = await chain.ainvoke({
             "history": history,
             "topic": category,
             "user_input": timetable_prompt,
             "user_name": user_name
-        })
+        }, config=cache_config('timetable'))
 
         timetable_content = output.content if hasattr(output, "content") else str(output)
 
@@ -211,6 +201,8 @@ async def generate_timetable(user_id: str, category: str, level: str):
             "generated_at": datetime.now().isoformat()
         }
 
+    except LLMBusyError:
+        raise
     except Exception as e:
-        print(f"DEBUG: Failed to generate timetable: {str(e)}")
+        logger.warning(f"Failed to generate timetable: {e}")
         return None
@@ -1,11 +1,12 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Depends, Header, Request, Query, BackgroundTasks
+from fastapi.responses import StreamingResponse, JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import Dict, Any, Optional
+from pydantic import BaseModel, Field
+from typing import Dict, Any, List, Optional
 from datetime import datetime, timedelta
 import json
-import sqlite3
 import uuid
+import asyncio
 import base64
 import random
 from Apps.template.prompts import (
@@ -14,17 +15,30 @@ from Apps.template.prompts import (
     education_chain,
     financing_chain,
     update_memory,
-    retrieve_memory,
-    get_user_name,
+    get_chat_context,
+    NO_HISTORY,
     get_db_connection,
     init_memory_tables
 )
 from Apps.progress_tracker import progress_tracker
+from Apps.Model.nlp import MCMC, cache_config
+from Apps.Model.semantic_cache import semantic_cache, FALLBACK_THRESHOLD
+from Apps.Model.scheduler import LLMBusyError
+from Apps.Model.resilience import LLMUnavailableError
 from Apps.utils.email_service_brevo import email_service
 from Apps.utils.file_upload import file_upload_service
+from Apps.utils.database import request_connection, release_request_connection
+from Apps.utils.notification_hub import notification_hub
+from Apps.utils.executor import run_blocking, configure_blocking_pool
+from Apps.template.prompt_budget import token_counter, compact_json, CV_TOKEN_LIMIT, TIMETABLE_TOKEN_LIMIT
+from Apps.template.conversation_summary import conversation_summarizer
+from Apps.template.question_bank import question_bank
 from Apps.main_api.knowledge_test_endpoints_fixed import generate_quiz, submit_quiz_answers, generate_timetable
 
-app = FastAPI(title="Mentor AI API")
+# Every request borrows at most one pooled SQLite connection, shared by all helpers it calls.
+# Endpoints that only touch SQLite/email are plain `def` and run in the bounded worker pool;
+# endpoints that call the LLM stay async, await the chains and push blocking work to run_blocking.
+app = FastAPI(title="Mentor AI API", dependencies=[Depends(request_connection)])
 
 origins = [
     "http://localhost:5174",
@@ -39,6 +53,15 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.exception_handler(LLMBusyError)
+async def llm_busy_handler(request: Request, exc: LLMBusyError):
+    """Shed LLM load fast: 429 when a class's queue is full, 503 when a queued call timed out"""
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"detail": str(exc), "llm_class": exc.llm_class},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
 class ChatRequest(BaseModel):
     user_id: str
     category: str
@@ -76,12 +99,28 @@ class QuizQuestionRequest(BaseModel):
     is_correct: bool
     correct_answer: Optional[str] = None
 
+class QuizQuestionResult(BaseModel):
+    question: str
+    user_answer: str
+    is_correct: bool
+    correct_answer: Optional[str] = None
+
+class QuizResultsRequest(BaseModel):
+    user_id: str
+    category: str
+    results: List[QuizQuestionResult] = Field(min_length=1)
+    score: Optional[float] = None
+
 class NotificationReplyRequest(BaseModel):
     user_id: str
     notification_id: int
     reply_message: str
     topic: str
 
+class NotificationBatchReadRequest(BaseModel):
+    user_id: str
+    notification_ids: List[int]
+
 class ExerciseSubmissionRequest(BaseModel):
     user_id: str
     category: str
@@ -93,11 +132,13 @@ class QuizGenerateRequest(BaseModel):
     user_id: str
     category: str
     num_questions: Optional[int] = 5
+    difficulty: Optional[str] = None
 
 class QuizSubmitRequest(BaseModel):
     user_id: str
     category: str
     answers: Dict[str, Any]
+    session_id: Optional[str] = None
 
 class TimetableGenerateRequest(BaseModel):
     user_id: str
@@ -127,17 +168,37 @@ class ConfirmationRequest(BaseModel):
     user_id: str
     confirmation_code: str
 
+@app.on_event("startup")
+def apply_schema_migrations():
+    """Apply pending schema migrations once before serving requests"""
+    configure_blocking_pool()
+    init_memory_tables()
+    progress_tracker.training_scheduler.start()
+
+@app.on_event("shutdown")
+def stop_background_training():
+    progress_tracker.training_scheduler.stop()
+
+@app.on_event("startup")
+async def start_background_llm_workers():
+    conversation_summarizer.start()
+    question_bank.start()
+
+@app.on_event("shutdown")
+async def close_llm_clients():
+    await conversation_summarizer.stop()
+    await question_bank.stop()
+    await MCMC.aclose()
+    await semantic_cache.aclose()
+
 def generate_confirmation_code() -> str:
     """Generate a 6-digit confirmation code"""
     return str(uuid.uuid4().int)[:6]
 
 @app.post("/register")
-async def register_user(user_data: EnhancedUserRegistration):
+def register_user(user_data: EnhancedUserRegistration):
     """Register a new user with enhanced features including CV upload and email confirmation"""
     try:
-        # Initialize database tables
-        init_memory_tables()
-
         # Generate user ID and card ID
         user_id = str(uuid.uuid4())
         # Generate mixed alphanumeric card ID (12 characters)
@@ -229,7 +290,7 @@ async def register_user(user_data: EnhancedUserRegistration):
         raise HTTPException(status_code=500, detail=f"Registration failed: {str(e)}")
 
 @app.post("/confirm")
-async def confirm_email(confirmation: ConfirmationRequest):
+def confirm_email(confirmation: ConfirmationRequest):
     """Confirm user email with verification code"""
     try:
         conn = get_db_connection()
@@ -294,7 +355,7 @@ async def confirm_email(confirmation: ConfirmationRequest):
         raise HTTPException(status_code=500, detail=f"Confirmation failed: {str(e)}")
 
 @app.post("/resend-confirmation")
-async def resend_confirmation(user_id: str):
+def resend_confirmation(user_id: str):
     """Resend confirmation email"""
     try:
         conn = get_db_connection()
@@ -339,7 +400,7 @@ async def resend_confirmation(user_id: str):
         raise HTTPException(status_code=500, detail=f"Failed to resend confirmation: {str(e)}")
 
 @app.get("/user/{user_id}/status")
-async def get_user_status(user_id: str):
+def get_user_status(user_id: str):
     """Check if user is confirmed"""
     try:
         conn = get_db_connection()
@@ -368,8 +429,10 @@ async def get_user_status(user_id: str):
 async def generate_quiz_endpoint(req: QuizGenerateRequest):
     """Generate a quiz for the user"""
     try:
-        quiz_data = await generate_quiz(req.user_id, req.category, req.num_questions)
+        quiz_data = await generate_quiz(req.user_id, req.category, req.num_questions, req.difficulty)
         return quiz_data
+    except (HTTPException, LLMBusyError):
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to generate quiz: {str(e)}")
 
@@ -377,8 +440,10 @@ async def generate_quiz_endpoint(req: QuizGenerateRequest):
 async def submit_quiz_endpoint(req: QuizSubmitRequest):
     """Submit quiz answers"""
     try:
-        result = await submit_quiz_answers(req.user_id, req.category, req.answers)
+        result = await submit_quiz_answers(req.user_id, req.category, req.answers, req.session_id)
         return result
+    except (HTTPException, LLMBusyError):
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to submit quiz: {str(e)}")
 
@@ -388,67 +453,163 @@ async def generate_timetable_endpoint(req: TimetableGenerateRequest):
     try:
         timetable_data = await generate_timetable(req.user_id, req.category, req.level)
         return timetable_data
+    except LLMBusyError:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to generate timetable: {str(e)}")
 
-@app.post("/tools/chat")
-async def chat_endpoint(req: ChatRequest):
-    # Initialize database tables if not exists
-    init_memory_tables()
-    category = req.category.lower()
-    history = retrieve_memory(req.user_id, category)
-    user_name = get_user_name(req.user_id)
-
-    if category == "career":
-        output = career_chain.invoke({
-            "history": history,
-            "topic": req.category,
-            "user_input": req.user_input,
-            "user_name": user_name
-        })
-    elif category == "business":
-        output = business_chain.invoke({
-            "history": history,
-            "topic": req.category,
-            "user_input": req.user_input,
-            "user_name": user_name
-        })
-    elif category == "education":
-        output = education_chain.invoke({
-            "history": history,
-            "topic": req.category,
-            "user_input": req.user_input,
-            "user_name": user_name
-        })
-    elif category == "finance":
-        output = financing_chain.invoke({
-            "history": history,
-            "topic": req.category,
-            "user_input": req.user_input,
-            "user_name": user_name
-        })
-    else:
-        return {"error": f"Invalid category: {req.category}"}
-
-    # Convert to string if needed
-    output_text = output.content if hasattr(output, "content") else str(output)
+CHAT_CHAINS = {
+    "career": career_chain,
+    "business": business_chain,
+    "education": education_chain,
+    "finance": financing_chain
+}
 
+def _record_chat(user_id: str, category: str, user_input: str, output_text: str):
     # Save to memory
-    update_memory(req.user_id, category, req.user_input, output_text)
+    update_memory(user_id, category, user_input, output_text)
 
     # Track conversation metrics (message count and average response length)
     message_count = 1  # Current message
     avg_response_length = len(output_text)  # Length of AI response
 
     # Update progress tracker
-    progress_tracker.record_conversation_metrics(
-        req.user_id, category, message_count, avg_response_length
-    )
+    progress_tracker.record_conversation_metrics(user_id, category, message_count, avg_response_length)
+
+@app.post("/tools/chat")
+async def chat_endpoint(req: ChatRequest, background_tasks: BackgroundTasks):
+    category = req.category.lower()
+    chain = CHAT_CHAINS.get(category)
+    if chain is None:
+        return {"error": f"Invalid category: {req.category}"}
+
+    history, user_name = await run_blocking(get_chat_context, req.user_id, category)
 
+    fallback = False
+    # Cached answers were generated without history, so they only stand in for a first question.
+    # The question is embedded once for the lookup, the fallback lookup and the store.
+    vector = await semantic_cache.embed(req.user_input) if history == NO_HISTORY else None
+    output_text = semantic_cache.lookup(category, vector, user_name)
+    if output_text is None:
+        try:
+            output = await chain.ainvoke({
+                "history": history,
+                "topic": req.category,
+                "user_input": req.user_input,
+                "user_name": user_name
+            })
+        except LLMUnavailableError:
+            # Provider down or circuit open: answer from a looser semantic match if there is one
+            output_text = semantic_cache.lookup(category, vector, user_name, threshold=FALLBACK_THRESHOLD)
+            if output_text is None:
+                raise
+            fallback = True
+        except LLMBusyError:
+            raise
+        except Exception as e:
+            print(f"Error generating chat response: {e}")
+            raise HTTPException(status_code=502, detail="The mentor could not answer right now, please try again.")
+        else:
+            # Convert to string if needed
+            output_text = output.content if hasattr(output, "content") else str(output)
+            if vector is not None:
+                # Cached after the response is sent
+                background_tasks.add_task(semantic_cache.store, category, req.user_input, vector, output_text, user_name)
+
+    await run_blocking(_record_chat, req.user_id, category, req.user_input, output_text)
+
+    if fallback:
+        return {"response": output_text, "fallback": True}
     return {"response": output_text}
 
+def _ndjson(event: Dict[str, Any]) -> str:
+    return json.dumps(event) + "\n"
+
+@app.post("/tools/chat/stream")
+async def chat_stream_endpoint(req: ChatRequest):
+    """Stream the mentor's reply as newline-delimited JSON while it is generated.
+
+    Emits `{"type": "token", "content": ...}` per chunk, then one
+    `{"type": "done", "response": ...}` with the full text, which is saved to
+    memory and conversation metrics like /tools/chat. A reply abandoned by a
+    disconnected client is not saved.
+    """
+    category = req.category.lower()
+    chain = CHAT_CHAINS.get(category)
+    if chain is None:
+        raise HTTPException(status_code=400, detail=f"Invalid category: {req.category}")
+
+    history, user_name = await run_blocking(get_chat_context, req.user_id, category)
+    # Do not hold a pooled connection while the model is generating
+    release_request_connection()
+
+    vector = await semantic_cache.embed(req.user_input) if history == NO_HISTORY else None
+    cached_text = semantic_cache.lookup(category, vector, user_name)
+    chunks = None
+    first_chunk = None
+    if cached_text is None:
+        chunks = chain.astream({
+            "history": history,
+            "topic": req.category,
+            "user_input": req.user_input,
+            "user_name": user_name
+        }).__aiter__()
+        # Wait for the first chunk here so a busy scheduler still answers with 429/503
+        try:
+            first_chunk = await chunks.__anext__()
+        except StopAsyncIteration:
+            first_chunk = ""
+        except Exception as e:
+            # The stream is not handed to the response, so release it here
+            await chunks.aclose()
+            if isinstance(e, LLMUnavailableError):
+                cached_text = semantic_cache.lookup(category, vector, user_name, threshold=FALLBACK_THRESHOLD)
+            if cached_text is None:
+                if isinstance(e, LLMBusyError):
+                    raise
+                print(f"Error generating chat response: {e}")
+                raise HTTPException(status_code=502, detail="The mentor could not answer right now, please try again.")
+
+    async def token_stream():
+        output_text = cached_text
+        if output_text is not None:
+            yield _ndjson({"type": "token", "content": output_text})
+        else:
+            parts = []
+            try:
+                chunk = first_chunk
+                while True:
+                    text = chunk.content if hasattr(chunk, "content") else str(chunk)
+                    if text:
+                        parts.append(text)
+                        yield _ndjson({"type": "token", "content": text})
+                    try:
+                        chunk = await chunks.__anext__()
+                    except StopAsyncIteration:
+                        break
+            except Exception as e:
+                print(f"Error streaming chat response: {e}")
+                yield _ndjson({"type": "error", "detail": "Failed to generate response"})
+                return
+            finally:
+                await chunks.aclose()
+
+            output_text = "".join(parts)
+
+        await run_blocking(_record_chat, req.user_id, category, req.user_input, output_text)
+        yield _ndjson({"type": "done", "response": output_text})
+        if cached_text is None:
+            # Cached once the client has the full reply
+            semantic_cache.store(category, req.user_input, vector, output_text, user_name)
+
+    return StreamingResponse(
+        token_stream(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.post("/tools/progress/track")
-async def track_progress(req: QuizTrackRequest):
+def track_progress(req: QuizTrackRequest):
     """Track user quiz scores."""
     try:
         progress_tracker.record_quiz_score(req.user_id, req.category, req.score, req.total_questions)
@@ -457,7 +618,7 @@ async def track_progress(req: QuizTrackRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/tools/progress/conversation")
-async def track_conversation(req: ConversationTrackRequest):
+def track_conversation(req: ConversationTrackRequest):
     """Track user conversation metrics."""
     try:
         progress_tracker.record_conversation_metrics(req.user_id, req.category, req.message_count, req.avg_response_length)
@@ -466,7 +627,7 @@ async def track_conversation(req: ConversationTrackRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/tools/progress/{user_id}")
-async def get_progress(user_id: str):
+def get_progress(user_id: str):
     """Get user progress data."""
     try:
         progress_data = progress_tracker.get_user_progress(user_id)
@@ -475,7 +636,7 @@ async def get_progress(user_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/tools/progress/question")
-async def track_quiz_question(req: QuizQuestionRequest):
+def track_quiz_question(req: QuizQuestionRequest):
     """Track individual quiz question results."""
     try:
         progress_tracker.record_quiz_question(
@@ -486,8 +647,20 @@ async def track_quiz_question(req: QuizQuestionRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/tools/progress/questions")
+def track_quiz_results(req: QuizResultsRequest):
+    """Track a whole graded quiz: question results, score and notifications in one transaction."""
+    try:
+        return progress_tracker.record_quiz_results(
+            req.user_id, req.category, [result.model_dump() for result in req.results], req.score
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.get("/tools/progress/{user_id}/questions")
-async def get_quiz_questions(user_id: str, category: str = None):
+def get_quiz_questions(user_id: str, category: str = None):
     """Get quiz questions history for a user."""
     try:
         questions = progress_tracker.get_quiz_questions(user_id, category)
@@ -495,8 +668,16 @@ async def get_quiz_questions(user_id: str, category: str = None):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/tools/progress/{user_id}/overview")
+def get_progress_overview(user_id: str):
+    """Get per-category current score, average, attempts, trend and prediction."""
+    try:
+        return progress_tracker.get_overall_progress(user_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.get("/tools/progress/{user_id}/quiz-stats")
-async def get_quiz_stats(user_id: str, category: str = None):
+def get_quiz_stats(user_id: str, category: str = None):
     """Get quiz statistics for a user."""
     try:
         stats = progress_tracker.get_quiz_stats(user_id, category)
@@ -505,25 +686,116 @@ async def get_quiz_stats(user_id: str, category: str = None):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/tools/progress/train-model")
-async def train_progress_model():
-    """Train the progress prediction model."""
+def train_progress_model(category: Optional[str] = None):
+    """Queue a background retrain of the progress prediction models."""
     try:
-        progress_tracker.train_prediction_model()
-        return {"message": "Progress prediction model trained successfully."}
+        queued = progress_tracker.request_training([category] if category else None)
+        return {"message": "Progress prediction model training scheduled.", "categories": queued}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/tools/llm/stats")
+async def llm_client_stats():
+    """Get connection pool, request and cache statistics of the shared LLM client."""
+    return {
+        **MCMC.pool_stats(),
+        "semantic_cache": semantic_cache.stats(),
+        "conversation_summaries": conversation_summarizer.stats(),
+        "question_bank": question_bank.stats()
+    }
+
+@app.get("/tools/progress/train-model/status")
+async def train_progress_model_status():
+    """Get background training status per category."""
+    return progress_tracker.training_scheduler.status()
+
 @app.get("/tools/notifications/{user_id}")
-async def get_notifications(user_id: str, unread_only: bool = False):
-    """Get notifications for a user."""
+def get_notifications(user_id: str, unread_only: bool = False, before_id: Optional[int] = None,
+                            limit: int = Query(50, ge=1, le=200)):
+    """Get a page of notifications for a user, newest first."""
     try:
-        notifications = progress_tracker.get_user_notifications(user_id, unread_only)
-        return {"notifications": notifications}
+        notifications = progress_tracker.get_user_notifications(user_id, unread_only, before_id, limit)
+        next_before_id = int(notifications[-1]['id']) if len(notifications) == limit else None
+        return {"notifications": notifications, "next_before_id": next_before_id}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/tools/notifications/{user_id}/unread-count")
+def get_unread_notification_count(user_id: str):
+    """Get unread and total notification counts and the newest notification id."""
+    try:
+        return progress_tracker.get_notification_counts(user_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/tools/notifications/{user_id}/delta")
+def get_notification_delta(user_id: str, after_id: int = 0, limit: int = Query(100, ge=1, le=500)):
+    """Get notifications newer than after_id, oldest first."""
+    try:
+        notifications = progress_tracker.get_notifications_after(user_id, after_id, limit)
+        last_id = int(notifications[-1]['id']) if notifications else after_id
+        return {"notifications": notifications, "last_id": last_id, "has_more": len(notifications) == limit}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Comment line sent on idle streams so proxies and browsers keep the connection open
+NOTIFICATION_HEARTBEAT_SECONDS = 15
+
+def _sse_event(notification: Dict[str, Any]) -> str:
+    return f"id: {notification['id']}\nevent: notification\ndata: {json.dumps(notification)}\n\n"
+
+@app.get("/tools/notifications/{user_id}/stream")
+async def stream_notifications(user_id: str, request: Request, after_id: Optional[int] = None,
+                               last_event_id: Optional[str] = Header(None)):
+    """Stream new notifications for a user as Server-Sent Events.
+
+    Resumes after the browser's Last-Event-ID header on reconnect, or after
+    `after_id` on the first connection (the newest id the client already has).
+    """
+    if last_event_id and last_event_id.isdigit():
+        after_id = int(last_event_id)
+
+    async def event_stream():
+        # Subscribe before replaying so nothing stored in between is missed
+        subscription = notification_hub.subscribe(user_id)
+        try:
+            yield "retry: 3000\n\n"
+            last_id = after_id
+            if last_id is not None:
+                while True:
+                    backlog = await run_blocking(progress_tracker.get_notifications_after, user_id, last_id)
+                    for notification in backlog:
+                        yield _sse_event(notification)
+                        last_id = int(notification['id'])
+                    if len(backlog) < 100:
+                        break
+            # Do not hold a pooled connection for the lifetime of the stream
+            release_request_connection()
+
+            while not await request.is_disconnected():
+                try:
+                    notification = await asyncio.wait_for(subscription.get(), NOTIFICATION_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                if notification is None:
+                    # Fell behind; the client reconnects and replays from its last id
+                    break
+                if last_id is not None and int(notification['id']) <= last_id:
+                    continue
+                last_id = int(notification['id'])
+                yield _sse_event(notification)
+        finally:
+            notification_hub.unsubscribe(subscription)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.post("/tools/notifications/{notification_id}/read")
-async def mark_notification_read(notification_id: int):
+def mark_notification_read(notification_id: int):
     """Mark a notification as read."""
     try:
         progress_tracker.mark_notification_as_read(notification_id)
@@ -531,40 +803,80 @@ async def mark_notification_read(notification_id: int):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/tools/notifications/reply")
-async def reply_to_notification(req: NotificationReplyRequest):
-    """Reply to a notification with a single message."""
+@app.post("/tools/notifications/{user_id}/read-all")
+def mark_all_notifications_read(user_id: str):
+    """Mark all of a user's notifications as read."""
     try:
-        # Ensure the notification_replies table exists
-        conn = sqlite3.connect('user_progress.db')
-        cursor = conn.cursor()
+        updated = progress_tracker.mark_all_notifications_as_read(user_id)
+        return {"updated": updated, **progress_tracker.get_notification_counts(user_id)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS notification_replies (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id TEXT NOT NULL,
-                notification_id INTEGER NOT NULL,
-                user_message TEXT NOT NULL,
-                ai_response TEXT NOT NULL,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
+@app.post("/tools/notifications/read-batch")
+def mark_notifications_read(req: NotificationBatchReadRequest):
+    """Mark a list of a user's notifications as read."""
+    try:
+        updated = progress_tracker.mark_notifications_as_read(req.user_id, req.notification_ids)
+        return {"updated": updated, **progress_tracker.get_notification_counts(req.user_id)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-        # Check if user has already replied to this notification
-        cursor.execute('''
-            SELECT id FROM notification_replies
-            WHERE user_id = ? AND notification_id = ?
-        ''', (req.user_id, req.notification_id))
+@app.post("/tools/notifications/{user_id}/archive")
+def archive_notifications(user_id: str, older_than_days: int = Query(30, ge=0)):
+    """Archive a user's notifications older than the given number of days."""
+    try:
+        archived = progress_tracker.archive_notifications(user_id, older_than_days)
+        return {"archived": archived, **progress_tracker.get_notification_counts(user_id)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-        existing_reply = cursor.fetchone()
-        conn.close()
+def _has_replied(user_id: str, notification_id: int) -> bool:
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    cursor.execute('''
+        SELECT id FROM notification_replies
+        WHERE user_id = ? AND notification_id = ?
+    ''', (user_id, notification_id))
+
+    existing_reply = cursor.fetchone()
+    conn.close()
+    return existing_reply is not None
 
-        if existing_reply:
+def _save_notification_reply(req: NotificationReplyRequest, ai_response: str):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    cursor.execute('''
+        INSERT INTO notification_replies (user_id, notification_id, user_message, ai_response)
+        VALUES (?, ?, ?, ?)
+    ''', (req.user_id, req.notification_id, req.reply_message, ai_response))
+
+    conn.commit()
+    conn.close()
+
+    # Update memory with this interaction
+    update_memory(req.user_id, req.topic, req.reply_message, ai_response)
+
+    # Create a non-replyable notification with AI response
+    notification = {
+        "title": f"Response to your message",
+        "message": ai_response,
+        "type": "info"
+    }
+
+    progress_tracker._store_notifications(req.user_id, [notification])
+
+@app.post("/tools/notifications/reply")
+async def reply_to_notification(req: NotificationReplyRequest):
+    """Reply to a notification with a single message."""
+    try:
+        # Check if user has already replied to this notification
+        if await run_blocking(_has_replied, req.user_id, req.notification_id):
             raise HTTPException(status_code=400, detail="You have already replied to this notification.")
 
         # Generate AI response
-        history = retrieve_memory(req.user_id, req.topic)
-        user_name = get_user_name(req.user_id)
+        history, user_name = await run_blocking(get_chat_context, req.user_id, req.topic)
 
         # Get the appropriate chain based on topic
         if req.topic == "career":
@@ -579,7 +891,7 @@ async def reply_to_notification(req: NotificationReplyRequest):
             raise HTTPException(status_code=400, detail="Invalid topic.")
 
         # Generate AI response
-        output = chain.invoke({
+        output = await chain.ainvoke({
             "history": history,
             "topic": req.topic,
             "user_input": req.reply_message,
@@ -589,41 +901,11 @@ async def reply_to_notification(req: NotificationReplyRequest):
         ai_response = output.content if hasattr(output, "content") else str(output)
 
         # Save reply to database
-        conn = sqlite3.connect('user_progress.db')
-        cursor = conn.cursor()
-
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS notification_replies (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id TEXT NOT NULL,
-                notification_id INTEGER NOT NULL,
-                user_message TEXT NOT NULL,
-                ai_response TEXT NOT NULL,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-
-        cursor.execute('''
-            INSERT INTO notification_replies (user_id, notification_id, user_message, ai_response)
-            VALUES (?, ?, ?, ?)
-        ''', (req.user_id, req.notification_id, req.reply_message, ai_response))
-
-        conn.commit()
-        conn.close()
-
-        # Update memory with this interaction
-        update_memory(req.user_id, req.topic, req.reply_message, ai_response)
-
-        # Create a non-replyable notification with AI response
-        notification = {
-            "title": f"Response to your message",
-            "message": ai_response,
-            "type": "info"
-        }
-
-        progress_tracker._store_notifications(req.user_id, [notification])
+        await run_blocking(_save_notification_reply, req, ai_response)
 
         return {"message": "Reply processed successfully.", "ai_response": ai_response}
+    except LLMBusyError:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -646,15 +928,14 @@ async def generate_exercise(user_id: str, category: str, topic: str = None):
         # Generate exercise prompt
         exercise_prompt = f"Generate a short exercise (5-10 minutes) for {category} learning. Topic: {topic or category}"
 
-        history = retrieve_memory(user_id, category)
-        user_name = get_user_name(user_id)
+        history, user_name = await run_blocking(get_chat_context, user_id, category)
 
-        output = chain.invoke({
+        output = await chain.ainvoke({
             "history": history,
             "topic": category,
             "user_input": exercise_prompt,
             "user_name": user_name
-        })
+        }, config=cache_config('exercise'))
 
         exercise_content = output.content if hasattr(output, "content") else str(output)
 
@@ -665,7 +946,7 @@ async def generate_exercise(user_id: str, category: str, topic: str = None):
             "type": "info"
         }
 
-        progress_tracker._store_notifications(user_id, [notification])
+        await run_blocking(progress_tracker._store_notifications, user_id, [notification])
 
         # Return exercise details
         return {
@@ -674,6 +955,8 @@ async def generate_exercise(user_id: str, category: str, topic: str = None):
             "category": category,
             "time_limit": 600  # 10 minutes in seconds
         }
+    except LLMBusyError:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -696,10 +979,9 @@ async def submit_exercise(req: ExerciseSubmissionRequest):
         # Prepare submission prompt
         submission_prompt = f"Please review and provide feedback on the following exercise answers:\n\n{json.dumps(req.answers, indent=2)}\n\nTime taken: {req.time_taken} seconds"
 
-        history = retrieve_memory(req.user_id, req.category)
-        user_name = get_user_name(req.user_id)
+        history, user_name = await run_blocking(get_chat_context, req.user_id, req.category)
 
-        output = chain.invoke({
+        output = await chain.ainvoke({
             "history": history,
             "topic": req.category,
             "user_input": submission_prompt,
@@ -712,7 +994,7 @@ async def submit_exercise(req: ExerciseSubmissionRequest):
         score = min(100, max(0, 100 - (req.time_taken / 60)))  # Base score adjusted by time
 
         # Track progress
-        progress_tracker.record_quiz_score(req.user_id, req.category, int(score), 10)
+        await run_blocking(progress_tracker.record_quiz_score, req.user_id, req.category, int(score), 10)
 
         # Create result notification
         notification = {
@@ -721,49 +1003,57 @@ async def submit_exercise(req: ExerciseSubmissionRequest):
             "type": "success" if score >= 70 else "warning"
         }
 
-        progress_tracker._store_notifications(req.user_id, [notification])
+        await run_blocking(progress_tracker._store_notifications, req.user_id, [notification])
 
         return {
             "message": "Exercise submitted successfully.",
             "score": score,
             "feedback": feedback
         }
+    except LLMBusyError:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def _load_suggestion_inputs(user_id: str):
+    """User profile, education program, progress history and quiz stats for suggestions"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute('''
+        SELECT name, template, cv_content FROM users WHERE user_id = ?
+    ''', (user_id,))
+    user_info = cursor.fetchone()
+    
+    if not user_info:
+        conn.close()
+        return None, "", [], {}
+    
+    # Get education program info if template is education
+    program_info = ""
+    if user_info[1] == "education":
+        cursor.execute('''
+            SELECT program_name FROM education_programs WHERE user_id = ?
+        ''', (user_id,))
+        program_result = cursor.fetchone()
+        if program_result:
+            program_info = program_result[0]
+    
+    conn.close()
+    
+    return user_info, program_info, progress_tracker.get_user_progress(user_id), progress_tracker.get_quiz_stats(user_id)
+
 @app.get("/tools/suggestions/{user_id}")
 async def get_personalized_suggestions(user_id: str):
     """Generate personalized AI suggestions based on user's progress, CV, courses, and template."""
     try:
-        # Get user information
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT name, template, cv_content FROM users WHERE user_id = ?
-        ''', (user_id,))
-        user_info = cursor.fetchone()
+        # Get user information and progress data
+        user_info, program_info, progress_data, quiz_stats = await run_blocking(_load_suggestion_inputs, user_id)
         
         if not user_info:
             raise HTTPException(status_code=404, detail="User not found")
         
         name, template, cv_content = user_info
-        
-        # Get education program info if template is education
-        program_info = ""
-        if template == "education":
-            cursor.execute('''
-                SELECT program_name FROM education_programs WHERE user_id = ?
-            ''', (user_id,))
-            program_result = cursor.fetchone()
-            if program_result:
-                program_info = program_result[0]
-        
-        conn.close()
-        
-        # Get user progress data
-        progress_data = progress_tracker.get_user_progress(user_id)
-        quiz_stats = progress_tracker.get_quiz_stats(user_id)
 
         # Analyze progress to identify strengths and weaknesses
         category_performance = {}
@@ -807,7 +1097,7 @@ async def get_personalized_suggestions(user_id: str):
         try:
             timetable_data = await generate_timetable(user_id, template, user_level)
             if timetable_data and timetable_data.get('content'):
-                timetable_content = timetable_data['content'][:500]  # Limit to first 500 chars
+                timetable_content = token_counter.truncate(timetable_data['content'], TIMETABLE_TOKEN_LIMIT)
         except Exception as e:
             print(f"Could not generate timetable for suggestions: {e}")
             timetable_content = "No current timetable available"
@@ -818,16 +1108,16 @@ async def get_personalized_suggestions(user_id: str):
 
         User Name: {name}
         Template/Category: {template}
-        CV Content: {cv_content[:1000] if cv_content else "No CV provided"}
+        CV Content: {token_counter.truncate(cv_content, CV_TOKEN_LIMIT) if cv_content else "No CV provided"}
         Education Program: {program_info if program_info else "Not specified"}
 
         Current Timetable: {timetable_content}
 
         Performance Summary:
-        {json.dumps(performance_summary, indent=2)}
+        {compact_json(performance_summary)}
 
         Quiz Statistics:
-        {json.dumps(quiz_stats, indent=2)}
+        {compact_json(quiz_stats)}
 
         Please generate suggestions that:
         1. Address knowledge gaps based on their quiz performance
@@ -855,17 +1145,20 @@ async def get_personalized_suggestions(user_id: str):
             # Default to career chain if template not recognized
             chain = career_chain
         
-        history = retrieve_memory(user_id, template)
-        user_name = get_user_name(user_id)
+        history, user_name = await run_blocking(get_chat_context, user_id, template)
         
-        output = chain.invoke({
-            "history": history,
-            "topic": template,
-            "user_input": suggestions_prompt,
-            "user_name": user_name
-        })
-        
-        suggestions_text = output.content if hasattr(output, "content") else str(output)
+        try:
+            output = await chain.ainvoke({
+                "history": history,
+                "topic": template,
+                "user_input": suggestions_prompt,
+                "user_name": user_name
+            }, config=cache_config('suggestions'))
+            suggestions_text = output.content if hasattr(output, "content") else str(output)
+        except LLMBusyError as e:
+            # Shed or provider unavailable: serve the template suggestions below
+            print(f"Serving fallback suggestions: {e}")
+            suggestions_text = ""
         
         # Parse suggestions from AI response
         suggestions = []
@@ -0,0 +1,117 @@
+import json
+import math
+import sqlite3
+from typing import List, Optional, Tuple
+
+
+# Number of most recent scores kept per (user, category) for trend checks
+LAST_K = 5
+
+
+class ProgressStats:
+    """Running least-squares aggregates for one user's scores in one category.
+
+    x is the attempt index (0, 1, 2, ...) and y the score, matching the
+    LinearRegression previously fitted on `range(len(scores))`. Every derived
+    value is closed-form arithmetic on the sums, so it costs O(1) regardless of
+    how long the history is.
+    """
+
+    def __init__(self, user_id: str, category: str, n: int = 0,
+                 sum_x: float = 0.0, sum_y: float = 0.0, sum_xy: float = 0.0,
+                 sum_xx: float = 0.0, sum_yy: float = 0.0,
+                 last_scores: Optional[List[float]] = None):
+        self.user_id = user_id
+        self.category = category
+        self.n = n
+        self.sum_x = sum_x
+        self.sum_y = sum_y
+        self.sum_xy = sum_xy
+        self.sum_xx = sum_xx
+        self.sum_yy = sum_yy
+        self.last_scores = last_scores or []
+
+    @classmethod
+    def from_row(cls, user_id: str, category: str, row) -> 'ProgressStats':
+        """Build from (n, sum_x, sum_y, sum_xy, sum_xx, sum_yy, last_scores)"""
+        return cls(user_id, category, *row[:6], last_scores=json.loads(row[6]))
+
+    def add(self, score: float):
+        x = float(self.n)
+        self.n += 1
+        self.sum_x += x
+        self.sum_y += score
+        self.sum_xy += x * score
+        self.sum_xx += x * x
+        self.sum_yy += score * score
+        self.last_scores = (self.last_scores + [score])[-LAST_K:]
+
+    @property
+    def last_score(self) -> Optional[float]:
+        return self.last_scores[-1] if self.last_scores else None
+
+    @property
+    def mean(self) -> float:
+        return self.sum_y / self.n if self.n else 0.0
+
+    @property
+    def std(self) -> float:
+        """Population standard deviation of the scores (as np.std)"""
+        if not self.n:
+            return 0.0
+        return math.sqrt(max(0.0, self.sum_yy / self.n - self.mean ** 2))
+
+    def regression(self) -> Optional[Tuple[float, float, float]]:
+        """Return (slope, intercept, residual std) or None with fewer than 2 points"""
+        denominator = self.n * self.sum_xx - self.sum_x ** 2
+        if self.n < 2 or denominator == 0:
+            return None
+        slope = (self.n * self.sum_xy - self.sum_x * self.sum_y) / denominator
+        intercept = (self.sum_y - slope * self.sum_x) / self.n
+        sse = (self.sum_yy - 2 * intercept * self.sum_y - 2 * slope * self.sum_xy
+               + self.n * intercept ** 2 + 2 * intercept * slope * self.sum_x
+               + slope ** 2 * self.sum_xx)
+        return slope, intercept, math.sqrt(max(0.0, sse) / self.n)
+
+
+def load_stats(cursor: sqlite3.Cursor, user_id: str, category: str) -> ProgressStats:
+    cursor.execute('''
+        SELECT n, sum_x, sum_y, sum_xy, sum_xx, sum_yy, last_scores
+        FROM progress_stats
+        WHERE user_id = ? AND category = ?
+    ''', (user_id, category))
+    row = cursor.fetchone()
+    if not row:
+        return ProgressStats(user_id, category)
+    return ProgressStats.from_row(user_id, category, row)
+
+
+def save_stats(cursor: sqlite3.Cursor, stats: ProgressStats):
+    cursor.execute('''
+        INSERT OR REPLACE INTO progress_stats
+            (user_id, category, n, sum_x, sum_y, sum_xy, sum_xx, sum_yy, last_scores, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+    ''', (
+        stats.user_id, stats.category, stats.n, stats.sum_x, stats.sum_y,
+        stats.sum_xy, stats.sum_xx, stats.sum_yy, json.dumps(stats.last_scores)
+    ))
+
+
+def rebuild_all_stats(conn: sqlite3.Connection):
+    """Recompute every row of progress_stats from user_progress in one pass"""
+    read_cursor = conn.cursor()
+    write_cursor = conn.cursor()
+    write_cursor.execute("DELETE FROM progress_stats")
+    read_cursor.execute('''
+        SELECT user_id, category, score FROM user_progress
+        ORDER BY user_id, category, timestamp, id
+    ''')
+    current = None
+    for user_id, category, score in read_cursor:
+        if current is None or (current.user_id, current.category) != (user_id, category):
+            if current is not None:
+                save_stats(write_cursor, current)
+            current = ProgressStats(user_id, category)
+        current.add(score)
+    if current is not None:
+        save_stats(write_cursor, current)
@@ -1,6 +1,8 @@
+import os
+import time
+import uuid
 import sqlite3
 import json
-import pickle
 import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
@@ -8,168 +10,146 @@ from typing import Dict, List, Any, Optional, Tuple, Union
 from sklearn.linear_model import LinearRegression
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.preprocessing import StandardScaler
+import threading
 import warnings
+from Apps.training_scheduler import TrainingScheduler
+from Apps.incremental_training import TEMPLATE_FEATURES, new_incremental_engine
+from Apps.Model.model_registry import ModelRegistry
+from Apps.progress_stats import ProgressStats, load_stats, save_stats
+from Apps.utils.database import get_pool, PooledConnection, DEFAULT_DB_PATH
+from Apps.utils.migrations import migrate
+from Apps.utils.notification_hub import notification_hub
 warnings.filterwarnings('ignore')
 
+# Lifetime of a generated quiz's answer key, and how often expired keys are swept
+QUIZ_SESSION_TTL = float(os.getenv('SCMC_QUIZ_SESSION_TTL_SECONDS', '7200'))
+QUIZ_SESSION_SWEEP_INTERVAL = float(os.getenv('SCMC_QUIZ_SESSION_SWEEP_SECONDS', '300'))
+
+
+class QuizSessionUsedError(LookupError):
+    """The quiz session was already submitted or has expired"""
+
 class ProgressTracker:
-    def __init__(self, db_path: str = 'user_progress.db'):
+    def __init__(self, db_path: str = DEFAULT_DB_PATH,
+                 training_mode: str = os.getenv('SCMC_TRAINING_MODE', 'batch')):
         self.db_path = db_path
+        self.pool = get_pool(db_path)
+        # 'batch' refits a RandomForest on the whole table; 'incremental' folds in new rows only
+        self.training_mode = training_mode
         self.models = {}
         self.scalers = {}
+        self.incremental = {}
+        self._model_lock = threading.Lock()
+        # Versioned artifacts live next to the database, not in the working directory
+        self.registry = ModelRegistry(
+            os.getenv('SCMC_MODEL_DIR', os.path.join(os.path.dirname(os.path.abspath(db_path)), 'models'))
+        )
+        self.reload_interval = 5.0
+        self._model_versions: Dict[str, int] = {}
+        self._last_reload_check = 0.0
+        self.training_scheduler = TrainingScheduler(self.train_model)
+        self._last_session_sweep = 0.0
+        self._sweep_lock = threading.Lock()
         self._initialize_database()
         self._load_models()
 
+    def _get_connection(self) -> PooledConnection:
+        """Borrow a pooled connection; close() returns it to the pool"""
+        return self.pool.get_connection()
+
     def _initialize_database(self):
-        """Initialize the database with enhanced schema for template-specific tracking"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Enhanced user progress table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS user_progress (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id TEXT NOT NULL,
-                category TEXT NOT NULL,
-                score REAL NOT NULL,
-                total_questions INTEGER DEFAULT 1,
-                metrics_json TEXT,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Template-specific metrics tables
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS career_metrics (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id TEXT NOT NULL,
-                interview_score REAL,
-                skill_assessment REAL,
-                career_goal_progress REAL,
-                resume_quality REAL,
-                networking_score REAL,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS business_metrics (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id TEXT NOT NULL,
-                business_plan_score REAL,
-                market_analysis_score REAL,
-                financial_projection_score REAL,
-                pitch_quality REAL,
-                strategy_score REAL,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS education_metrics (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id TEXT NOT NULL,
-                learning_milestone_score REAL,
-                concept_mastery REAL,
-                study_efficiency REAL,
-                knowledge_retention REAL,
-                academic_performance REAL,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS finance_metrics (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id TEXT NOT NULL,
-                investment_knowledge REAL,
-                budgeting_skills REAL,
-                financial_planning REAL,
-                risk_assessment REAL,
-                wealth_management REAL,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Quiz questions table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS quiz_questions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id TEXT NOT NULL,
-                category TEXT NOT NULL,
-                question TEXT NOT NULL,
-                user_answer TEXT NOT NULL,
-                is_correct BOOLEAN NOT NULL,
-                correct_answer TEXT,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
+        """Bring the database schema up to date via the versioned migrations"""
+        migrate(self.db_path)
 
-        # Quiz answers table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS quiz_answers (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id TEXT NOT NULL,
-                category TEXT NOT NULL,
-                question_id TEXT NOT NULL,
-                correct_answer TEXT NOT NULL,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                UNIQUE(user_id, category, question_id)
-            )
-        ''')
+    def _registry_name(self, category: str) -> str:
+        return f"{self.training_mode}-{category}"
 
-        # Notifications table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS user_notifications (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id TEXT NOT NULL,
-                title TEXT NOT NULL,
-                message TEXT NOT NULL,
-                type TEXT NOT NULL,
-                read BOOLEAN DEFAULT FALSE,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
+    def _load_models(self):
+        """Load the latest published models, falling back to fresh estimators"""
+        self._reload_models(force=True)
+        if self.training_mode == 'incremental':
+            return
+        for category in ['career', 'business', 'education', 'finance']:
+            if category not in self.models:
+                self.models[category] = RandomForestRegressor(n_estimators=100, random_state=42)
+                self.scalers[category] = StandardScaler()
 
-        conn.commit()
-        conn.close()
+    def _reload_models(self, force: bool = False):
+        """Hot-reload categories for which another worker published a newer version"""
+        now = time.time()
+        if not force and now - self._last_reload_check < self.reload_interval:
+            return
+        self._last_reload_check = now
 
-    def _load_models(self):
-        """Load pre-trained models or initialize new ones"""
-        try:
-            for category in ['career', 'business', 'education', 'finance']:
-                try:
-                    with open(f'model_{category}.pkl', 'rb') as f:
-                        self.models[category] = pickle.load(f)
-                    with open(f'scaler_{category}.pkl', 'rb') as f:
-                        self.scalers[category] = pickle.load(f)
-                except FileNotFoundError:
-                    # Initialize new models if not found
-                    self.models[category] = RandomForestRegressor(n_estimators=100, random_state=42)
-                    self.scalers[category] = StandardScaler()
-        except Exception as e:
-            print(f"Error loading models: {e}")
+        prefix = f"{self.training_mode}-"
+        for name in self.registry.names():
+            if not name.startswith(prefix):
+                continue
+            category = name[len(prefix):]
+            latest = self.registry.latest_version(name)
+            if latest is None or latest <= self._model_versions.get(category, 0):
+                continue
+            try:
+                # Online state is tiny and gets copied for partial_fit, so it is not memory-mapped
+                loaded = self.registry.load(name, latest, mmap=self.training_mode != 'incremental')
+            except Exception as e:
+                print(f"Error loading {name} v{latest}: {e}")
+                continue
+            if loaded:
+                self._install_artifacts(category, *loaded)
+
+    def _install_artifacts(self, category: str, version: int, artifacts: Dict[str, Any]):
+        if 'engine' in artifacts:
+            self._install_incremental(artifacts['engine'])
+        else:
+            with self._model_lock:
+                self.models[category] = artifacts['model']
+                if 'scaler' in artifacts:
+                    self.scalers[category] = artifacts['scaler']
+        self._model_versions[category] = version
+
+    def _install_incremental(self, engine):
+        """Swap in an online engine so predictions use it"""
+        with self._model_lock:
+            self.incremental[engine.category] = engine
+            if not engine.is_fitted:
+                return
+            if hasattr(engine, 'scaler'):
+                self.models[engine.category] = engine.model
+                self.scalers[engine.category] = engine.scaler
+            else:
+                self.models[engine.category] = engine
+
+    def _publish(self, category: str):
+        """Publish a category's current model as a new registry version"""
+        with self._model_lock:
+            if self.training_mode == 'incremental':
+                artifacts = {'engine': self.incremental.get(category)}
+            else:
+                artifacts = {'model': self.models.get(category)}
+                # Non-template categories use an unscaled trend model
+                if category in self.scalers:
+                    artifacts['scaler'] = self.scalers[category]
+        if not any(artifact is not None for artifact in artifacts.values()):
+            return
+        self._model_versions[category] = self.registry.publish(self._registry_name(category), artifacts)
 
     def save_models(self):
-        """Save trained models to disk"""
-        for category, model in self.models.items():
-            with open(f'model_{category}.pkl', 'wb') as f:
-                pickle.dump(model, f)
-            with open(f'scaler_{category}.pkl', 'wb') as f:
-                pickle.dump(self.scalers[category], f)
+        """Publish every trained model to the registry"""
+        with self._model_lock:
+            categories = set(self.incremental) if self.training_mode == 'incremental' else set(self.models)
+        for category in categories:
+            self._publish(category)
 
     def track_progress(self, user_id: str, category: str, score: float, 
                       total_questions: int = 1, metrics: Dict[str, Any] = None):
         """Track user progress with template-specific metrics"""
+        stats = None
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._get_connection()
             cursor = conn.cursor()
             
-            metrics_json = json.dumps(metrics) if metrics else '{}'
-            
-            cursor.execute('''
-                INSERT INTO user_progress (user_id, category, score, total_questions, metrics_json)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (user_id, category, score, total_questions, metrics_json))
+            stats = self._insert_progress(cursor, user_id, category, score, total_questions, metrics)
             
             conn.commit()
             
@@ -184,20 +164,100 @@ class ProgressTracker:
                 conn.close()
         
         # Generate notifications for this progress update
-        notifications = self.generate_all_notifications(user_id, category, score, metrics or {})
+        # The stats committed with the insert carry the attempt count and previous score
+        notifications = self.generate_all_notifications(user_id, category, score, metrics or {}, stats)
         
         # Store notifications in database
         self._store_notifications(user_id, notifications)
         
-        # Retrain model with new data
-        self.train_model(category)
+        # Retraining happens in the background once enough new rows accumulate
+        self.training_scheduler.record_new_rows(category)
         
         return notifications
 
+    def _insert_progress(self, cursor, user_id: str, category: str, score: float,
+                         total_questions: int, metrics: Optional[Dict[str, Any]] = None) -> ProgressStats:
+        """Insert a progress row and fold it into the running stats, inside the caller's transaction"""
+        cursor.execute('''
+            INSERT INTO user_progress (user_id, category, score, total_questions, metrics_json)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (user_id, category, score, total_questions, json.dumps(metrics) if metrics else '{}'))
+        
+        # The insert holds the write lock, so this read-modify-write cannot interleave
+        stats = load_stats(cursor, user_id, category)
+        stats.add(score)
+        save_stats(cursor, stats)
+        return stats
+
+    def record_quiz_results(self, user_id: str, category: str, results: List[Dict[str, Any]],
+                            score: Optional[float] = None, session_id: Optional[str] = None) -> Dict[str, Any]:
+        """Record a graded quiz in one transaction: every question result, the aggregate
+        score as a single progress row, and the notifications it produces.
+
+        Each result has question, user_answer, is_correct and optionally
+        correct_answer. The score defaults to the share of correct answers.
+        A given quiz session is consumed in the same transaction, so it can be
+        graded only once; QuizSessionUsedError is raised if it is already gone.
+        Notifications are published and the retrain counter advanced once,
+        after the commit. An empty result list raises ValueError.
+        """
+        if not results:
+            raise ValueError("A quiz needs at least one question result")
+        total_questions = len(results)
+        correct_count = sum(1 for result in results if result['is_correct'])
+        if score is None:
+            score = int(correct_count / total_questions * 100)
+
+        conn = self._get_connection()
+        try:
+            cursor = conn.cursor()
+            if session_id is not None:
+                cursor.execute('''
+                    DELETE FROM quiz_sessions
+                    WHERE session_id = ? AND user_id = ? AND category = ? AND expires_at > ?
+                ''', (session_id, user_id, category, time.time()))
+                if cursor.rowcount == 0:
+                    # Lost a race with another submission of the same quiz
+                    raise QuizSessionUsedError(f"Quiz session {session_id} was already submitted or expired")
+            cursor.executemany('''
+                INSERT INTO quiz_questions (user_id, category, question, user_answer, is_correct, correct_answer)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', [
+                (user_id, category, result['question'], result['user_answer'] or '',
+                 bool(result['is_correct']), result.get('correct_answer'))
+                for result in results
+            ])
+            stats = self._insert_progress(cursor, user_id, category, score, total_questions)
+            notifications = self._insert_notifications(
+                cursor, user_id, self.generate_all_notifications(user_id, category, score, {}, stats)
+            )
+            conn.commit()
+        except (sqlite3.Error, QuizSessionUsedError):
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+        self._after_progress_write(user_id, category, notifications)
+        return {
+            "score": score,
+            "total_questions": total_questions,
+            "correct_answers": correct_count,
+            "notifications": notifications
+        }
+
+    def _after_progress_write(self, user_id: str, category: str, notifications: List[Dict[str, Any]]):
+        """Post-commit hook of a progress write: announce notifications and count the new row"""
+        # Publish only after commit, so a stream never announces a row readers cannot see yet
+        for notification in notifications:
+            notification_hub.publish(user_id, notification)
+        # Retraining happens in the background once enough new rows accumulate
+        self.training_scheduler.record_new_rows(category)
+
     def _store_template_metrics(self, user_id: str, category: str, metrics: Dict[str, Any]):
         """Store template-specific metrics in dedicated tables"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._get_connection()
             cursor = conn.cursor()
             
             if category == 'career':
@@ -265,7 +325,7 @@ class ProgressTracker:
 
     def get_user_progress(self, user_id: str, category: str = None) -> List[Dict]:
         """Retrieve user progress data with optional category filter"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._get_connection()
         cursor = conn.cursor()
         
         if category:
@@ -298,7 +358,7 @@ class ProgressTracker:
 
     def get_template_metrics(self, user_id: str, category: str) -> Dict[str, Any]:
         """Get template-specific metrics for a user"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._get_connection()
         cursor = conn.cursor()
         
         if category == 'career':
@@ -389,10 +449,37 @@ class ProgressTracker:
             }
 
     def train_model(self, category: str):
-        """Train the ML model for a specific category"""
+        """Train the ML model for a specific category using the configured training mode"""
+        if self.training_mode == 'incremental':
+            self._train_incremental(category)
+        else:
+            self._train_batch(category)
+
+    def _train_incremental(self, category: str):
+        """Fold rows added since the last training watermark into the online model"""
+        try:
+            with self._model_lock:
+                engine = self.incremental.get(category) or new_incremental_engine(category)
+            with self.pool.connection() as conn:
+                updated = engine.updated(conn)
+            if updated is None:
+                return
+            self._install_incremental(updated)
+            self._publish(category)
+        except Exception as e:
+            print(f"Error training incremental model for {category}: {e}")
+            # The scheduler records the failure in its status
+            raise
+
+    def _train_batch(self, category: str):
+        """Refit the category model from every row in its table.
+
+        Fits fresh estimators and swaps them in only on success, so concurrent
+        predictions keep using the last good model while training runs.
+        """
         try:
             
-            conn = sqlite3.connect(self.db_path)
+            conn = self._get_connection()
             
             if category in ['career', 'business', 'education', 'finance']:
                 
@@ -402,7 +489,7 @@ class ProgressTracker:
                     WHERE user_id IN (SELECT DISTINCT user_id FROM {table_name})
                     ORDER BY timestamp
                 '''
-                df = pd.read_sql_query(query, conn)
+                df = pd.read_sql_query(query, conn.raw)
             else:
                
                 query = '''
@@ -410,7 +497,7 @@ class ProgressTracker:
                     WHERE category = ? 
                     ORDER BY timestamp
                 '''
-                df = pd.read_sql_query(query, conn, params=(category,))
+                df = pd.read_sql_query(query, conn.raw, params=(category,))
             
             conn.close()
             
@@ -431,10 +518,16 @@ class ProgressTracker:
                 y = features[target_col]
                 
                 
-                X_scaled = self.scalers[category].fit_transform(X)
+                scaler = StandardScaler()
+                X_scaled = scaler.fit_transform(X)
                 
                
-                self.models[category].fit(X_scaled, y)
+                model = RandomForestRegressor(n_estimators=100, random_state=42)
+                model.fit(X_scaled, y)
+
+                with self._model_lock:
+                    self.models[category] = model
+                    self.scalers[category] = scaler
             else:
                 
                 X = np.array(range(len(df))).reshape(-1, 1)
@@ -443,19 +536,34 @@ class ProgressTracker:
                 if len(X) > 1:
                     model = LinearRegression()
                     model.fit(X, y)
-                    self.models[category] = model
+                    with self._model_lock:
+                        self.models[category] = model
             
-            self.save_models()
+            self._publish(category)
             
         except Exception as e:
             print(f"Error training model for {category}: {e}")
+            # The scheduler records the failure in its status
+            raise
 
-    def predict_progress(self, user_id: str, category: str, steps_ahead: int = 1) -> Dict[str, Any]:
+    def get_progress_stats(self, user_id: str, category: str) -> ProgressStats:
+        """Running score aggregates for one user and category (primary-key lookup)"""
+        conn = self._get_connection()
+        try:
+            return load_stats(conn.cursor(), user_id, category)
+        finally:
+            conn.close()
+
+    def predict_progress(self, user_id: str, category: str, steps_ahead: int = 1,
+                         stats: Optional[ProgressStats] = None,
+                         template_metrics: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """Predict future progress with confidence intervals"""
+        self._reload_models()
         try:
-            progress_data = self.get_user_progress(user_id, category)
+            if stats is None:
+                stats = self.get_progress_stats(user_id, category)
             
-            if not progress_data:
+            if not stats.n:
                 return {
                     'predicted_score': 0.0,
                     'confidence_interval': (0.0, 0.0),
@@ -463,13 +571,9 @@ class ProgressTracker:
                     'message': 'Insufficient data for prediction'
                 }
             
-            # Prepare data for prediction
-            scores = [entry['score'] for entry in progress_data]
-            timestamps = [entry['timestamp'] for entry in progress_data]
-            
-            if len(scores) < 3:
+            if stats.n < 3:
                 # Simple average for small datasets
-                avg_score = sum(scores) / len(scores)
+                avg_score = stats.mean
                 return {
                     'predicted_score': avg_score,
                     'confidence_interval': (avg_score * 0.8, avg_score * 1.2),
@@ -477,10 +581,16 @@ class ProgressTracker:
                     'message': 'Based on limited data'
                 }
             
-            # Use ML model for prediction if available
-            if category in self.models and self.models[category] is not None:
+            last_score = stats.last_score
+            
+            # Use ML model for prediction if available (model and scaler from the same training run)
+            with self._model_lock:
+                model = self.models.get(category)
+                scaler = self.scalers.get(category)
+            if model is not None:
                 # Get template-specific metrics for enhanced prediction
-                template_metrics = self.get_template_metrics(user_id, category)
+                if template_metrics is None:
+                    template_metrics = self.get_template_metrics(user_id, category)
                 
                 if template_metrics:
                     # Prepare features for prediction
@@ -490,54 +600,47 @@ class ProgressTracker:
                     if len(features) >= 2:
                         features_array = np.array(features).reshape(1, -1)
                         try:
-                            features_scaled = self.scalers[category].transform(features_array)
-                            prediction = self.models[category].predict(features_scaled)[0]
+                            features_scaled = scaler.transform(features_array)
+                            prediction = model.predict(features_scaled)[0]
                             
                             # Calculate confidence interval (simplified)
-                            std_dev = np.std(scores)
+                            std_dev = stats.std
                             confidence_interval = (
                                 max(0, prediction - std_dev),
                                 min(100, prediction + std_dev)
                             )
                             
-                            trend = 'improving' if prediction > scores[-1] else 'declining' if prediction < scores[-1] else 'stable'
+                            trend = 'improving' if prediction > last_score else 'declining' if prediction < last_score else 'stable'
                             
                             return {
                                 'predicted_score': float(prediction),
                                 'confidence_interval': confidence_interval,
                                 'trend': trend,
-                                'message': f'ML prediction based on {len(scores)} data points'
+                                'message': f'ML prediction based on {stats.n} data points'
                             }
                         except Exception:
                             # Fallback to linear regression if scaler/model not properly fitted
                             pass
             
-            # Fallback to linear regression
-            X = np.array(range(len(scores))).reshape(-1, 1)
-            y = np.array(scores)
-            
-            model = LinearRegression()
-            model.fit(X, y)
+            # Fallback to linear regression, solved in closed form from the running sums
+            slope, intercept, std_dev = stats.regression()
             
             # Predict next value
-            next_x = np.array([[len(scores)]])
-            prediction = model.predict(next_x)[0]
+            prediction = intercept + slope * stats.n
             
             # Calculate confidence interval
-            residuals = y - model.predict(X)
-            std_dev = np.std(residuals)
             confidence_interval = (
                 max(0, prediction - 1.96 * std_dev),
                 min(100, prediction + 1.96 * std_dev)
             )
             
-            trend = 'improving' if prediction > scores[-1] else 'declining' if prediction < scores[-1] else 'stable'
+            trend = 'improving' if prediction > last_score else 'declining' if prediction < last_score else 'stable'
             
             return {
                 'predicted_score': float(prediction),
                 'confidence_interval': confidence_interval,
                 'trend': trend,
-                'message': f'Linear regression based on {len(scores)} data points'
+                'message': f'Linear regression based on {stats.n} data points'
             }
             
         except Exception as e:
@@ -554,20 +657,84 @@ class ProgressTracker:
         categories = ['career', 'business', 'education', 'finance', 'quiz', 'chat']
         overall_progress = {}
         
-        for category in categories:
-            progress_data = self.get_user_progress(user_id, category)
-            if progress_data:
-                scores = [entry['score'] for entry in progress_data]
-                overall_progress[category] = {
-                    'current_score': scores[-1] if scores else 0,
-                    'average_score': sum(scores) / len(scores) if scores else 0,
-                    'total_attempts': len(scores),
-                    'trend': self._calculate_trend(scores),
-                    'prediction': self.predict_progress(user_id, category) if len(scores) >= 2 else None
-                }
+        conn = self._get_connection()
+        try:
+            cursor = conn.cursor()
+            placeholders = ', '.join('?' for _ in categories)
+            # The running stats already hold the attempt count, score sums and the latest
+            # scores, so the overview is one primary-key range read instead of a pass over history
+            cursor.execute(f'''
+                SELECT category, n, sum_x, sum_y, sum_xy, sum_xx, sum_yy, last_scores
+                FROM progress_stats
+                WHERE user_id = ? AND category IN ({placeholders}) AND n > 0
+            ''', (user_id, *categories))
+            rows = cursor.fetchall()
+            
+            # Latest template metrics only matter where an ML model can use them
+            with self._model_lock:
+                modelled = [row[0] for row in rows if row[0] in TEMPLATE_FEATURES and row[0] in self.models]
+            template_metrics = self._latest_template_metrics(cursor, user_id, modelled)
+        finally:
+            conn.close()
+        
+        for row in sorted(rows, key=lambda row: categories.index(row[0])):
+            category = row[0]
+            stats = ProgressStats.from_row(user_id, category, row[1:])
+            attempts, current_score = stats.n, float(stats.last_score)
+            # Third most recent score, or the oldest with fewer attempts
+            trend_base = stats.last_scores[-min(3, len(stats.last_scores))]
+            if attempts < 2:
+                trend = 'neutral'
+            elif current_score > trend_base:
+                trend = 'improving'
+            elif current_score < trend_base:
+                trend = 'declining'
+            else:
+                trend = 'stable'
+            
+            prediction = None
+            if attempts >= 2:
+                prediction = self.predict_progress(
+                    user_id, category, stats=stats,
+                    template_metrics=template_metrics.get(category, {}) if category in modelled else None
+                )
+            
+            overall_progress[category] = {
+                'current_score': current_score,
+                'average_score': stats.mean,
+                'total_attempts': attempts,
+                'trend': trend,
+                'prediction': prediction
+            }
         
         return overall_progress
 
+    def _latest_template_metrics(self, cursor: sqlite3.Cursor, user_id: str,
+                                 categories: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Newest metrics row per template category, as get_template_metrics returns it"""
+        if not categories:
+            return {}
+        
+        selects = []
+        for category in categories:
+            column_list = ', '.join(TEMPLATE_FEATURES[category])
+            selects.append(f'''
+                SELECT * FROM (
+                    SELECT '{category}', {column_list}, timestamp
+                    FROM {category}_metrics
+                    WHERE user_id = ?
+                    ORDER BY timestamp DESC
+                    LIMIT 1
+                )
+            ''')
+        cursor.execute(' UNION ALL '.join(selects), [user_id] * len(categories))
+        
+        metrics = {}
+        for row in cursor.fetchall():
+            category = row[0]
+            metrics[category] = dict(zip(TEMPLATE_FEATURES[category] + ['timestamp'], row[1:]))
+        return metrics
+
     def _calculate_trend(self, scores: List[float]) -> str:
         """Calculate trend based on recent scores"""
         if len(scores) < 2:
@@ -589,33 +756,13 @@ class ProgressTracker:
                            user_answer: str, is_correct: bool, correct_answer: str = None):
         """Record individual quiz question results"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS quiz_questions (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id TEXT NOT NULL,
-                    category TEXT NOT NULL,
-                    question TEXT NOT NULL,
-                    user_answer TEXT NOT NULL,
-                    is_correct BOOLEAN NOT NULL,
-                    correct_answer TEXT,
-                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            cursor.execute('''
-                INSERT INTO quiz_questions (user_id, category, question, user_answer, is_correct, correct_answer)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (user_id, category, question, user_answer, is_correct, correct_answer))
-            
-            conn.commit()
-            conn.close()
-            
-            # Calculate score for progress tracking (1 for correct, 0 for incorrect)
-            score = 100 if is_correct else 0
-            self.track_progress(user_id, category, score, 1)
+            # Scored 100 for correct and 0 for incorrect, as a one-question quiz
+            self.record_quiz_results(user_id, category, [{
+                'question': question,
+                'user_answer': user_answer,
+                'is_correct': is_correct,
+                'correct_answer': correct_answer
+            }], 100 if is_correct else 0)
             
         except sqlite3.Error as e:
             print(f"Database error in record_quiz_question: {e}")
@@ -634,7 +781,7 @@ class ProgressTracker:
     def get_quiz_questions(self, user_id: str, category: str = None) -> List[Dict]:
         """Get quiz questions history for a user"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._get_connection()
             cursor = conn.cursor()
             
             if category:
@@ -672,7 +819,7 @@ class ProgressTracker:
     def get_quiz_stats(self, user_id: str, category: str = None) -> Dict[str, Any]:
         """Get quiz statistics for a user"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._get_connection()
             cursor = conn.cursor()
             
             if category:
@@ -726,11 +873,14 @@ class ProgressTracker:
                 'average_score': 0.0
             }
 
-    def generate_progress_notification(self, user_id: str, category: str, score: float, metrics: Dict[str, Any]) -> Dict[str, Any]:
+    def generate_progress_notification(self, user_id: str, category: str, score: float, metrics: Dict[str, Any],
+                                       stats: Optional[ProgressStats] = None) -> Dict[str, Any]:
         """Generate a progress notification based on user performance."""
-        progress_data = self.get_user_progress(user_id, category)
+        # Stats already include the score being reported
+        if stats is None:
+            stats = self.get_progress_stats(user_id, category)
         
-        if not progress_data:
+        if stats.n <= 1:
             return {
                 "title": f"Welcome to {category.capitalize()} Learning!",
                 "message": f"You've started your {category} learning journey. Your first score: {score}%",
@@ -738,7 +888,7 @@ class ProgressTracker:
             }
         
         # Calculate improvement
-        previous_score = progress_data[-1]['score'] if len(progress_data) > 1 else score
+        previous_score = stats.last_scores[-2] if len(stats.last_scores) > 1 else score
         improvement = score - previous_score
         
         if improvement > 10:
@@ -808,10 +958,12 @@ class ProgressTracker:
                 
         return None
 
-    def generate_milestone_notification(self, user_id: str, category: str) -> Dict[str, Any]:
+    def generate_milestone_notification(self, user_id: str, category: str,
+                                        stats: Optional[ProgressStats] = None) -> Dict[str, Any]:
         """Generate milestone notifications based on user progress."""
-        progress_data = self.get_user_progress(user_id, category)
-        total_attempts = len(progress_data)
+        if stats is None:
+            stats = self.get_progress_stats(user_id, category)
+        total_attempts = stats.n
         
         milestones = {
             5: "You've completed 5 learning sessions! Consistency is key to success.",
@@ -835,46 +987,58 @@ class ProgressTracker:
             return
             
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._get_connection()
             cursor = conn.cursor()
             
-            # Create notifications table if it doesn't exist
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS user_notifications (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id TEXT NOT NULL,
-                    title TEXT NOT NULL,
-                    message TEXT NOT NULL,
-                    type TEXT NOT NULL,
-                    read BOOLEAN DEFAULT FALSE,
-                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            # Insert notifications
-            for notification in notifications:
-                cursor.execute('''
-                    INSERT INTO user_notifications (user_id, title, message, type)
-                    VALUES (?, ?, ?, ?)
-                ''', (
-                    user_id,
-                    notification['title'],
-                    notification['message'],
-                    notification['type']
-                ))
+            stored = self._insert_notifications(cursor, user_id, notifications)
             
             conn.commit()
             conn.close()
             
         except sqlite3.Error as e:
             print(f"Database error in _store_notifications: {e}")
+            return
+        
+        # Publish only after commit, so a stream never announces a row readers cannot see yet
+        for notification in stored:
+            notification_hub.publish(user_id, notification)
 
-    def generate_all_notifications(self, user_id: str, category: str, score: float, metrics: Dict[str, Any]) -> List[Dict[str, Any]]:
+    def _insert_notifications(self, cursor, user_id: str, notifications: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Insert notifications inside the caller's transaction and return them as stored"""
+        if not notifications:
+            return []
+        
+        ids = []
+        for notification in notifications:
+            cursor.execute('''
+                INSERT INTO user_notifications (user_id, title, message, type)
+                VALUES (?, ?, ?, ?)
+            ''', (
+                user_id,
+                notification['title'],
+                notification['message'],
+                notification['type']
+            ))
+            ids.append(cursor.lastrowid)
+        
+        # Read back ids and timestamps so open streams get the same shape as the list endpoint
+        cursor.execute(f'''
+            SELECT id, title, message, type, read, timestamp
+            FROM user_notifications
+            WHERE id IN ({', '.join('?' for _ in ids)})
+            ORDER BY id
+        ''', ids)
+        return [self._notification_from_row(row) for row in cursor.fetchall()]
+
+    def generate_all_notifications(self, user_id: str, category: str, score: float, metrics: Dict[str, Any],
+                                   stats: Optional[ProgressStats] = None) -> List[Dict[str, Any]]:
         """Generate all relevant notifications for user progress."""
         notifications = []
+        if stats is None:
+            stats = self.get_progress_stats(user_id, category)
         
         # Progress notification
-        progress_notification = self.generate_progress_notification(user_id, category, score, metrics)
+        progress_notification = self.generate_progress_notification(user_id, category, score, metrics, stats)
         if progress_notification:
             notifications.append(progress_notification)
         
@@ -884,43 +1048,40 @@ class ProgressTracker:
             notifications.append(insight_notification)
         
         # Milestone notification
-        milestone_notification = self.generate_milestone_notification(user_id, category)
+        milestone_notification = self.generate_milestone_notification(user_id, category, stats)
         if milestone_notification:
             notifications.append(milestone_notification)
         
         return notifications
 
-    def get_user_notifications(self, user_id: str, unread_only: bool = False) -> List[Dict[str, Any]]:
-        """Get notifications for a user, optionally filtered by read status"""
+    def get_user_notifications(self, user_id: str, unread_only: bool = False,
+                               before_id: Optional[int] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Get notifications for a user, newest first, optionally filtered by read status.
+
+        Pages are keyed on id: pass the last id of a page as `before_id` to get the next one.
+        """
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._get_connection()
             cursor = conn.cursor()
             
+            query = '''
+                SELECT id, title, message, type, read, timestamp 
+                FROM user_notifications 
+                WHERE user_id = ? AND archived = FALSE
+            '''
+            params: List[Any] = [user_id]
             if unread_only:
-                cursor.execute('''
-                    SELECT id, title, message, type, read, timestamp 
-                    FROM user_notifications 
-                    WHERE user_id = ? AND read = FALSE
-                    ORDER BY timestamp DESC
-                ''', (user_id,))
-            else:
-                cursor.execute('''
-                    SELECT id, title, message, type, read, timestamp 
-                    FROM user_notifications 
-                    WHERE user_id = ?
-                    ORDER BY timestamp DESC
-                ''', (user_id,))
+                query += " AND read = FALSE"
+            if before_id is not None:
+                query += " AND id < ?"
+                params.append(before_id)
+            query += " ORDER BY id DESC"
+            if limit is not None:
+                query += " LIMIT ?"
+                params.append(limit)
+            cursor.execute(query, params)
             
-            notifications = []
-            for row in cursor.fetchall():
-                notifications.append({
-                    'id': str(row[0]),  # Convert to string to match frontend interface
-                    'title': row[1],
-                    'message': row[2],
-                    'type': row[3],
-                    'read': bool(row[4]),
-                    'timestamp': row[5]
-                })
+            notifications = [self._notification_from_row(row) for row in cursor.fetchall()]
             
             conn.close()
             return notifications
@@ -929,10 +1090,64 @@ class ProgressTracker:
             print(f"Database error in get_user_notifications: {e}")
             return []
 
+    def get_notification_counts(self, user_id: str) -> Dict[str, int]:
+        """Get total and unread notification counts and the newest id from the maintained counters"""
+        try:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                SELECT total, unread, last_id
+                FROM notification_counters
+                WHERE user_id = ?
+            ''', (user_id,))
+            row = cursor.fetchone()
+            
+            conn.close()
+            total, unread, last_id = row if row else (0, 0, 0)
+            return {'total': total, 'unread': unread, 'last_id': last_id}
+            
+        except sqlite3.Error as e:
+            print(f"Database error in get_notification_counts: {e}")
+            return {'total': 0, 'unread': 0, 'last_id': 0}
+
+    def get_notifications_after(self, user_id: str, after_id: int, limit: int = 100) -> List[Dict[str, Any]]:
+        """Get a user's notifications with id greater than after_id, oldest first"""
+        try:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                SELECT id, title, message, type, read, timestamp
+                FROM user_notifications
+                WHERE user_id = ? AND id > ? AND archived = FALSE
+                ORDER BY id
+                LIMIT ?
+            ''', (user_id, after_id, limit))
+            
+            notifications = [self._notification_from_row(row) for row in cursor.fetchall()]
+            
+            conn.close()
+            return notifications
+            
+        except sqlite3.Error as e:
+            print(f"Database error in get_notifications_after: {e}")
+            return []
+
+    def _notification_from_row(self, row) -> Dict[str, Any]:
+        return {
+            'id': str(row[0]),  # Convert to string to match frontend interface
+            'title': row[1],
+            'message': row[2],
+            'type': row[3],
+            'read': bool(row[4]),
+            'timestamp': row[5]
+        }
+
     def mark_notification_as_read(self, notification_id: int):
         """Mark a notification as read"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._get_connection()
             cursor = conn.cursor()
 
             cursor.execute('''
@@ -947,66 +1162,170 @@ class ProgressTracker:
         except sqlite3.Error as e:
             print(f"Database error in mark_notification_as_read: {e}")
 
-    def store_quiz_answers(self, user_id: str, category: str, correct_answers: Dict[str, str]):
-        """Store correct answers for a quiz session"""
+    def mark_all_notifications_as_read(self, user_id: str) -> int:
+        """Mark every unread notification of a user as read; returns how many changed"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._get_connection()
             cursor = conn.cursor()
+            
+            cursor.execute('''
+                UPDATE user_notifications
+                SET read = TRUE
+                WHERE user_id = ? AND read = FALSE
+            ''', (user_id,))
+            updated = cursor.rowcount
+            
+            conn.commit()
+            conn.close()
+            return updated
+            
+        except sqlite3.Error as e:
+            print(f"Database error in mark_all_notifications_as_read: {e}")
+            return 0
 
-            # Create quiz_answers table if it doesn't exist
+    def mark_notifications_as_read(self, user_id: str, notification_ids: List[int]) -> int:
+        """Mark the given notifications of a user as read in one statement; returns how many changed"""
+        if not notification_ids:
+            return 0
+        
+        try:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            
+            # The ids travel as one JSON parameter, so the list size is not bound by SQLite's variable limit
             cursor.execute('''
-                CREATE TABLE IF NOT EXISTS quiz_answers (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id TEXT NOT NULL,
-                    category TEXT NOT NULL,
-                    question_id TEXT NOT NULL,
-                    correct_answer TEXT NOT NULL,
-                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    UNIQUE(user_id, category, question_id)
-                )
-            ''')
+                UPDATE user_notifications
+                SET read = TRUE
+                WHERE user_id = ? AND read = FALSE
+                  AND id IN (SELECT value FROM json_each(?))
+            ''', (user_id, json.dumps([int(notification_id) for notification_id in notification_ids])))
+            updated = cursor.rowcount
+            
+            conn.commit()
+            conn.close()
+            return updated
+            
+        except sqlite3.Error as e:
+            print(f"Database error in mark_notifications_as_read: {e}")
+            return 0
 
-            # Store correct answers
-            for question_id, correct_answer in correct_answers.items():
+    def archive_notifications(self, user_id: str, older_than_days: int) -> int:
+        """Archive a user's notifications older than the given number of days; returns how many changed"""
+        try:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            
+            if older_than_days <= 0:
+                # Clear all: rows from the current second must not slip through a time comparison
                 cursor.execute('''
-                    INSERT OR REPLACE INTO quiz_answers (user_id, category, question_id, correct_answer)
-                    VALUES (?, ?, ?, ?)
-                ''', (user_id, category, question_id, correct_answer))
-
+                    UPDATE user_notifications
+                    SET archived = TRUE
+                    WHERE user_id = ? AND archived = FALSE
+                ''', (user_id,))
+            else:
+                cursor.execute('''
+                    UPDATE user_notifications
+                    SET archived = TRUE
+                    WHERE user_id = ? AND archived = FALSE
+                      AND timestamp <= datetime('now', ?)
+                ''', (user_id, f'-{int(older_than_days)} days'))
+            archived = cursor.rowcount
+            
             conn.commit()
             conn.close()
-
+            return archived
+            
         except sqlite3.Error as e:
-            print(f"Database error in store_quiz_answers: {e}")
+            print(f"Database error in archive_notifications: {e}")
+            return 0
+
+    def create_quiz_session(self, user_id: str, category: str, answer_key: List[str],
+                            questions: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Store a quiz's answer key (correct answers in question order) under a new session id"""
+        session_id = uuid.uuid4().hex
+        now = time.time()
+        expires_at = now + QUIZ_SESSION_TTL
+
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO quiz_sessions (session_id, user_id, category, answer_key, questions, created_at, expires_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (session_id, user_id, category, json.dumps(answer_key, separators=(',', ':')),
+              json.dumps(questions or [], separators=(',', ':')), now, expires_at))
+        conn.commit()
+        conn.close()
+
+        self._maybe_sweep_quiz_sessions(now)
+        return {"session_id": session_id, "expires_at": datetime.fromtimestamp(expires_at).isoformat()}
 
-    def get_correct_answers(self, user_id: str, category: str) -> Dict[str, str]:
-        """Retrieve correct answers for a user's quiz session"""
+    def get_quiz_session(self, user_id: str, category: str,
+                         session_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Session id, answer key and question texts of an unexpired quiz session of the user.
+
+        Without a session id (older clients) the user's latest session in the
+        category is used.
+        """
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._get_connection()
             cursor = conn.cursor()
+            if session_id:
+                cursor.execute('''
+                    SELECT session_id, answer_key, questions FROM quiz_sessions
+                    WHERE session_id = ? AND user_id = ? AND category = ? AND expires_at > ?
+                ''', (session_id, user_id, category, time.time()))
+            else:
+                cursor.execute('''
+                    SELECT session_id, answer_key, questions FROM quiz_sessions
+                    WHERE user_id = ? AND category = ? AND expires_at > ?
+                    ORDER BY created_at DESC
+                    LIMIT 1
+                ''', (user_id, category, time.time()))
+            row = cursor.fetchone()
+            conn.close()
+            if not row:
+                return None
+            return {"session_id": row[0], "answer_key": json.loads(row[1]), "questions": json.loads(row[2] or '[]')}
 
-            cursor.execute('''
-                SELECT question_id, correct_answer
-                FROM quiz_answers
-                WHERE user_id = ? AND category = ?
-                ORDER BY timestamp DESC
-            ''', (user_id, category))
-
-            correct_answers = {}
-            for row in cursor.fetchall():
-                correct_answers[row[0]] = row[1]
+        except sqlite3.Error as e:
+            print(f"Database error in get_quiz_session: {e}")
+            return None
 
+    def sweep_quiz_sessions(self, now: Optional[float] = None) -> int:
+        """Delete expired quiz sessions; returns the number removed"""
+        try:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM quiz_sessions WHERE expires_at <= ?", (now or time.time(),))
+            removed = cursor.rowcount
+            conn.commit()
             conn.close()
-            return correct_answers
+            return removed
 
         except sqlite3.Error as e:
-            print(f"Database error in get_correct_answers: {e}")
-            return {}
+            print(f"Database error in sweep_quiz_sessions: {e}")
+            return 0
+
+    def _maybe_sweep_quiz_sessions(self, now: float):
+        # Piggybacks on session creation, at most once per sweep interval
+        with self._sweep_lock:
+            if now - self._last_session_sweep < QUIZ_SESSION_SWEEP_INTERVAL:
+                return
+            self._last_session_sweep = now
+        self.sweep_quiz_sessions(now)
 
     def train_prediction_model(self):
         """Train the prediction model for all categories"""
         for category in ['career', 'business', 'education', 'finance']:
-            self.train_model(category)
+            try:
+                self.train_model(category)
+            except Exception:
+                # Already logged; the other categories still train
+                continue
+
+    def request_training(self, categories: Optional[List[str]] = None) -> List[str]:
+        """Queue a background retrain (all template categories by default)"""
+        return self.training_scheduler.request(categories or ['career', 'business', 'education', 'finance'])
 
 # Global instance for easy import
 progress_tracker = ProgressTracker()
@@ -0,0 +1,185 @@
+import os
+import asyncio
+import threading
+import logging
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from Apps.Model.nlp import MCMC
+from Apps.utils import database
+from Apps.utils.executor import run_blocking
+from Apps.template.prompt_budget import token_counter, format_turn, SUMMARY_TOKEN_LIMIT
+
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Most recent unsummarized turns kept verbatim in the prompt
+SUMMARY_KEEP_TURNS = int(os.getenv('SCMC_SUMMARY_KEEP_TURNS', '4'))
+# Older turns folded into the summary per LLM call
+SUMMARY_BATCH_TURNS = int(os.getenv('SCMC_SUMMARY_BATCH_TURNS', '8'))
+# Turns beyond the verbatim window that trigger a summary, so calls fold several turns at once
+SUMMARY_MIN_TURNS = max(1, int(os.getenv('SCMC_SUMMARY_MIN_TURNS', '4')))
+
+Summary_task = """
+You maintain a running summary of a {category} mentoring conversation with a student.
+
+Current summary:
+{summary}
+
+New exchanges:
+{turns}
+
+Rewrite the summary so it also covers the new exchanges. Keep the student's goals and background,
+what was explained, questions still open and agreed next steps. Use at most {max_words} words of
+plain prose and no preamble.
+"""
+
+
+def load_summary(cursor, user_id: str, category: str) -> Tuple[str, int]:
+    """(summary, id of the last turn it covers) for a user's conversation in a category"""
+    cursor.execute(
+        "SELECT summary, covered_id FROM conversation_summaries WHERE user_id = ? AND category = ?",
+        (user_id, category)
+    )
+    row = cursor.fetchone()
+    return (row[0], row[1]) if row else ("", 0)
+
+
+def _turns_to_fold(user_id: str, category: str) -> Tuple[str, int, List[Tuple[int, str, str]]]:
+    conn = database.get_db_connection()
+    cursor = conn.cursor()
+    summary, covered_id = load_summary(cursor, user_id, category)
+    cursor.execute('''
+        SELECT id, user_input, ai_response FROM conversation_memory
+        WHERE user_id = ? AND category = ? AND id > ?
+        ORDER BY id
+        LIMIT ?
+    ''', (user_id, category, covered_id, SUMMARY_BATCH_TURNS + SUMMARY_KEEP_TURNS))
+    rows = cursor.fetchall()
+    conn.close()
+    return summary, covered_id, rows[:max(0, len(rows) - SUMMARY_KEEP_TURNS)]
+
+
+def _save_summary(user_id: str, category: str, summary: str, covered_id: int, turns: int, previous_covered_id: int) -> bool:
+    conn = database.get_db_connection()
+    cursor = conn.cursor()
+    # Only advance from the state the summary was built on
+    cursor.execute('''
+        INSERT INTO conversation_summaries (user_id, category, summary, covered_id, turns)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (user_id, category) DO UPDATE SET
+            summary = excluded.summary,
+            covered_id = excluded.covered_id,
+            turns = conversation_summaries.turns + excluded.turns,
+            updated_at = CURRENT_TIMESTAMP
+        WHERE conversation_summaries.covered_id = ?
+    ''', (user_id, category, summary, covered_id, turns, previous_covered_id))
+    saved = cursor.rowcount > 0
+    conn.commit()
+    conn.close()
+    return saved
+
+
+class ConversationSummarizer:
+    """Folds turns that fell out of the prompt window into a stored per-(user, category) summary.
+
+    Runs as one task on the server's event loop so summary calls go through the
+    LLM scheduler as batch work. `schedule` may be called from any thread;
+    repeated requests for a conversation already queued are coalesced.
+    """
+
+    def __init__(self):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._pending: Set[Tuple[str, str]] = set()
+        self._lock = threading.Lock()
+        self.updated = 0
+        self.turns_folded = 0
+        self.failed = 0
+
+    def start(self):
+        """Start the worker on the running event loop (call from startup)"""
+        if self._task is not None and not self._task.done():
+            return
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        self._task = self._loop.create_task(self._run())
+
+    async def stop(self):
+        task, self._task = self._task, None
+        self._loop = None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        with self._lock:
+            self._pending.clear()
+
+    def schedule(self, user_id: str, category: str):
+        key = (user_id, category)
+        with self._lock:
+            if self._loop is None or key in self._pending:
+                return
+            self._pending.add(key)
+            loop, queue = self._loop, self._queue
+        try:
+            loop.call_soon_threadsafe(queue.put_nowait, key)
+        except RuntimeError:
+            # Loop closed during shutdown
+            with self._lock:
+                self._pending.discard(key)
+
+    async def _run(self):
+        while True:
+            key = await self._queue.get()
+            try:
+                await self.summarize(*key)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failed += 1
+                logger.warning(f"Conversation summary for {key} failed: {e}")
+            finally:
+                with self._lock:
+                    self._pending.discard(key)
+
+    async def summarize(self, user_id: str, category: str):
+        """Fold all turns beyond the verbatim window into the summary"""
+        while True:
+            summary, covered_id, turns = await run_blocking(_turns_to_fold, user_id, category)
+            if not turns:
+                return
+
+            prompt = Summary_task.format(
+                category=category,
+                summary=summary or "(none yet)",
+                turns="\n\n".join(format_turn(user_input, ai_response) for _, user_input, ai_response in turns),
+                max_words=int(SUMMARY_TOKEN_LIMIT * 0.7)
+            )
+            new_summary = token_counter.truncate((await MCMC.aask(prompt, use_case='summary')).strip(), SUMMARY_TOKEN_LIMIT)
+            saved = await run_blocking(_save_summary, user_id, category, new_summary, turns[-1][0], len(turns), covered_id)
+            if not saved:
+                # Another worker advanced it meanwhile; its summary wins
+                return
+            self.updated += 1
+            self.turns_folded += len(turns)
+            if len(turns) < SUMMARY_BATCH_TURNS:
+                return
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            queued = len(self._pending)
+        return {
+            'running': self._task is not None and not self._task.done(),
+            'queued': queued,
+            'updated': self.updated,
+            'turns_folded': self.turns_folded,
+            'failed': self.failed
+        }
+
+
+# Global instance
+conversation_summarizer = ConversationSummarizer()
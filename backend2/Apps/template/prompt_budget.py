@@ -0,0 +1,121 @@
+import os
+import math
+import json
+import threading
+import logging
+from typing import Any, List, Optional, Sequence, Tuple
+
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Token budget for the "Previous Conversation" block, summary included
+HISTORY_TOKEN_BUDGET = int(os.getenv('SCMC_PROMPT_HISTORY_TOKENS', '1200'))
+# Cap on one AI answer inside the history; long answers are cut, not dropped
+TURN_TOKEN_LIMIT = int(os.getenv('SCMC_PROMPT_TURN_TOKENS', '350'))
+SUMMARY_TOKEN_LIMIT = int(os.getenv('SCMC_PROMPT_SUMMARY_TOKENS', '300'))
+# Caps on profile material pasted into generation prompts
+CV_TOKEN_LIMIT = int(os.getenv('SCMC_PROMPT_CV_TOKENS', '250'))
+TIMETABLE_TOKEN_LIMIT = int(os.getenv('SCMC_PROMPT_TIMETABLE_TOKENS', '150'))
+# Encoding used for counting when tiktoken is installed and its data is available
+TOKEN_ENCODING = os.getenv('SCMC_TOKEN_ENCODING', 'cl100k_base')
+
+SUMMARY_PREFIX = "Summary of earlier conversation: "
+
+
+class TokenCounter:
+    """Counts and trims tokens with tiktoken, falling back to ~4 characters per token"""
+
+    def __init__(self, encoding_name: str = TOKEN_ENCODING):
+        self.encoding_name = encoding_name
+        self._encoding = None
+        self._resolved = False
+        self._lock = threading.Lock()
+
+    def _get_encoding(self):
+        if not self._resolved:
+            with self._lock:
+                if not self._resolved:
+                    try:
+                        import tiktoken
+                        self._encoding = tiktoken.get_encoding(self.encoding_name)
+                    except Exception as e:
+                        # Not installed, or the encoding file cannot be downloaded (offline)
+                        logger.info(f"Counting prompt tokens approximately: {e}")
+                    self._resolved = True
+        return self._encoding
+
+    @property
+    def exact(self) -> bool:
+        return self._get_encoding() is not None
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        encoding = self._get_encoding()
+        if encoding is not None:
+            return len(encoding.encode(text, disallowed_special=()))
+        return math.ceil(len(text) / 4)
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Text cut to at most max_tokens, marked with an ellipsis when shortened"""
+        if not text or max_tokens <= 0:
+            return ""
+        encoding = self._get_encoding()
+        if encoding is not None:
+            tokens = encoding.encode(text, disallowed_special=())
+            if len(tokens) <= max_tokens:
+                return text
+            return encoding.decode(tokens[:max_tokens]).rstrip() + "..."
+        if len(text) <= max_tokens * 4:
+            return text
+        return text[:max_tokens * 4].rstrip() + "..."
+
+
+token_counter = TokenCounter()
+
+
+def format_turn(user_input: str, ai_response: str, max_answer_tokens: int = TURN_TOKEN_LIMIT) -> str:
+    return f"User: {user_input}\nAI: {token_counter.truncate(ai_response, max_answer_tokens)}"
+
+
+def pack_history(turns: Sequence[Tuple[int, str, str]], summary: Optional[str] = None,
+                 budget: int = HISTORY_TOKEN_BUDGET) -> Tuple[str, int]:
+    """Pack (id, user_input, ai_response) turns, newest first, under a token budget.
+
+    The running summary goes first, then as many of the most recent turns as
+    fit, in chronological order. The newest turn is always kept, cut down if
+    necessary. Returns the history text and the number of turns included.
+    """
+    parts: List[str] = []
+    remaining = budget
+    if summary:
+        summary_text = SUMMARY_PREFIX + token_counter.truncate(summary, SUMMARY_TOKEN_LIMIT)
+        remaining -= token_counter.count(summary_text)
+        parts.append(summary_text)
+
+    included: List[str] = []
+    for _, user_input, ai_response in turns:
+        turn = format_turn(user_input, ai_response)
+        cost = token_counter.count(turn) + 1
+        if cost > remaining:
+            if not included:
+                included.append(token_counter.truncate(turn, max(remaining, TURN_TOKEN_LIMIT // 2)))
+            break
+        included.append(turn)
+        remaining -= cost
+
+    return "\n\n".join(parts + list(reversed(included))), len(included)
+
+
+def compact_json(data: Any) -> str:
+    """JSON without indentation or padding, rounding floats to two decimals"""
+    def rounded(value):
+        if isinstance(value, float):
+            return round(value, 2)
+        if isinstance(value, dict):
+            return {key: rounded(item) for key, item in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [rounded(item) for item in value]
+        return value
+    return json.dumps(rounded(data), separators=(',', ':'), default=str)
@@ -1,109 +1,30 @@
 from fastapi import APIRouter
 from pydantic import BaseModel
 from datetime import datetime
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple
+import os
 import json
-import sqlite3
 from langchain_core.prompts import PromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.tools import Tool
 from Apps.Model.nlp import MCMC
 from Apps.Model.cofing import Link_URL_EMBEDDING, Secret, Link_URL
+from Apps.utils import database
+from Apps.utils.migrations import migrate
+from Apps.template.prompt_budget import pack_history
+from Apps.template.conversation_summary import conversation_summarizer, load_summary, SUMMARY_KEEP_TURNS, SUMMARY_MIN_TURNS
 
 router = APIRouter()
 
 
 # Memory Setup (per user) - Persistent Database Storage
 def get_db_connection():
-    """Get a connection to the user progress database"""
-    db_path = "user_progress.db"
-    return sqlite3.connect(db_path)
+    """Get a pooled connection to the user progress database"""
+    return database.get_db_connection()
 
 def init_memory_tables():
-    """Initialize database tables for conversation memory and user data"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # Create conversation_memory table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS conversation_memory (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id TEXT,
-            category TEXT,
-            user_input TEXT,
-            ai_response TEXT,
-            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users (user_id)
-        )
-    ''')
-    
-    # Create users table with extended schema
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            user_id TEXT PRIMARY KEY,
-            name TEXT,
-            email TEXT,
-            phone TEXT,
-            birthday TEXT,
-            sex TEXT,
-            template TEXT,
-            profile_picture TEXT,
-            cv_file_path TEXT,
-            cv_content TEXT,
-            confirmation_code TEXT,
-            is_confirmed BOOLEAN DEFAULT FALSE,
-            card_id TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    # Create email_confirmations table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS email_confirmations (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id TEXT,
-            confirmation_code TEXT,
-            email TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            expires_at TIMESTAMP,
-            is_used BOOLEAN DEFAULT FALSE,
-            FOREIGN KEY (user_id) REFERENCES users (user_id)
-        )
-    ''')
-    
-    # Create education_programs table for education template users
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS education_programs (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id TEXT,
-            program_name TEXT,
-            program_start_date TEXT,
-            program_end_date TEXT,
-            daily_schedule TEXT,
-            program_duration_unit TEXT,
-            program_duration_length INTEGER,
-            expected_completion_date TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users (user_id)
-        )
-    ''')
-    
-    # Create attendance_tracking table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS attendance_tracking (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id TEXT,
-            session_date TEXT,
-            session_time TEXT,
-            status TEXT, -- present, late, absent
-            notes TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users (user_id)
-        )
-    ''')
-    
-    conn.commit()
-    conn.close()
+    """Ensure the database schema is up to date (migrations run once per process)"""
+    migrate()
 
 
 def update_memory(user_id: str, category: str, user_input: str, ai_response: str):
@@ -126,26 +47,36 @@ def update_memory(user_id: str, category: str, user_input: str, ai_response: str
     conn.commit()
     conn.close()
 
+# History placeholder for a user with no earlier messages in a category
+NO_HISTORY = "No previous conversation."
+
+# Unsummarized turns read for the prompt; the packer keeps what fits the token budget
+HISTORY_TURNS = int(os.getenv('SCMC_PROMPT_HISTORY_TURNS', '10'))
+
 def retrieve_memory(user_id: str, category: str) -> str:
-    """Retrieve conversation history from database"""
+    """Conversation history for a prompt: rolling summary plus recent turns under the token budget"""
     conn = get_db_connection()
     cursor = conn.cursor()
-    
+
+    summary, covered_id = load_summary(cursor, user_id, category)
     cursor.execute(
-        "SELECT user_input, ai_response FROM conversation_memory WHERE user_id = ? AND category = ? ORDER BY timestamp DESC LIMIT 10",
-        (user_id, category)
+        "SELECT id, user_input, ai_response FROM conversation_memory "
+        "WHERE user_id = ? AND category = ? AND id > ? ORDER BY id DESC LIMIT ?",
+        (user_id, category, covered_id, HISTORY_TURNS)
     )
-    
-    conversations = []
-    for user_input, ai_response in cursor.fetchall():
-        conversations.append(f"User: {user_input}\nAI: {ai_response}")
-    
+    turns = cursor.fetchall()
+
     conn.close()
-    
-    if not conversations:
-        return "No previous conversation."
-    
-    return "\n\n".join(reversed(conversations[-5:]))
+
+    if not turns and not summary:
+        return NO_HISTORY
+
+    # Older turns are folded into the summary in the background
+    if len(turns) >= SUMMARY_KEEP_TURNS + SUMMARY_MIN_TURNS:
+        conversation_summarizer.schedule(user_id, category)
+
+    history, _ = pack_history(turns, summary)
+    return history
 
 
 # LLM & Prompt Chains
@@ -310,6 +241,10 @@ def get_user_name(user_id: str) -> str:
         conn.close()
         return "User"
 
+def get_chat_context(user_id: str, category: str) -> Tuple[str, str]:
+    """Conversation history and user name for a chain call, read in one go"""
+    return retrieve_memory(user_id, category), get_user_name(user_id)
+
 career_tool = Tool(
     name="Career Advisor",
     func=lambda user_id, topic, user_input: career_chain(
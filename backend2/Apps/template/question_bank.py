@@ -0,0 +1,333 @@
+import os
+import re
+import json
+import random
+import asyncio
+import hashlib
+import threading
+import logging
+from typing import Any, Dict, List, Literal, NamedTuple, Optional, Sequence, Set, Tuple
+
+from pydantic import BaseModel, Field, field_validator
+
+from Apps.Model.nlp import MCMC
+from Apps.Model.scheduler import LLMBusyError
+from Apps.utils import database
+from Apps.utils.executor import run_blocking
+from Apps.template.prompt_budget import token_counter
+
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+QUESTION_BANK_ENABLED = os.getenv('SCMC_QUESTION_BANK_ENABLED', '1').lower() in ('1', 'true', 'yes')
+# A bucket with fewer servable questions than this is refilled in the background
+LOW_WATER = int(os.getenv('SCMC_QUESTION_BANK_LOW_WATER', '20'))
+# Servable questions a refill tops a bucket up to
+TARGET_SIZE = int(os.getenv('SCMC_QUESTION_BANK_TARGET', '60'))
+# Questions requested per background LLM call
+FILL_BATCH = int(os.getenv('SCMC_QUESTION_BANK_BATCH', '10'))
+# Times a question is served before it is retired (kept only for deduplication)
+MAX_SERVES = int(os.getenv('SCMC_QUESTION_BANK_MAX_SERVES', '50'))
+# Interval of the periodic top-up scan over all known buckets
+REFRESH_SECONDS = float(os.getenv('SCMC_QUESTION_BANK_REFRESH_SECONDS', '600'))
+# Existing questions listed in a fill prompt so the model avoids repeating them
+AVOID_SAMPLE = int(os.getenv('SCMC_QUESTION_BANK_AVOID_SAMPLE', '15'))
+
+DIFFICULTIES = ('beginner', 'intermediate', 'advanced')
+DEFAULT_DIFFICULTY = 'beginner'
+# Buckets kept filled even before anyone asked for them
+DEFAULT_CATEGORIES = ('career', 'business', 'education', 'finance')
+
+OPTION_LETTERS = "ABCD"
+_OPTION_LABEL = re.compile(r'^\(?[A-Da-d][\).:]\s+')
+_NON_WORD = re.compile(r'[^\w\s]')
+_WHITESPACE = re.compile(r'\s+')
+
+
+class QuizItem(BaseModel):
+    """One generated multiple choice question as returned by the model"""
+    question: str = Field(min_length=5)
+    options: List[str] = Field(min_length=4, max_length=4)
+    correct_option: Literal["A", "B", "C", "D"]
+
+    @field_validator("question")
+    @classmethod
+    def _strip_numbering(cls, question: str) -> str:
+        return re.sub(r'^\d+[\).]\s*', '', question.strip())
+
+    @field_validator("options")
+    @classmethod
+    def _distinct_options(cls, options: List[str]) -> List[str]:
+        cleaned = [_OPTION_LABEL.sub('', option.strip()).strip() for option in options]
+        if not all(cleaned):
+            raise ValueError("options must not be empty")
+        if len({option.lower() for option in cleaned}) != len(cleaned):
+            raise ValueError("options must be distinct")
+        return cleaned
+
+    @field_validator("correct_option", mode="before")
+    @classmethod
+    def _option_letter(cls, value: Any) -> Any:
+        if isinstance(value, int) and 0 <= value < len(OPTION_LETTERS):
+            return OPTION_LETTERS[value]
+        if isinstance(value, str):
+            return value.strip().strip("().").upper()[:1]
+        return value
+
+    @property
+    def correct_index(self) -> int:
+        return OPTION_LETTERS.index(self.correct_option)
+
+
+class Bucket(NamedTuple):
+    """Question bank partition; program is '' outside program-specific education quizzes"""
+    category: str
+    program: str
+    difficulty: str
+
+
+def make_bucket(category: str, program: Optional[str] = None, difficulty: Optional[str] = None) -> Bucket:
+    difficulty = (difficulty or DEFAULT_DIFFICULTY).strip().lower()
+    return Bucket(
+        category.strip().lower(),
+        _WHITESPACE.sub(' ', (program or '').strip().lower()),
+        difficulty if difficulty in DIFFICULTIES else DEFAULT_DIFFICULTY
+    )
+
+
+def bucket_subject(bucket: Bucket) -> str:
+    if bucket.program:
+        return f"knowledge in {bucket.program} at {bucket.difficulty} level"
+    return f"{bucket.category} knowledge at {bucket.difficulty} level"
+
+
+def quiz_prompt(subject: str, num_questions: int) -> str:
+    return f"""Generate {num_questions} multiple choice questions to assess {subject}.
+
+Each question has exactly 4 distinct options without letter prefixes, and correct_option is the letter (A, B, C or D) of the one correct option.
+Spread the correct options across the letters."""
+
+
+def question_hash(question: str) -> str:
+    """Hash of the question text ignoring case, punctuation and spacing"""
+    normalized = _WHITESPACE.sub(' ', _NON_WORD.sub(' ', question.lower())).strip()
+    return hashlib.sha1(normalized.encode('utf-8')).hexdigest()
+
+
+def add_questions(bucket: Bucket, items: Sequence[QuizItem], source: str = 'background') -> int:
+    """Insert items into a bucket, skipping duplicates; returns the number added"""
+    conn = database.get_db_connection()
+    cursor = conn.cursor()
+    added = 0
+    for item in items:
+        cursor.execute('''
+            INSERT OR IGNORE INTO question_bank
+                (category, program, difficulty, question, options, correct_index, question_hash, source)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (*bucket, item.question, json.dumps(item.options), item.correct_index,
+              question_hash(item.question), source))
+        added += cursor.rowcount
+    conn.commit()
+    conn.close()
+    return added
+
+
+def _available(cursor, bucket: Bucket) -> int:
+    cursor.execute('''
+        SELECT COUNT(*) FROM question_bank
+        WHERE category = ? AND program = ? AND difficulty = ? AND served_count < ?
+    ''', (*bucket, MAX_SERVES))
+    return cursor.fetchone()[0]
+
+
+def _known_buckets() -> List[Bucket]:
+    conn = database.get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT DISTINCT category, program, difficulty FROM question_bank")
+    buckets = {Bucket(*row) for row in cursor.fetchall()}
+    conn.close()
+    buckets.update(make_bucket(category) for category in DEFAULT_CATEGORIES)
+    return sorted(buckets)
+
+
+def _fill_state(bucket: Bucket) -> Tuple[int, List[str]]:
+    conn = database.get_db_connection()
+    cursor = conn.cursor()
+    available = _available(cursor, bucket)
+    cursor.execute('''
+        SELECT question FROM question_bank
+        WHERE category = ? AND program = ? AND difficulty = ?
+        ORDER BY id DESC LIMIT ?
+    ''', (*bucket, AVOID_SAMPLE))
+    recent = [row[0] for row in cursor.fetchall()]
+    conn.close()
+    return available, recent
+
+
+class QuestionBank:
+    """Serves quizzes from pre-generated questions and keeps each bucket topped up.
+
+    `sample` picks the least-served questions of a bucket with one indexed
+    query, so opening a quiz costs no LLM call. When a bucket cannot cover a
+    quiz the caller generates live and feeds the result back with
+    `add_questions`. Buckets below LOW_WATER are refilled to TARGET_SIZE by
+    a task on the server's event loop, whose LLM calls run as batch work;
+    a periodic scan tops up every known bucket. `schedule` may be called
+    from any thread.
+    """
+
+    def __init__(self, enabled: bool = QUESTION_BANK_ENABLED):
+        self.enabled = enabled
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._pending: Set[Bucket] = set()
+        self._lock = threading.Lock()
+        self.served = 0
+        self.misses = 0
+        self.generated = 0
+        self.duplicates = 0
+        self.fill_failures = 0
+
+    def _count(self, counter: str, amount: int = 1):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + amount)
+
+    def sample(self, bucket: Bucket, count: int) -> Optional[List[Dict[str, Any]]]:
+        """`count` questions of a bucket marked as served, or None when it holds too few"""
+        if not self.enabled:
+            return None
+        conn = database.get_db_connection()
+        cursor = conn.cursor()
+        # Least-served first spreads questions evenly and keeps back-to-back quizzes distinct.
+        # The bucket index yields that order directly; ties are shuffled here rather than sorted in SQL.
+        cursor.execute('''
+            SELECT id, question, options, correct_index, served_count FROM question_bank
+            WHERE category = ? AND program = ? AND difficulty = ? AND served_count < ?
+            ORDER BY served_count, id
+            LIMIT ?
+        ''', (*bucket, MAX_SERVES, max(count, LOW_WATER + count)))
+        rows = cursor.fetchall()
+        random.shuffle(rows)
+        rows.sort(key=lambda row: row[4])
+
+        if len(rows) < count:
+            conn.close()
+            self._count('misses')
+            self.schedule(bucket)
+            return None
+
+        picked = rows[:count]
+        cursor.executemany(
+            "UPDATE question_bank SET served_count = served_count + 1 WHERE id = ?",
+            [(row[0],) for row in picked]
+        )
+        conn.commit()
+        conn.close()
+        self._count('served')
+        if len(rows) - count < LOW_WATER:
+            self.schedule(bucket)
+
+        questions = []
+        for question_id, question, options, correct_index, _ in picked:
+            options = json.loads(options)
+            questions.append({
+                "bank_id": question_id,
+                "question": question,
+                "options": options,
+                "correct_answer": options[correct_index]
+            })
+        return questions
+
+    def start(self):
+        """Start the filler on the running event loop (call from startup)"""
+        if not self.enabled or (self._task is not None and not self._task.done()):
+            return
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        self._task = self._loop.create_task(self._run())
+
+    async def stop(self):
+        task, self._task = self._task, None
+        self._loop = None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        with self._lock:
+            self._pending.clear()
+
+    def schedule(self, bucket: Bucket):
+        with self._lock:
+            if self._loop is None or bucket in self._pending:
+                return
+            self._pending.add(bucket)
+            loop, queue = self._loop, self._queue
+        try:
+            loop.call_soon_threadsafe(queue.put_nowait, bucket)
+        except RuntimeError:
+            # Loop closed during shutdown
+            with self._lock:
+                self._pending.discard(bucket)
+
+    async def _run(self):
+        # Buckets can fill during startup, so the first scan runs right away
+        for bucket in await run_blocking(_known_buckets):
+            self.schedule(bucket)
+        while True:
+            try:
+                bucket = await asyncio.wait_for(self._queue.get(), REFRESH_SECONDS)
+            except asyncio.TimeoutError:
+                for bucket in await run_blocking(_known_buckets):
+                    self.schedule(bucket)
+                continue
+            try:
+                await self.fill(bucket)
+            except asyncio.CancelledError:
+                raise
+            except LLMBusyError as e:
+                self._count('fill_failures')
+                logger.info(f"Question bank fill for {bucket} deferred: {e}")
+            except Exception as e:
+                self._count('fill_failures')
+                logger.warning(f"Question bank fill for {bucket} failed: {e}")
+            finally:
+                with self._lock:
+                    self._pending.discard(bucket)
+
+    async def fill(self, bucket: Bucket):
+        """Generate questions until the bucket holds TARGET_SIZE servable ones"""
+        available, recent = await run_blocking(_fill_state, bucket)
+        while available < TARGET_SIZE:
+            prompt = quiz_prompt(bucket_subject(bucket), FILL_BATCH)
+            if recent:
+                avoid = "\n".join(f"- {token_counter.truncate(question, 20)}" for question in recent)
+                prompt += f"\n\nDo not repeat these existing questions:\n{avoid}"
+            items = await MCMC.agenerate_items(prompt, QuizItem, FILL_BATCH, name='questions', use_case='question_bank')
+            added = await run_blocking(add_questions, bucket, items)
+            self._count('generated', added)
+            self._count('duplicates', len(items) - added)
+            if added == 0:
+                # The model keeps producing known questions; try again on the next scan
+                return
+            available, recent = await run_blocking(_fill_state, bucket)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'running': self._task is not None and not self._task.done(),
+                'queued': len(self._pending),
+                'quizzes_served': self.served,
+                'misses': self.misses,
+                'generated': self.generated,
+                'duplicates_skipped': self.duplicates,
+                'fill_failures': self.fill_failures
+            }
+
+
+# Global instance
+question_bank = QuestionBank()
@@ -0,0 +1,124 @@
+import os
+import time
+import threading
+import logging
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class TrainingScheduler:
+    """Retrains progress models on a background thread instead of on the request path.
+
+    A category is retrained when `min_new_rows` rows arrived since its last
+    training, when rows are pending and `max_interval` seconds have elapsed, or
+    when a retrain is requested explicitly. Predictions keep using the last
+    successfully trained model until a new one is swapped in.
+    """
+
+    def __init__(self, train_fn: Callable[[str], None],
+                 min_new_rows: int = int(os.getenv('SCMC_RETRAIN_MIN_ROWS', '50')),
+                 max_interval: float = float(os.getenv('SCMC_RETRAIN_INTERVAL_SECONDS', '600')),
+                 poll_interval: float = 5.0):
+        self.train_fn = train_fn
+        self.min_new_rows = min_new_rows
+        self.max_interval = max_interval
+        self.poll_interval = poll_interval
+
+        self._pending: Dict[str, int] = {}
+        self._last_trained: Dict[str, float] = {}
+        # Stands in for the last training of categories not trained since start,
+        # so rows pending after a restart wait max_interval like any others
+        self._started_at = time.time()
+        self._last_error: Dict[str, str] = {}
+        self._requested: Set[str] = set()
+        self._training: Optional[str] = None
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = False
+
+    def start(self):
+        with self._cond:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stopped = False
+            self._thread = threading.Thread(target=self._run, name='progress-model-trainer', daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def record_new_rows(self, category: str, count: int = 1):
+        """Count rows written for a category; cheap enough for every insert"""
+        with self._cond:
+            self._pending[category] = self._pending.get(category, 0) + count
+            if self._pending[category] >= self.min_new_rows:
+                self._cond.notify_all()
+        self.start()
+
+    def request(self, categories: Optional[Iterable[str]] = None) -> List[str]:
+        """Queue an immediate retrain of the given (or all known) categories"""
+        with self._cond:
+            if categories is None:
+                categories = set(self._pending) | set(self._last_trained)
+            queued = list(categories)
+            self._requested.update(queued)
+            self._cond.notify_all()
+        self.start()
+        return queued
+
+    def status(self) -> Dict[str, Dict]:
+        with self._cond:
+            categories = set(self._pending) | set(self._last_trained) | self._requested
+            return {
+                category: {
+                    'pending_rows': self._pending.get(category, 0),
+                    'last_trained': self._last_trained.get(category),
+                    'queued': category in self._requested,
+                    'training': category == self._training,
+                    'last_error': self._last_error.get(category)
+                }
+                for category in categories
+            }
+
+    def _due(self, now: float) -> List[str]:
+        due = set(self._requested)
+        for category, pending in self._pending.items():
+            if pending <= 0:
+                continue
+            elapsed = now - self._last_trained.get(category, self._started_at)
+            if pending >= self.min_new_rows or elapsed >= self.max_interval:
+                due.add(category)
+        return sorted(due)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                due = self._due(time.time())
+                while not due and not self._stopped:
+                    self._cond.wait(self.poll_interval)
+                    due = self._due(time.time())
+                if self._stopped:
+                    return
+                category = due[0]
+                self._requested.discard(category)
+                # Rows arriving while we train count towards the next round
+                self._pending[category] = 0
+                self._training = category
+
+            try:
+                self.train_fn(category)
+                self._last_error.pop(category, None)
+            except Exception as e:
+                logger.error(f"Background training failed for {category}: {e}")
+                self._last_error[category] = str(e)
+            finally:
+                with self._cond:
+                    self._training = None
+                    self._last_trained[category] = time.time()
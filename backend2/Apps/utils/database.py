@@ -0,0 +1,271 @@
+import os
+import queue
+import sqlite3
+import threading
+import time
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Optional
+
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB_PATH = os.getenv('SCMC_DB_PATH', 'user_progress.db')
+
+# Connection tuning applied to every pooled connection
+PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': os.getenv('SCMC_DB_SYNCHRONOUS', 'NORMAL'),
+    'cache_size': int(os.getenv('SCMC_DB_CACHE_KB', '20000')) * -1,  # negative value = KiB
+    'mmap_size': int(os.getenv('SCMC_DB_MMAP_BYTES', str(256 * 1024 * 1024))),
+    'temp_store': 'MEMORY',
+}
+BUSY_TIMEOUT_MS = int(os.getenv('SCMC_DB_BUSY_TIMEOUT_MS', '5000'))
+POOL_SIZE = int(os.getenv('SCMC_DB_POOL_SIZE', '8'))
+# How long acquire() waits for a free connection once POOL_SIZE are open
+POOL_TIMEOUT = float(os.getenv('SCMC_DB_POOL_TIMEOUT_SECONDS', '5'))
+
+
+class PoolTimeoutError(sqlite3.OperationalError):
+    """No pooled connection became free within the pool timeout"""
+
+
+class _RequestScope:
+    """Lazily borrows one pooled connection per database for the lifetime of a request or blocking call"""
+
+    def __init__(self):
+        self.pools: Dict[str, 'ConnectionPool'] = {}
+        self.connections: Dict[str, sqlite3.Connection] = {}
+        self.closed = False
+        self._lock = threading.Lock()
+
+    def get(self, pool: 'ConnectionPool') -> Optional[sqlite3.Connection]:
+        with self._lock:
+            if self.closed:
+                return None
+            conn = self.connections.get(pool.db_path)
+            if conn is None:
+                conn = pool.acquire()
+                self.pools[pool.db_path] = pool
+                self.connections[pool.db_path] = conn
+            return conn
+
+    def close(self):
+        with self._lock:
+            self.closed = True
+            for db_path, conn in self.connections.items():
+                self.pools[db_path].release(conn)
+            self.connections.clear()
+
+
+_request_scope: ContextVar[Optional[_RequestScope]] = ContextVar('scmc_db_request_scope', default=None)
+
+
+class PooledConnection:
+    """sqlite3 connection proxy whose close() hands the connection back to its pool"""
+
+    def __init__(self, pool: 'ConnectionPool', conn: sqlite3.Connection, owned: bool = True):
+        self._pool = pool
+        self._conn = conn
+        self._owned = owned
+
+    @property
+    def raw(self) -> sqlite3.Connection:
+        return self._conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def close(self):
+        if self._conn is None:
+            return
+        if self._owned:
+            self._pool.release(self._conn)
+        self._conn = None
+
+
+class ConnectionPool:
+    """Bounded pool of tuned SQLite connections for a single database file.
+
+    At most `max_size` connections are open at once. When all of them are in
+    use, acquire() waits up to `timeout` seconds for one to be released and
+    then raises PoolTimeoutError, a sqlite3.OperationalError.
+    """
+
+    def __init__(self, db_path: str, max_size: int = POOL_SIZE, timeout: float = POOL_TIMEOUT):
+        self.db_path = db_path
+        self.max_size = max_size
+        self.timeout = timeout
+        # Holds idle connections on top of one None slot per connection not yet opened
+        self._idle: queue.LifoQueue = queue.LifoQueue(maxsize=max_size)
+        for _ in range(max_size):
+            self._idle.put_nowait(None)
+        self._lock = threading.Lock()
+        self._created = 0
+        self._waits = 0
+        self._timeouts = 0
+        self._trace: Optional[Callable[[str], None]] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=BUSY_TIMEOUT_MS / 1000,
+            check_same_thread=False
+        )
+        cursor = conn.cursor()
+        for pragma, value in PRAGMAS.items():
+            cursor.execute(f"PRAGMA {pragma} = {value}")
+        cursor.close()
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        """Take an idle connection or a free slot, waiting up to `timeout` when all are in use"""
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                self._waits += 1
+            try:
+                conn = self._idle.get(timeout=self.timeout)
+            except queue.Empty:
+                with self._lock:
+                    self._timeouts += 1
+                raise PoolTimeoutError(f"No connection to {self.db_path} became free within {self.timeout}s") from None
+
+        if conn is None:
+            try:
+                conn = self._connect()
+            except BaseException:
+                self._idle.put_nowait(None)
+                raise
+            with self._lock:
+                self._created += 1
+        # Also clears a callback left from an earlier trace
+        conn.set_trace_callback(self._trace)
+        return conn
+
+    def set_trace(self, callback: Optional[Callable[[str], None]]):
+        """Pass every statement run on connections acquired from now on to callback; None stops tracing"""
+        self._trace = callback
+
+    def release(self, conn: sqlite3.Connection):
+        """Return a connection to the pool, discarding any unfinished transaction"""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error as e:
+            logger.warning(f"Dropping broken connection to {self.db_path}: {e}")
+            self._discard(conn)
+            return
+
+        self._idle.put_nowait(conn)
+
+    def _discard(self, conn: sqlite3.Connection):
+        with self._lock:
+            self._created -= 1
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        # Free the slot so a waiter can open a replacement
+        self._idle.put_nowait(None)
+
+    @contextmanager
+    def connection(self):
+        """Yield a connection, reusing the current request's connection when one is bound"""
+        scope = _request_scope.get()
+        conn = scope.get(self) if scope is not None else None
+        if conn is not None:
+            yield conn
+            return
+
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def get_connection(self) -> PooledConnection:
+        """Return a connection for legacy call sites that close() it themselves"""
+        scope = _request_scope.get()
+        conn = scope.get(self) if scope is not None else None
+        if conn is not None:
+            return PooledConnection(self, conn, owned=False)
+        return PooledConnection(self, self.acquire())
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'idle': self._idle.qsize() - (self.max_size - self._created),
+            'open': self._created,
+            'max_size': self.max_size,
+            'waits': self._waits,
+            'timeouts': self._timeouts
+        }
+
+    def close_all(self):
+        """Close every idle connection; later acquires open new ones"""
+        drained = []
+        while True:
+            try:
+                drained.append(self._idle.get_nowait())
+            except queue.Empty:
+                break
+        for conn in drained:
+            if conn is None:
+                self._idle.put_nowait(None)
+            else:
+                self._discard(conn)
+
+
+_pools: Dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_path: str = DEFAULT_DB_PATH) -> ConnectionPool:
+    """Return the process-wide pool for a database file"""
+    key = os.path.abspath(db_path)
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = ConnectionPool(db_path)
+                _pools[key] = pool
+    return pool
+
+
+def get_db_connection(db_path: str = DEFAULT_DB_PATH) -> PooledConnection:
+    """Get a pooled connection; calling close() returns it to the pool"""
+    return get_pool(db_path).get_connection()
+
+
+async def request_connection():
+    """FastAPI dependency binding one pooled connection to the current request"""
+    scope = _RequestScope()
+    _request_scope.set(scope)
+    try:
+        yield scope
+    finally:
+        # A closed scope makes later lookups in this context fall back to the pool
+        scope.close()
+
+
+def release_request_connection():
+    """Hand the current request's connection back early, e.g. before a long-lived stream"""
+    scope = _request_scope.get()
+    if scope is not None:
+        scope.close()
+
+
+@contextmanager
+def connection_scope():
+    """Share one pooled connection per database among all calls inside the block, then return it"""
+    scope = _RequestScope()
+    token = _request_scope.set(scope)
+    try:
+        yield scope
+    finally:
+        scope.close()
+        _request_scope.reset(token)
@@ -0,0 +1,33 @@
+import os
+from typing import Any, Callable, TypeVar
+
+import anyio.to_thread
+from starlette.concurrency import run_in_threadpool
+
+from Apps.utils.database import connection_scope
+
+
+# Worker threads for blocking work (SQLite, file parsing, email); shared with sync endpoints
+BLOCKING_WORKERS = int(os.getenv('SCMC_BLOCKING_WORKERS', '40'))
+
+T = TypeVar('T')
+
+
+def configure_blocking_pool(workers: int = BLOCKING_WORKERS):
+    """Size the thread pool behind sync endpoints and run_blocking (call from startup)"""
+    anyio.to_thread.current_default_thread_limiter().total_tokens = workers
+
+
+def _scoped(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    with connection_scope():
+        return func(*args, **kwargs)
+
+
+async def run_blocking(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Run a blocking call in the bounded worker pool without stalling the event loop.
+
+    The call and everything it calls share one pooled SQLite connection, which
+    goes back to the pool when the call returns, so an async endpoint never
+    holds one across an await (such as a model call).
+    """
+    return await run_in_threadpool(_scoped, func, *args, **kwargs)
@@ -2,8 +2,8 @@ import os
 import uuid
 from datetime import datetime
 from typing import Optional, Tuple
-import sqlite3
 import logging
+from Apps.utils.database import get_db_connection, DEFAULT_DB_PATH
 
 
 logging.basicConfig(level=logging.INFO)
@@ -73,7 +73,7 @@ class FileUploadService:
 class CVStorage:
     def __init__(self):
         self.file_service = FileUploadService()
-        self.db_path = "user_progress.db"
+        self.db_path = DEFAULT_DB_PATH
 
     def store_cv(self, user_id: str, filename: str, file_content: bytes) -> Tuple[bool, str]:
         """Store CV file and metadata in database"""
@@ -96,7 +96,7 @@ class CVStorage:
                 file_content_text = self.file_service.read_file_content(file_path)
 
             
-            conn = sqlite3.connect(self.db_path)
+            conn = get_db_connection(self.db_path)
             cursor = conn.cursor()
 
             cursor.execute('''
@@ -120,7 +120,7 @@ class CVStorage:
     def get_cv_info(self, user_id: str) -> Optional[dict]:
         """Get CV information for a user"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = get_db_connection(self.db_path)
             cursor = conn.cursor()
 
             cursor.execute('''
@@ -152,7 +152,7 @@ class CVStorage:
                     os.remove(cv_info['file_path'])
 
             
-            conn = sqlite3.connect(self.db_path)
+            conn = get_db_connection(self.db_path)
             cursor = conn.cursor()
 
             cursor.execute('''
@@ -0,0 +1,510 @@
+"""
+Versioned schema migrations for the SQLite database.
+
+Migrations are applied in order, once, at application startup. The applied
+versions are recorded in the `schema_version` table so request handlers never
+need to issue DDL. Each migration runs in its own short `BEGIN IMMEDIATE`
+transaction: concurrent workers serialize on it and re-check the version, and
+WAL readers keep serving while it runs. New columns are added with
+`ALTER TABLE ... ADD COLUMN`, which SQLite performs without rewriting the
+table, and indexes with `CREATE INDEX IF NOT EXISTS`.
+"""
+import os
+import sqlite3
+import threading
+import logging
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from Apps.utils.database import get_pool, DEFAULT_DB_PATH
+from Apps.progress_stats import rebuild_all_stats
+
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class Migration:
+    def __init__(self, version: int, description: str,
+                 statements: Sequence[str] = (),
+                 columns: Sequence[Tuple[str, str, str]] = (),
+                 apply: Optional[Callable[[sqlite3.Connection], None]] = None):
+        self.version = version
+        self.description = description
+        self.statements = statements
+        self.columns = columns  # (table, column, column definition)
+        self.apply = apply
+
+    def run(self, conn: sqlite3.Connection):
+        cursor = conn.cursor()
+        for table, column, definition in self.columns:
+            add_column(cursor, table, column, definition)
+        for statement in self.statements:
+            cursor.execute(statement)
+        if self.apply:
+            self.apply(conn)
+
+
+def add_column(cursor: sqlite3.Cursor, table: str, column: str, definition: str):
+    """Add a column unless it already exists (ADD COLUMN does not rewrite the table)"""
+    cursor.execute(f"PRAGMA table_info({table})")
+    if column not in {row[1] for row in cursor.fetchall()}:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+
+BASELINE_SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS users (
+        user_id TEXT PRIMARY KEY,
+        name TEXT,
+        email TEXT,
+        phone TEXT,
+        birthday TEXT,
+        sex TEXT,
+        template TEXT,
+        profile_picture TEXT,
+        cv_file_path TEXT,
+        cv_content TEXT,
+        confirmation_code TEXT,
+        is_confirmed BOOLEAN DEFAULT FALSE,
+        card_id TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS conversation_memory (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id TEXT,
+        category TEXT,
+        user_input TEXT,
+        ai_response TEXT,
+        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users (user_id)
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS email_confirmations (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id TEXT,
+        confirmation_code TEXT,
+        email TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        expires_at TIMESTAMP,
+        is_used BOOLEAN DEFAULT FALSE,
+        FOREIGN KEY (user_id) REFERENCES users (user_id)
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS education_programs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id TEXT,
+        program_name TEXT,
+        program_start_date TEXT,
+        program_end_date TEXT,
+        daily_schedule TEXT,
+        program_duration_unit TEXT,
+        program_duration_length INTEGER,
+        expected_completion_date TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users (user_id)
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS attendance_tracking (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id TEXT,
+        session_date TEXT,
+        session_time TEXT,
+        status TEXT, -- present, late, absent
+        notes TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users (user_id)
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS user_progress (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id TEXT NOT NULL,
+        category TEXT NOT NULL,
+        score REAL NOT NULL,
+        total_questions INTEGER DEFAULT 1,
+        metrics_json TEXT,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS career_metrics (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id TEXT NOT NULL,
+        interview_score REAL,
+        skill_assessment REAL,
+        career_goal_progress REAL,
+        resume_quality REAL,
+        networking_score REAL,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS business_metrics (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id TEXT NOT NULL,
+        business_plan_score REAL,
+        market_analysis_score REAL,
+        financial_projection_score REAL,
+        pitch_quality REAL,
+        strategy_score REAL,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS education_metrics (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id TEXT NOT NULL,
+        learning_milestone_score REAL,
+        concept_mastery REAL,
+        study_efficiency REAL,
+        knowledge_retention REAL,
+        academic_performance REAL,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS finance_metrics (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id TEXT NOT NULL,
+        investment_knowledge REAL,
+        budgeting_skills REAL,
+        financial_planning REAL,
+        risk_assessment REAL,
+        wealth_management REAL,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS quiz_questions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id TEXT NOT NULL,
+        category TEXT NOT NULL,
+        question TEXT NOT NULL,
+        user_answer TEXT NOT NULL,
+        is_correct BOOLEAN NOT NULL,
+        correct_answer TEXT,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS quiz_answers (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id TEXT NOT NULL,
+        category TEXT NOT NULL,
+        question_id TEXT NOT NULL,
+        correct_answer TEXT NOT NULL,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE(user_id, category, question_id)
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS user_notifications (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id TEXT NOT NULL,
+        title TEXT NOT NULL,
+        message TEXT NOT NULL,
+        type TEXT NOT NULL,
+        read BOOLEAN DEFAULT FALSE,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS notification_replies (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id TEXT NOT NULL,
+        notification_id INTEGER NOT NULL,
+        user_message TEXT NOT NULL,
+        ai_response TEXT NOT NULL,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+]
+
+
+# Per-user, time-ordered read paths. Trailing columns make the hot reads
+# index-only where the selected columns are small.
+READ_PATH_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_conversation_memory_user_category_ts "
+    "ON conversation_memory (user_id, category, timestamp)",
+    "CREATE INDEX IF NOT EXISTS idx_user_progress_user_category_ts "
+    "ON user_progress (user_id, category, timestamp, score, total_questions)",
+    "CREATE INDEX IF NOT EXISTS idx_user_progress_user_ts "
+    "ON user_progress (user_id, timestamp)",
+    "CREATE INDEX IF NOT EXISTS idx_user_progress_category_ts "
+    "ON user_progress (category, timestamp, score, total_questions)",
+    "CREATE INDEX IF NOT EXISTS idx_career_metrics_user_ts ON career_metrics (user_id, timestamp)",
+    "CREATE INDEX IF NOT EXISTS idx_business_metrics_user_ts ON business_metrics (user_id, timestamp)",
+    "CREATE INDEX IF NOT EXISTS idx_education_metrics_user_ts ON education_metrics (user_id, timestamp)",
+    "CREATE INDEX IF NOT EXISTS idx_finance_metrics_user_ts ON finance_metrics (user_id, timestamp)",
+    "CREATE INDEX IF NOT EXISTS idx_user_notifications_user_ts "
+    "ON user_notifications (user_id, timestamp)",
+    "CREATE INDEX IF NOT EXISTS idx_user_notifications_unread "
+    "ON user_notifications (user_id, timestamp) WHERE read = FALSE",
+    "CREATE INDEX IF NOT EXISTS idx_quiz_questions_user_category_ts "
+    "ON quiz_questions (user_id, category, timestamp, is_correct)",
+    "CREATE INDEX IF NOT EXISTS idx_quiz_questions_user_ts "
+    "ON quiz_questions (user_id, timestamp, is_correct)",
+    "CREATE INDEX IF NOT EXISTS idx_quiz_answers_user_category_ts "
+    "ON quiz_answers (user_id, category, timestamp, question_id, correct_answer)",
+    "CREATE INDEX IF NOT EXISTS idx_education_programs_user ON education_programs (user_id)",
+    "CREATE INDEX IF NOT EXISTS idx_email_confirmations_user_code "
+    "ON email_confirmations (user_id, confirmation_code)",
+    "CREATE INDEX IF NOT EXISTS idx_notification_replies_user_notification "
+    "ON notification_replies (user_id, notification_id)",
+]
+
+
+# Notifications are paged by id (insertion order), and per-user totals are kept
+# by triggers so badge counts never scan the user's history
+NOTIFICATION_COUNTERS = [
+    "DROP INDEX IF EXISTS idx_user_notifications_user_ts",
+    "DROP INDEX IF EXISTS idx_user_notifications_unread",
+    "CREATE INDEX IF NOT EXISTS idx_user_notifications_user_id ON user_notifications (user_id, id)",
+    "CREATE INDEX IF NOT EXISTS idx_user_notifications_unread_id "
+    "ON user_notifications (user_id, id) WHERE read = FALSE",
+    '''
+    CREATE TABLE IF NOT EXISTS notification_counters (
+        user_id TEXT PRIMARY KEY,
+        total INTEGER NOT NULL DEFAULT 0,
+        unread INTEGER NOT NULL DEFAULT 0,
+        last_id INTEGER NOT NULL DEFAULT 0
+    ) WITHOUT ROWID
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_user_notifications_insert
+    AFTER INSERT ON user_notifications
+    BEGIN
+        INSERT INTO notification_counters (user_id, total, unread, last_id)
+        VALUES (NEW.user_id, 1, CASE WHEN NEW.read = FALSE THEN 1 ELSE 0 END, NEW.id)
+        ON CONFLICT (user_id) DO UPDATE SET
+            total = total + 1,
+            unread = unread + excluded.unread,
+            last_id = MAX(last_id, excluded.last_id);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_user_notifications_delete
+    AFTER DELETE ON user_notifications
+    BEGIN
+        UPDATE notification_counters
+        SET total = total - 1,
+            unread = unread - CASE WHEN OLD.read = FALSE THEN 1 ELSE 0 END
+        WHERE user_id = OLD.user_id;
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_user_notifications_read
+    AFTER UPDATE OF read ON user_notifications
+    WHEN (CASE WHEN OLD.read = FALSE THEN 1 ELSE 0 END) != (CASE WHEN NEW.read = FALSE THEN 1 ELSE 0 END)
+    BEGIN
+        UPDATE notification_counters
+        SET unread = unread + CASE WHEN NEW.read = FALSE THEN 1 ELSE -1 END
+        WHERE user_id = NEW.user_id;
+    END
+    ''',
+    '''
+    INSERT OR REPLACE INTO notification_counters (user_id, total, unread, last_id)
+    SELECT user_id, COUNT(*), COALESCE(SUM(read = FALSE), 0), MAX(id)
+    FROM user_notifications
+    GROUP BY user_id
+    ''',
+]
+
+
+# Archived notifications leave the inbox, so they no longer count towards total or unread
+NOTIFICATION_ARCHIVE_COUNTERS = [
+    "DROP TRIGGER IF EXISTS trg_user_notifications_insert",
+    "DROP TRIGGER IF EXISTS trg_user_notifications_delete",
+    "DROP TRIGGER IF EXISTS trg_user_notifications_read",
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_user_notifications_insert
+    AFTER INSERT ON user_notifications
+    BEGIN
+        INSERT INTO notification_counters (user_id, total, unread, last_id)
+        VALUES (
+            NEW.user_id,
+            CASE WHEN NEW.archived = FALSE THEN 1 ELSE 0 END,
+            CASE WHEN NEW.read = FALSE AND NEW.archived = FALSE THEN 1 ELSE 0 END,
+            NEW.id
+        )
+        ON CONFLICT (user_id) DO UPDATE SET
+            total = total + excluded.total,
+            unread = unread + excluded.unread,
+            last_id = MAX(last_id, excluded.last_id);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_user_notifications_delete
+    AFTER DELETE ON user_notifications
+    BEGIN
+        UPDATE notification_counters
+        SET total = total - CASE WHEN OLD.archived = FALSE THEN 1 ELSE 0 END,
+            unread = unread - CASE WHEN OLD.read = FALSE AND OLD.archived = FALSE THEN 1 ELSE 0 END
+        WHERE user_id = OLD.user_id;
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_user_notifications_state
+    AFTER UPDATE OF read, archived ON user_notifications
+    BEGIN
+        UPDATE notification_counters
+        SET total = total
+                + CASE WHEN NEW.archived = FALSE THEN 1 ELSE 0 END
+                - CASE WHEN OLD.archived = FALSE THEN 1 ELSE 0 END,
+            unread = unread
+                + CASE WHEN NEW.read = FALSE AND NEW.archived = FALSE THEN 1 ELSE 0 END
+                - CASE WHEN OLD.read = FALSE AND OLD.archived = FALSE THEN 1 ELSE 0 END
+        WHERE user_id = NEW.user_id;
+    END
+    ''',
+    "DELETE FROM notification_counters",
+    '''
+    INSERT INTO notification_counters (user_id, total, unread, last_id)
+    SELECT user_id,
+           COALESCE(SUM(archived = FALSE), 0),
+           COALESCE(SUM(read = FALSE AND archived = FALSE), 0),
+           MAX(id)
+    FROM user_notifications
+    GROUP BY user_id
+    ''',
+]
+
+
+# Append new migrations at the end; never edit or reorder applied ones
+MIGRATIONS: List[Migration] = [
+    Migration(1, "baseline schema", statements=BASELINE_SCHEMA),
+    Migration(2, "per-user read path indexes", statements=READ_PATH_INDEXES),
+    Migration(3, "incremental training watermark index", statements=[
+        "CREATE INDEX IF NOT EXISTS idx_user_progress_category_id ON user_progress (category, id)",
+    ]),
+    Migration(4, "running per-user progress statistics", statements=[
+        '''
+        CREATE TABLE IF NOT EXISTS progress_stats (
+            user_id TEXT NOT NULL,
+            category TEXT NOT NULL,
+            n INTEGER NOT NULL DEFAULT 0,
+            sum_x REAL NOT NULL DEFAULT 0,
+            sum_y REAL NOT NULL DEFAULT 0,
+            sum_xy REAL NOT NULL DEFAULT 0,
+            sum_xx REAL NOT NULL DEFAULT 0,
+            sum_yy REAL NOT NULL DEFAULT 0,
+            last_scores TEXT NOT NULL DEFAULT '[]',
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (user_id, category)
+        ) WITHOUT ROWID
+        ''',
+    ], apply=rebuild_all_stats),
+    Migration(5, "keyset notification indexes and unread counters", statements=NOTIFICATION_COUNTERS),
+    Migration(6, "notification archiving", statements=NOTIFICATION_ARCHIVE_COUNTERS,
+              columns=[('user_notifications', 'archived', 'BOOLEAN DEFAULT FALSE')]),
+    Migration(7, "rolling conversation summaries", statements=[
+        '''
+        CREATE TABLE IF NOT EXISTS conversation_summaries (
+            user_id TEXT NOT NULL,
+            category TEXT NOT NULL,
+            summary TEXT NOT NULL DEFAULT '',
+            covered_id INTEGER NOT NULL DEFAULT 0,
+            turns INTEGER NOT NULL DEFAULT 0,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (user_id, category)
+        ) WITHOUT ROWID
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_conversation_memory_user_category_id "
+        "ON conversation_memory (user_id, category, id)",
+    ]),
+    Migration(8, "pre-generated quiz question bank", statements=[
+        '''
+        CREATE TABLE IF NOT EXISTS question_bank (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            category TEXT NOT NULL,
+            program TEXT NOT NULL DEFAULT '',
+            difficulty TEXT NOT NULL,
+            question TEXT NOT NULL,
+            options TEXT NOT NULL,
+            correct_index INTEGER NOT NULL,
+            question_hash TEXT NOT NULL,
+            source TEXT NOT NULL DEFAULT 'background',
+            served_count INTEGER NOT NULL DEFAULT 0,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (category, program, difficulty, question_hash)
+        )
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_question_bank_bucket "
+        "ON question_bank (category, program, difficulty, served_count)",
+    ]),
+    Migration(9, "quiz sessions with per-session answer keys", statements=[
+        '''
+        CREATE TABLE IF NOT EXISTS quiz_sessions (
+            session_id TEXT PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            category TEXT NOT NULL,
+            answer_key TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            expires_at REAL NOT NULL
+        ) WITHOUT ROWID
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_quiz_sessions_user_category_created "
+        "ON quiz_sessions (user_id, category, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_quiz_sessions_expires ON quiz_sessions (expires_at)",
+    ]),
+    Migration(10, "question texts on quiz sessions for batch grading",
+              columns=[('quiz_sessions', 'questions', 'TEXT')]),
+]
+
+
+_migrated = set()
+_migrate_lock = threading.Lock()
+
+
+def current_version(conn: sqlite3.Connection) -> int:
+    row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    return row[0] or 0
+
+
+def migrate(db_path: str = DEFAULT_DB_PATH) -> int:
+    """Apply pending migrations once per process and return the schema version"""
+    key = os.path.abspath(db_path)
+    with _migrate_lock:
+        pool = get_pool(db_path)
+        with pool.connection() as conn:
+            if key in _migrated:
+                return current_version(conn)
+
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS schema_version (
+                    version INTEGER PRIMARY KEY,
+                    description TEXT NOT NULL,
+                    applied_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            conn.commit()
+
+            for migration in MIGRATIONS:
+                if migration.version <= current_version(conn):
+                    continue
+
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    # Another worker may have applied it while we waited for the lock
+                    if migration.version <= current_version(conn):
+                        conn.rollback()
+                        continue
+                    migration.run(conn)
+                    conn.execute(
+                        "INSERT INTO schema_version (version, description) VALUES (?, ?)",
+                        (migration.version, migration.description)
+                    )
+                    conn.commit()
+                    logger.info(f"Applied migration {migration.version}: {migration.description}")
+                except Exception:
+                    conn.rollback()
+                    logger.exception(f"Migration {migration.version} failed")
+                    raise
+
+            _migrated.add(key)
+            return current_version(conn)
@@ -0,0 +1,85 @@
+import os
+import asyncio
+import threading
+from typing import Any, Dict, Optional, Set
+
+
+# Undelivered events a slow stream may buffer before it is cut off to resync
+SUBSCRIBER_QUEUE_SIZE = int(os.getenv('SCMC_NOTIFICATION_QUEUE_SIZE', '100'))
+
+
+class Subscription:
+    """One open notification stream, bound to the event loop that reads it"""
+
+    def __init__(self, user_id: str, loop: asyncio.AbstractEventLoop, maxsize: int):
+        self.user_id = user_id
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.overflowed = False
+
+    def _push(self, event: Optional[Dict[str, Any]]):
+        # Runs on self.loop
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Drop the backlog and tell the reader to reconnect; it resumes from its last id
+            self.overflowed = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+
+    async def get(self) -> Optional[Dict[str, Any]]:
+        """Next notification, or None when the stream fell behind and must resync"""
+        return await self.queue.get()
+
+
+class NotificationHub:
+    """In-process pub/sub fanning newly stored notifications out to open streams.
+
+    Publishers may run on any thread (sync endpoints, threadpool, background
+    workers); delivery is scheduled onto each subscriber's event loop. The hub
+    only sees notifications stored by this process, so clients always resume
+    from their last event id through the database after reconnecting.
+    """
+
+    def __init__(self, queue_size: int = SUBSCRIBER_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subscribers: Dict[str, Set[Subscription]] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id: str) -> Subscription:
+        subscription = Subscription(user_id, asyncio.get_running_loop(), self.queue_size)
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.user_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.user_id]
+
+    def publish(self, user_id: str, notification: Dict[str, Any]):
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription._push, notification)
+            except RuntimeError:
+                # Loop already closed (shutdown); the stream is gone
+                self.unsubscribe(subscription)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'users': len(self._subscribers),
+                'streams': sum(len(subscribers) for subscribers in self._subscribers.values())
+            }
+
+
+# Global instance
+notification_hub = NotificationHub()
@@ -0,0 +1,202 @@
+"""
+Query plan check and micro-benchmark for the hot per-user reads.
+
+Builds a scratch database through the regular migrations, optionally seeds it,
+then runs the real request-path functions with every statement they execute
+traced from the connection pool. Each traced statement is checked with
+EXPLAIN QUERY PLAN; any full table scan or temporary sort fails the run with a
+non-zero exit code, so it can gate CI:
+
+    cd backend2
+    python -m benchmarks.bench_query_plans              # plans only
+    python -m benchmarks.bench_query_plans --rows 200000  # plans + timings
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from typing import Callable, List, Tuple
+
+
+CATEGORIES = ['career', 'business', 'education', 'finance', 'quiz', 'chat']
+TEMPLATES = ['career', 'business', 'education', 'finance']
+USER = 'user_1'
+
+# Statements whose plan is checked; transaction control and PRAGMAs have none
+PLANNED = ('SELECT', 'WITH', 'UPDATE', 'DELETE', 'INSERT', 'REPLACE')
+
+
+def hot_paths() -> List[Tuple[str, Callable[[], object]]]:
+    """(name, call) for every function that reads the database on a request path"""
+    from fastapi import HTTPException
+
+    from Apps.main_api import main_brevo
+    from Apps.progress_tracker import progress_tracker as tracker
+    from Apps.template import prompts
+    from Apps.template.question_bank import question_bank, make_bucket
+
+    def confirm_email():
+        try:
+            main_brevo.confirm_email(main_brevo.ConfirmationRequest(user_id=USER, confirmation_code='123456'))
+        except HTTPException:
+            pass
+
+    def submit_quiz():
+        session = tracker.create_quiz_session(USER, 'quiz', ['a', 'b'], ['q1?', 'q2?'])
+        tracker.get_quiz_session(USER, 'quiz', session['session_id'])
+        tracker.record_quiz_results(USER, 'quiz', [
+            {'question': 'q1?', 'user_answer': 'a', 'is_correct': True, 'correct_answer': 'a'},
+            {'question': 'q2?', 'user_answer': 'a', 'is_correct': False, 'correct_answer': 'b'},
+        ], session_id=session['session_id'])
+
+    paths = [
+        ("get_chat_context", lambda: prompts.get_chat_context(USER, 'career')),
+        ("get_user_progress (category)", lambda: tracker.get_user_progress(USER, 'career')),
+        ("get_user_progress", lambda: tracker.get_user_progress(USER)),
+        ("get_progress_stats", lambda: tracker.get_progress_stats(USER, 'quiz')),
+        ("get_overall_progress", lambda: tracker.get_overall_progress(USER)),
+        ("train_model (non-template)", lambda: tracker.train_model('quiz')),
+    ]
+    paths += [
+        (f"get_template_metrics ({category})", lambda category=category: tracker.get_template_metrics(USER, category))
+        for category in TEMPLATES
+    ]
+    paths += [
+        ("get_user_notifications", lambda: tracker.get_user_notifications(USER, limit=50)),
+        ("get_user_notifications (unread page)",
+         lambda: tracker.get_user_notifications(USER, unread_only=True, before_id=10 ** 9, limit=50)),
+        ("get_notifications_after", lambda: tracker.get_notifications_after(USER, 0)),
+        ("get_notification_counts", lambda: tracker.get_notification_counts(USER)),
+        ("get_quiz_questions (category)", lambda: tracker.get_quiz_questions(USER, 'quiz')),
+        ("get_quiz_questions", lambda: tracker.get_quiz_questions(USER)),
+        ("get_quiz_stats", lambda: tracker.get_quiz_stats(USER, 'quiz')),
+        ("get_quiz_session (latest)", lambda: tracker.get_quiz_session(USER, 'quiz')),
+        ("submit quiz (session + results)", submit_quiz),
+        ("question_bank.sample", lambda: question_bank.sample(make_bucket('career'), 5)),
+        ("suggestion inputs", lambda: main_brevo._load_suggestion_inputs(USER)),
+        ("confirm_email", confirm_email),
+        ("reply_to_notification", lambda: main_brevo._has_replied(USER, 1)),
+    ]
+    return paths
+
+
+def plan_problems(conn, sql: str) -> List[str]:
+    """Return the plan steps that scan a whole table or sort in a temp b-tree"""
+    problems = []
+    for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}").fetchall():
+        detail = row[-1]
+        if detail.startswith('SCAN ') and 'USING' not in detail:
+            problems.append(detail)
+        elif 'USE TEMP B-TREE' in detail:
+            problems.append(detail)
+    return problems
+
+
+def traced(pool, call: Callable[[], object]) -> List[str]:
+    """Distinct plannable statements (parameters expanded) executed by call"""
+    statements = []
+    pool.set_trace(statements.append)
+    try:
+        call()
+    finally:
+        pool.set_trace(None)
+    seen = []
+    for sql in statements:
+        if sql.lstrip().split(None, 1)[0].upper() in PLANNED and sql not in seen:
+            seen.append(sql)
+    return seen
+
+
+def seed(conn, rows: int, users: int):
+    """Insert users and `rows` synthetic rows per table spread over them"""
+    rnd = random.Random(42)
+    cursor = conn.cursor()
+    user_ids = [f"user_{i}" for i in range(users)]
+    cursor.executemany("INSERT OR IGNORE INTO users (user_id, name, template) VALUES (?, ?, ?)",
+                       [(u, u, TEMPLATES[i % len(TEMPLATES)]) for i, u in enumerate(user_ids)])
+    cursor.execute("UPDATE users SET template = 'education' WHERE user_id = ?", (USER,))
+    batch_progress, batch_memory, batch_notifications, batch_questions = [], [], [], []
+    for i in range(rows):
+        user_id = rnd.choice(user_ids)
+        category = rnd.choice(CATEGORIES)
+        ts = f"2025-{rnd.randint(1, 12):02d}-{rnd.randint(1, 28):02d} 12:{i % 60:02d}:00"
+        batch_progress.append((user_id, category, rnd.uniform(0, 100), 1, '{}', ts))
+        batch_memory.append((user_id, category, 'question', 'answer', ts))
+        batch_notifications.append((user_id, 'title', 'message', 'info', rnd.random() < 0.2, ts))
+        batch_questions.append((user_id, category, 'q', 'a', rnd.random() < 0.5, 'a', ts))
+    cursor.executemany('''
+        INSERT INTO user_progress (user_id, category, score, total_questions, metrics_json, timestamp)
+        VALUES (?, ?, ?, ?, ?, ?)''', batch_progress)
+    cursor.executemany('''
+        INSERT INTO conversation_memory (user_id, category, user_input, ai_response, timestamp)
+        VALUES (?, ?, ?, ?, ?)''', batch_memory)
+    cursor.executemany('''
+        INSERT INTO user_notifications (user_id, title, message, type, read, timestamp)
+        VALUES (?, ?, ?, ?, ?, ?)''', batch_notifications)
+    cursor.executemany('''
+        INSERT INTO quiz_questions (user_id, category, question, user_answer, is_correct, correct_answer, timestamp)
+        VALUES (?, ?, ?, ?, ?, ?, ?)''', batch_questions)
+    cursor.executemany('''
+        INSERT INTO question_bank (category, program, difficulty, question, options, correct_index, question_hash, source)
+        VALUES ('career', '', 'beginner', ?, ?, 0, ?, 'background')''',
+        [(f"Question {i}?", json.dumps(['a', 'b', 'c', 'd']), f"hash-{i}") for i in range(min(rows, 500))])
+    conn.commit()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=0, help='synthetic rows per table (0 = plans only)')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'bench.db')
+        # The modules under test open the default database, so it must be the scratch one before they are imported
+        os.environ['SCMC_DB_PATH'] = db_path
+        from Apps.utils.database import get_pool
+        from Apps.utils.migrations import migrate
+
+        migrate(db_path)
+        pool = get_pool(db_path)
+        with pool.connection() as conn:
+            started = time.perf_counter()
+            seed(conn, args.rows, args.users)
+            if args.rows:
+                print(f"seeded {args.rows} rows/table in {time.perf_counter() - started:.1f}s")
+
+        explain = sqlite3.connect(db_path)
+        failures = 0
+        for name, call in hot_paths():
+            problems = []
+            for sql in traced(pool, call):
+                problems += [(sql, detail) for detail in plan_problems(explain, sql)]
+            status = 'FAIL' if problems else 'ok'
+            timing = ''
+            if args.rows:
+                started = time.perf_counter()
+                for _ in range(args.repeat):
+                    call()
+                timing = f" {(time.perf_counter() - started) * 1000 / args.repeat:8.3f} ms"
+            print(f"[{status:4}] {name:38}{timing}")
+            for sql, detail in problems:
+                print(f"       {detail}")
+                print(f"         in: {' '.join(sql.split())[:160]}")
+            failures += bool(problems)
+        explain.close()
+
+        from Apps.progress_tracker import progress_tracker
+        progress_tracker.training_scheduler.stop()
+        pool.close_all()
+
+    if failures:
+        print(f"{failures} hot paths fall back to a scan or temp sort")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
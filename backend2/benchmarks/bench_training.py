@@ -0,0 +1,86 @@
+"""
+Compare batch (RandomForest refit) and incremental (partial_fit) training.
+
+Grows a synthetic `career_metrics` table step by step and, after each step,
+retrains both engines through ProgressTracker, reporting wall time and
+holdout accuracy:
+
+    cd backend2
+    python -m benchmarks.bench_training --sizes 1000 5000 20000 50000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+
+def synthetic_rows(rnd: np.random.Generator, count: int):
+    """Four metric features and a noisy linear target (networking_score)"""
+    X = rnd.uniform(40, 100, size=(count, 4))
+    y = 10 + X @ np.array([0.3, 0.2, 0.25, 0.15]) + rnd.normal(0, 5, size=count)
+    return X, y
+
+
+def evaluate(tracker, category: str, X: np.ndarray, y: np.ndarray):
+    model, scaler = tracker.models.get(category), tracker.scalers.get(category)
+    predicted = model.predict(scaler.transform(X))
+    mae = float(np.mean(np.abs(predicted - y)))
+    r2 = 1 - float(np.sum((y - predicted) ** 2) / np.sum((y - y.mean()) ** 2))
+    return mae, r2
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 5000, 20000, 50000])
+    parser.add_argument('--holdout', type=int, default=2000)
+    args = parser.parse_args(argv)
+
+    rnd = np.random.default_rng(42)
+    X_holdout, y_holdout = synthetic_rows(rnd, args.holdout)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'bench.db')
+        # Importing the tracker module opens its default database; keep that one scratch as well
+        os.environ['SCMC_DB_PATH'] = db_path
+        from Apps.progress_tracker import ProgressTracker
+
+        batch = ProgressTracker(db_path, training_mode='batch')
+        incremental = ProgressTracker(db_path, training_mode='incremental')
+
+        print(f"{'rows':>8} {'batch s':>9} {'batch MAE':>10} {'batch R2':>9}"
+              f" {'incr s':>9} {'incr MAE':>9} {'incr R2':>8}")
+        rows = 0
+        with batch.pool.connection() as conn:
+            for size in sorted(args.sizes):
+                X, y = synthetic_rows(rnd, size - rows)
+                conn.executemany('''
+                    INSERT INTO career_metrics (user_id, interview_score, skill_assessment,
+                                                career_goal_progress, resume_quality, networking_score)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', [(f"user_{i % 500}", *features, target)
+                      for i, (features, target) in enumerate(zip(X.tolist(), y.tolist()))])
+                conn.commit()
+                rows = size
+
+                started = time.perf_counter()
+                batch.train_model('career')
+                batch_seconds = time.perf_counter() - started
+
+                started = time.perf_counter()
+                incremental.train_model('career')
+                incremental_seconds = time.perf_counter() - started
+
+                batch_mae, batch_r2 = evaluate(batch, 'career', X_holdout, y_holdout)
+                incr_mae, incr_r2 = evaluate(incremental, 'career', X_holdout, y_holdout)
+                print(f"{rows:>8} {batch_seconds:>9.3f} {batch_mae:>10.2f} {batch_r2:>9.3f}"
+                      f" {incremental_seconds:>9.3f} {incr_mae:>9.2f} {incr_r2:>8.3f}")
+
+        batch.pool.close_all()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())